@@ -0,0 +1,145 @@
+from collections import defaultdict
+from functools import partial
+from django.db.models import Q
+from django.db.models.functions import Substr
+from postify.dataloaders import register_loader
+from postify.pagination import paginate_groups
+from comments.models import Comment
+from comments.threads import SEGMENT_WIDTH, subtree_filter
+import likes.loaders
+import profiles.loaders
+
+
+@register_loader("comments")
+def load_comments(loaders, keys):
+    return Comment.objects.in_bulk(keys)
+
+
+COMMENT_ORDERINGS = {
+    "oldest": ("created_at", "id"),
+    "newest": ("-created_at", "-id"),
+}
+PAGE_ARGUMENTS = ("first", "after", "last", "before")
+
+
+def page_key(group, *options, **kwargs):
+    """
+    The key of one page of a group's comments for the page loaders below:
+    the group (a post or comment id), options such as the order, then the
+    connection arguments. A bare group id queues the group for whichever
+    pages are loaded, so a page requested for one group is fetched and
+    primed for every queued group at once.
+    """
+    return (group, *options) + tuple(kwargs.get(name) for name in PAGE_ARGUMENTS)
+
+
+def load_pages(loader, keys, fetch):
+    groups = list(
+        dict.fromkeys(key[0] if isinstance(key, tuple) else key for key in keys)
+    )
+    pages = {}
+    for page in dict.fromkeys(key[1:] for key in keys if isinstance(key, tuple)):
+        for group, connection in fetch(groups, *page).items():
+            pages[(group, *page)] = connection
+            loader.prime((group, *page), connection)
+    return pages
+
+
+def comment_connection():
+    from comments.schema import CommentConnection
+
+    return CommentConnection
+
+
+@register_loader("comment_pages")
+def load_comment_pages(loaders, keys):
+    """Pages of a post's top-level comments."""
+
+    def fetch(post_ids, order, first, after, last, before):
+        return paginate_groups(
+            Comment.objects.filter(depth=0),
+            "post_id",
+            post_ids,
+            comment_connection(),
+            ordering=COMMENT_ORDERINGS[order],
+            on_page=partial(queue_comments, loaders),
+            first=first,
+            after=after,
+            last=last,
+            before=before,
+        )
+
+    return load_pages(loaders.comment_pages, keys, fetch)
+
+
+@register_loader("reply_pages")
+def load_reply_pages(loaders, keys):
+    """Pages of a comment's direct replies."""
+
+    def fetch(comment_ids, order, first, after, last, before):
+        return paginate_groups(
+            Comment.objects.all(),
+            "parent_id",
+            comment_ids,
+            comment_connection(),
+            ordering=COMMENT_ORDERINGS[order],
+            on_page=partial(queue_comments, loaders),
+            first=first,
+            after=after,
+            last=last,
+            before=before,
+        )
+
+    return load_pages(loaders.reply_pages, keys, fetch)
+
+
+@register_loader("thread_pages")
+def load_thread_pages(loaders, keys):
+    """
+    Pages of the replies below a comment, ``max_depth`` levels deep, in
+    depth-first order. Threads rooted at the same depth are read with one
+    query, one path range scan per root.
+    """
+
+    def fetch(comment_ids, max_depth, first, after, last, before):
+        roots_by_depth = defaultdict(list)
+        for root in loaders.comments.load_many(comment_ids):
+            if root is not None:
+                roots_by_depth[root.depth].append(root)
+
+        connections = {}
+        for depth, roots in roots_by_depth.items():
+            queryset = Comment.objects.filter(depth__lte=depth + max_depth).annotate(
+                thread=Substr("path", 1, (depth + 1) * SEGMENT_WIDTH)
+            )
+            threads = paginate_groups(
+                queryset,
+                "thread",
+                {
+                    root.path: Q(post_id=root.post_id) & subtree_filter(root.path)
+                    for root in roots
+                },
+                comment_connection(),
+                ordering=("path",),
+                on_page=partial(queue_comments, loaders),
+                first=first,
+                after=after,
+                last=last,
+                before=before,
+            )
+            connections.update({root.id: threads[root.path] for root in roots})
+        return connections
+
+    return load_pages(loaders.thread_pages, keys, fetch)
+
+
+def queue_comments(loaders, comments):
+    for comment in comments:
+        loaders.comments.prime(comment.id, comment)
+    loaders.users.queue(comment.author_id for comment in comments)
+    loaders.posts.queue(comment.post_id for comment in comments)
+    comment_ids = [comment.id for comment in comments]
+    loaders.viewer_liked_comments.queue(comment_ids)
+    loaders.reply_pages.queue(comment_ids)
+    loaders.thread_pages.queue(comment_ids)
+    return comments
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("comments", "0002_comment_like_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "created_at", "id"], name="comments_post_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:07
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, LPad
+import django.db.models.deletion
+
+
+def backfill_paths(apps, schema_editor):
+    # Every existing comment is a root: its path is its own padded id.
+    Comment = apps.get_model("comments", "Comment")
+    Comment.objects.update(
+        path=LPad(Cast("id", models.CharField()), 10, models.Value("0"))
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("comments", "0003_comment_post_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="comments_post_created_id_idx",
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="replies",
+                to="comments.comment",
+            ),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="path",
+            field=models.CharField(default="", editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="reply_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "depth", "created_at", "id"],
+                name="comments_post_depth_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["parent", "created_at", "id"],
+                name="comments_parent_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["post", "path"], name="comments_post_path_idx"),
+        ),
+    ]
@@ -1,18 +1,63 @@
-from django.db import models
+from functools import partial
+from django.db import models, router
 from django.contrib.auth.models import User
 from posts.models import Post
+from comments.threads import save_with_path
+
+
+# Written by comments.threads and likes.counters, never by a full save.
+MAINTAINED_FIELDS = ("path", "depth", "reply_count", "like_count")
 
 
 class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="replies",
+        db_index=False,
+    )
+    # Materialized path and reply counts, see comments.threads.
+    path = models.CharField(max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     comment = models.TextField()
+    # Maintained by likes.counters, repaired by "manage.py reconcile_like_counts".
+    like_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            if kwargs.get("update_fields") is None:
+                kwargs["update_fields"] = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in MAINTAINED_FIELDS
+                ]
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get("using") or router.db_for_write(Comment, instance=self)
+        save = partial(super().save, *args, **kwargs)
+        return save_with_path(self, save, using=using)
+
     class Meta:
         verbose_name = "Comment"
         verbose_name_plural = "Comments"
+        indexes = [
+            models.Index(
+                fields=["post", "depth", "created_at", "id"],
+                name="comments_post_depth_idx",
+            ),
+            models.Index(
+                fields=["parent", "created_at", "id"],
+                name="comments_parent_created_idx",
+            ),
+            models.Index(fields=["post", "path"], name="comments_post_path_idx"),
+        ]
 
     def __str__(self):
         return self.comment
@@ -1,4 +1,5 @@
 import graphene
+from functools import partial
 from graphene_django import DjangoObjectType
 from graphql.error import GraphQLError
 from django.contrib.auth.models import User
@@ -6,6 +7,16 @@ from django.db.models import Q
 from .models import Comment
 from posts.models import Post
 from profiles.schema import UserType
+from postify.dataloaders import get_loaders
+from postify.pagination import paginator
+from comments.loaders import COMMENT_ORDERINGS, page_key, queue_comments
+from comments.threads import MAX_THREAD_DEPTH, ThreadTooDeep, delete_thread
+import posts.loaders
+
+
+class CommentOrder(graphene.Enum):
+    OLDEST = "oldest"
+    NEWEST = "newest"
 
 
 class CommentType(DjangoObjectType):
@@ -16,17 +27,70 @@ class CommentType(DjangoObjectType):
             "author",
             "author_id",
             "post",
+            "parent",
+            "depth",
+            "reply_count",
             "comment",
+            "like_count",
         )
 
     author_id = graphene.Int()
     author = graphene.Field(UserType)
+    parent = graphene.Field(lambda: CommentType)
+    viewer_has_liked = graphene.Boolean()
+    replies = graphene.relay.ConnectionField(
+        lambda: CommentConnection,
+        order=CommentOrder(description="Defaults to OLDEST."),
+        description="Direct replies to the comment.",
+    )
+    thread = graphene.relay.ConnectionField(
+        lambda: CommentConnection,
+        max_depth=graphene.Int(
+            description=f"Levels of replies to include, at most {MAX_THREAD_DEPTH}."
+        ),
+        description="Every reply below the comment, depth first.",
+    )
 
     def resolve_author_id(self, info):
         return self.author_id
 
     def resolve_author(self, info):
-        return self.author
+        return get_loaders(info).users.load(self.author_id)
+
+    def resolve_post(self, info):
+        return get_loaders(info).posts.load(self.post_id)
+
+    def resolve_parent(self, info):
+        return get_loaders(info).comments.load(self.parent_id)
+
+    def resolve_viewer_has_liked(self, info):
+        return get_loaders(info).viewer_liked_comments.load(self.id)
+
+    def resolve_replies(self, info, order=None, **kwargs):
+        order = getattr(order, "value", order) or "oldest"
+        return get_loaders(info).reply_pages.load(page_key(self.id, order, **kwargs))
+
+    def resolve_thread(self, info, max_depth=None, **kwargs):
+        if max_depth is None or max_depth > MAX_THREAD_DEPTH:
+            max_depth = MAX_THREAD_DEPTH
+        if max_depth < 1:
+            raise GraphQLError("maxDepth must be at least 1")
+        return get_loaders(info).thread_pages.load(
+            page_key(self.id, max_depth, **kwargs)
+        )
+
+
+class CommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = CommentType
+
+
+def comment_connection_field(**kwargs):
+    return graphene.relay.ConnectionField(
+        CommentConnection,
+        order=CommentOrder(description="Defaults to OLDEST."),
+        **kwargs,
+    )
 
 
 class CommentCreateInput(graphene.InputObjectType):
@@ -34,6 +98,7 @@ class CommentCreateInput(graphene.InputObjectType):
     author = graphene.ObjectType()
     author_id = graphene.ID(required=True)
     post_id = graphene.ID(required=True)
+    parent_id = graphene.ID(description="The comment this one replies to.")
 
 
 class CommentUpdateInput(graphene.InputObjectType):
@@ -42,10 +107,17 @@ class CommentUpdateInput(graphene.InputObjectType):
 
 
 class Query(graphene.ObjectType):
-    comments = graphene.List(CommentType, post_id=graphene.Int(required=True))
-
-    def resolve_posts(self, info, post_id):
-        return Comment.objects.filter(post__id=post_id)
+    comments = comment_connection_field(post_id=graphene.Int(required=True))
+
+    def resolve_comments(self, info, post_id, order=None, **kwargs):
+        order = getattr(order, "value", order) or "oldest"
+        return paginator(info)(
+            Comment.objects.filter(post_id=post_id, depth=0),
+            CommentConnection,
+            ordering=COMMENT_ORDERINGS[order],
+            on_page=partial(queue_comments, get_loaders(info)),
+            **kwargs,
+        )
 
 
 class CommentCreateMutation(graphene.Mutation):
@@ -65,14 +137,21 @@ class CommentCreateMutation(graphene.Mutation):
         try:
             author = User.objects.get(id=author_id)
             post = Post.objects.get(id=post_id)
+            parent = None
+            if input.parent_id is not None:
+                parent = Comment.objects.get(id=input.parent_id, post=post)
             comment = Comment.objects.create(
-                comment=comment_text, author=author, post=post
+                comment=comment_text, author=author, post=post, parent=parent
             )
             return CommentCreateMutation(comment=comment)
         except User.DoesNotExist:
             raise GraphQLError("Author not found.")
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
+        except Comment.DoesNotExist:
+            raise GraphQLError("Parent comment not found.")
+        except ThreadTooDeep as error:
+            raise GraphQLError(str(error))
 
 
 class CommentUpdateMutation(graphene.Mutation):
@@ -94,7 +173,7 @@ class CommentUpdateMutation(graphene.Mutation):
                 raise GraphQLError("User is not the author of the comment")
 
             comment.comment = comment_text
-            comment.save()
+            comment.save(update_fields=["comment", "updated_at"])
             return CommentUpdateMutation(comment=comment)
         except Comment.DoesNotExist:
             raise GraphQLError("Comment not found.")
@@ -118,7 +197,7 @@ class CommentDeleteMutation(graphene.Mutation):
         if comment.author != user:
             raise GraphQLError("Bad Request. User is not the author of this comment")
 
-        comment.delete()
+        delete_thread(comment)
         return CommentDeleteMutation(success=True)
 
 
@@ -1,3 +1,303 @@
-from django.test import TestCase
+import json
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+from comments.models import Comment
+from comments.threads import delete_thread
+from postify.testing import query_plan
+from posts.models import Post
 
-# Create your tests here.
+
+class CommentConnectionTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.posts = []
+        for index in range(3):
+            author = User.objects.create(username=f"author-{index}")
+            post = Post.objects.create(
+                title=f"Post {index}", content="content", author=author
+            )
+            for number in range(5):
+                Comment.objects.create(
+                    post=post, author=author, comment=f"{index}-{number}"
+                )
+            self.posts.append(post)
+
+    def fetch(self, query, **variables):
+        response = self.query(query, variables=variables)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]
+
+    def fetch_comments(self, **arguments):
+        return self.fetch(
+            """
+            query (
+                $postId: Int!, $order: CommentOrder, $first: Int, $after: String,
+                $last: Int, $before: String
+            ) {
+                comments(
+                    postId: $postId, order: $order, first: $first, after: $after,
+                    last: $last, before: $before
+                ) {
+                    edges { node { comment author { username } } }
+                    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+                }
+            }
+            """,
+            postId=self.posts[0].id,
+            **arguments,
+        )["comments"]
+
+    def test_comments_keyset_pagination(self):
+        comments = [f"0-{number}" for number in range(5)]
+
+        page = self.fetch_comments(first=2)
+        self.assertEqual([e["node"]["comment"] for e in page["edges"]], comments[:2])
+        self.assertEqual(page["edges"][0]["node"]["author"]["username"], "author-0")
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+
+        with self.assertNumQueries(2):
+            page = self.fetch_comments(first=3, after=page["pageInfo"]["endCursor"])
+        self.assertEqual([e["node"]["comment"] for e in page["edges"]], comments[2:])
+        self.assertFalse(page["pageInfo"]["hasNextPage"])
+
+        page = self.fetch_comments(last=2, before=page["pageInfo"]["startCursor"])
+        self.assertEqual([e["node"]["comment"] for e in page["edges"]], comments[:2])
+
+        page = self.fetch_comments(order="NEWEST", first=2)
+        self.assertEqual(
+            [e["node"]["comment"] for e in page["edges"]], comments[::-1][:2]
+        )
+        page = self.fetch_comments(
+            order="NEWEST", first=5, after=page["pageInfo"]["endCursor"]
+        )
+        self.assertEqual(
+            [e["node"]["comment"] for e in page["edges"]], comments[::-1][2:]
+        )
+
+    def test_post_comments_are_paginated_in_one_query(self):
+        query = """
+            query {
+                posts {
+                    edges {
+                        node {
+                            title
+                            comments(first: 2, order: NEWEST) {
+                                edges { node { comment author { username } } }
+                                pageInfo { hasNextPage }
+                            }
+                        }
+                    }
+                }
+            }
+        """
+        # Posts, comments and their authors.
+        with self.assertNumQueries(3):
+            data = self.fetch(query)
+        for edge in data["posts"]["edges"]:
+            index = edge["node"]["title"].split()[-1]
+            comments = edge["node"]["comments"]
+            self.assertEqual(
+                [e["node"]["comment"] for e in comments["edges"]],
+                [f"{index}-4", f"{index}-3"],
+            )
+            self.assertEqual(
+                comments["edges"][0]["node"]["author"]["username"], f"author-{index}"
+            )
+            self.assertTrue(comments["pageInfo"]["hasNextPage"])
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite query plans")
+    def test_each_post_page_is_an_index_range_with_a_limit(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.fetch(
+                "query { posts { edges { node { comments(first: 2) { edges "
+                "{ node { id } } } } } } }"
+            )
+        [sql] = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "comments_comment"' in query["sql"]
+        ]
+        plan = query_plan(sql)
+        # One LIMIT subquery per post, then rows by primary key.
+        self.assertEqual(
+            plan.count(
+                "SEARCH U0 USING COVERING INDEX comments_post_depth_idx "
+                "(post_id=? AND depth=?)"
+            ),
+            3,
+        )
+        self.assertFalse([step for step in plan if step.startswith("SCAN")])
+        self.assertEqual(
+            [step for step in plan if "TEMP B-TREE" in step],
+            ["USE TEMP B-TREE FOR ORDER BY"],
+        )
+
+
+class CommentThreadTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="replier")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.post = Post.objects.create(
+            title="Thread", content="content", author=self.user
+        )
+
+    def reply(self, text, parent=None):
+        response = self.query(
+            """
+            mutation ($input: CommentCreateInput!) {
+                createComment(input: $input) { comment { id depth } }
+            }
+            """,
+            variables={
+                "input": {
+                    "comment": text,
+                    "authorId": self.user.id,
+                    "postId": self.post.id,
+                    "parentId": parent and parent.id,
+                }
+            },
+            headers=self.headers,
+        )
+        self.assertResponseNoErrors(response)
+        comment_id = json.loads(response.content)["data"]["createComment"]["comment"]
+        return Comment.objects.get(id=comment_id["id"])
+
+    def fetch(self, query, **variables):
+        response = self.query(query, variables=variables)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]
+
+    def test_replies_are_stored_as_paths(self):
+        root = self.reply("root")
+        first = self.reply("first", root)
+        nested = self.reply("nested", first)
+        second = self.reply("second", root)
+        self.assertEqual((root.depth, first.depth, nested.depth), (0, 1, 2))
+        self.assertTrue(nested.path.startswith(first.path))
+        root.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual((root.reply_count, first.reply_count), (2, 1))
+
+        data = self.fetch(
+            """
+            query ($postId: Int!) {
+                comments(postId: $postId) {
+                    edges {
+                        node {
+                            comment
+                            replyCount
+                            replies(first: 1) {
+                                edges { node { comment parent { comment } } }
+                                pageInfo { hasNextPage }
+                            }
+                            thread { edges { node { comment depth } } }
+                        }
+                    }
+                }
+            }
+            """,
+            postId=self.post.id,
+        )
+        # Top-level comments, then one query for every thread.
+        with self.assertNumQueries(2):
+            self.fetch(
+                "query ($postId: Int!) { comments(postId: $postId) { edges { node "
+                "{ thread { edges { node { id } } } } } } }",
+                postId=self.post.id,
+            )
+        [edge] = data["comments"]["edges"]
+        node = edge["node"]
+        self.assertEqual((node["comment"], node["replyCount"]), ("root", 2))
+        self.assertEqual(
+            node["replies"]["edges"][0]["node"],
+            {"comment": "first", "parent": {"comment": "root"}},
+        )
+        self.assertTrue(node["replies"]["pageInfo"]["hasNextPage"])
+        self.assertEqual(
+            [
+                (e["node"]["comment"], e["node"]["depth"])
+                for e in node["thread"]["edges"]
+            ],
+            [("first", 1), ("nested", 2), ("second", 1)],
+        )
+
+        data = self.fetch(
+            """
+            query ($postId: Int!) {
+                comments(postId: $postId) {
+                    edges { node { thread(maxDepth: 1) { edges { node { comment } } } } }
+                }
+            }
+            """,
+            postId=self.post.id,
+        )
+        thread = data["comments"]["edges"][0]["node"]["thread"]["edges"]
+        self.assertEqual([e["node"]["comment"] for e in thread], ["first", "second"])
+
+        response = self.query(
+            "mutation ($id: ID!) { deleteComment(id: $id) { success } }",
+            variables={"id": first.id},
+            headers=self.headers,
+        )
+        self.assertResponseNoErrors(response)
+        self.assertFalse(Comment.objects.filter(id__in=[first.id, nested.id]).exists())
+        root.refresh_from_db()
+        self.assertEqual(root.reply_count, 1)
+        self.assertTrue(Comment.objects.filter(id=second.id).exists())
+
+    def test_edits_keep_paths_and_reply_counts(self):
+        root = self.reply("root")
+        reply = self.reply("reply", root)
+        stale = Comment.objects.get(id=root.id)
+        self.reply("another", root)
+
+        stale.comment = "edited"
+        stale.save()
+        reply.save()
+        root.refresh_from_db()
+        self.assertEqual((root.comment, root.reply_count), ("edited", 2))
+        self.assertEqual(Comment.objects.filter(depth=1).count(), 2)
+
+    def test_delete_thread_needs_a_path(self):
+        root = self.reply("root")
+        self.reply("reply", root)
+        orphan = Comment.objects.create(post=self.post, author=self.user, comment="x")
+        Comment.objects.filter(id=orphan.id).update(path="")
+        orphan.refresh_from_db()
+        with self.assertRaises(ValueError):
+            delete_thread(orphan)
+        self.assertEqual(Comment.objects.count(), 3)
+
+        Comment.objects.filter(id=root.id).delete()
+        self.assertEqual(delete_thread(root), 0)
+
+    def test_replies_stay_on_the_parent_post(self):
+        root = self.reply("root")
+        other = Post.objects.create(title="Other", content="content", author=self.user)
+        response = self.query(
+            """
+            mutation ($input: CommentCreateInput!) {
+                createComment(input: $input) { comment { id } }
+            }
+            """,
+            variables={
+                "input": {
+                    "comment": "misplaced",
+                    "authorId": self.user.id,
+                    "postId": other.id,
+                    "parentId": root.id,
+                }
+            },
+            headers=self.headers,
+        )
+        self.assertEqual(
+            json.loads(response.content)["errors"][0]["message"],
+            "Parent comment not found.",
+        )
@@ -0,0 +1,72 @@
+"""
+Threaded replies stored as materialized paths.
+
+A comment's ``path`` is its ancestors' ids followed by its own, each
+zero-padded to ``SEGMENT_WIDTH`` digits, so the paths of a subtree all start
+with the path of its root and sort depth-first in creation order. Fetching a
+whole thread is one range scan of the ``(post, path)`` index. ``depth`` is the
+number of ancestors and ``reply_count`` the number of direct replies, kept up
+to date by ``save_with_path`` and ``delete_thread``.
+"""
+
+from django.db import transaction
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Cast, LPad
+
+SEGMENT_WIDTH = 10
+MAX_THREAD_DEPTH = 16
+# Sorts after every digit, bounding the paths that start with a prefix.
+PATH_END = ":"
+
+
+class ThreadTooDeep(Exception):
+    pass
+
+
+def path_segment(pk):
+    return str(pk).zfill(SEGMENT_WIDTH)
+
+
+def root_path():
+    """The path of a top-level comment as an expression, for bulk writes."""
+    return LPad(Cast("id", CharField()), SEGMENT_WIDTH, Value("0"))
+
+
+def subtree_filter(path):
+    """Rows strictly below the comment at ``path``."""
+    return Q(path__gt=path, path__lt=path + PATH_END)
+
+
+def save_with_path(comment, save, using="default"):
+    """Insert ``comment`` and fill in its path, bumping its parent's replies."""
+    parent = comment.parent if comment.parent_id else None
+    comment.depth = parent.depth + 1 if parent else 0
+    if comment.depth > MAX_THREAD_DEPTH:
+        raise ThreadTooDeep(f"Replies are limited to {MAX_THREAD_DEPTH} levels")
+
+    comments = type(comment).objects.using(using)
+    with transaction.atomic(using=using):
+        save()
+        comment.path = (parent.path if parent else "") + path_segment(comment.pk)
+        comments.filter(pk=comment.pk).update(path=comment.path)
+        if parent:
+            comments.filter(pk=parent.pk).update(reply_count=F("reply_count") + 1)
+
+
+def delete_thread(comment):
+    """Delete ``comment`` and its replies, returning how many were deleted."""
+    if not comment.path:
+        # subtree_filter("") would match every threaded comment of the post.
+        raise ValueError(f"Comment {comment.pk} has no thread path")
+    comments = type(comment).objects.filter(post_id=comment.post_id)
+    with transaction.atomic():
+        deleted = (
+            comments.filter(Q(pk=comment.pk) | subtree_filter(comment.path))
+            .delete()[1]
+            .get(comment._meta.label, 0)
+        )
+        if comment.parent_id:
+            comments.filter(pk=comment.parent_id, reply_count__gte=1).update(
+                reply_count=F("reply_count") - 1
+            )
+    return deleted
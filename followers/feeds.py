@@ -0,0 +1,37 @@
+"""
+On-read feeds merged from per-source streams.
+
+Each followed tag and each followed author is its own stream of posts in
+``(created_at, id)`` order. A page reads at most one page past the cursor
+from every stream, each stream by its own ``ORDER BY ... LIMIT`` subquery on
+the ``(tag, created_at, post)`` index of the tag links or the ``(author,
+created_at, id)`` index of the posts, and k-way merges the streams, dropping
+posts reached through several sources, until the page is full.
+"""
+
+from django.db.models import F
+from postify.pagination import paginate_merged
+from posts.models import Post
+
+
+def tag_source(tags):
+    """Posts tagged with any of ``tags``, one stream per tag."""
+    posts = (
+        Post.objects.filter(tag_links__isnull=False)
+        .annotate(feed_tag=F("tag_links__tag_id"), feed_link=F("tag_links__id"))
+        .alias(
+            feed_created_at=F("tag_links__created_at"),
+            feed_post_id=F("tag_links__post_id"),
+        )
+    )
+    return posts, ("-feed_created_at", "-feed_post_id"), "feed_tag", tags, "feed_link"
+
+
+def author_source(authors, **filters):
+    """Posts written by any of ``authors``, one stream per author."""
+    posts = Post.objects.filter(**filters)
+    return posts, ("-created_at", "-id"), "author_id", authors
+
+
+def read_merged(sources, connection_type, on_page=None, **kwargs):
+    return paginate_merged(sources, connection_type, on_page=on_page, **kwargs)
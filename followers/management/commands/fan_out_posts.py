@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from followers.timeline import fan_out_posts
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Write published posts to their readers' timelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=1000,
+            help="Fan out the latest LIMIT published posts.",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        post_ids = list(
+            Post.objects.filter(published=True)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)[: options["limit"]]
+        )
+        written = 0
+        for start in range(0, len(post_ids), options["batch_size"]):
+            written += fan_out_posts(post_ids[start : start + options["batch_size"]])
+        self.stdout.write(
+            f"Wrote {written} timeline entries for {len(post_ids)} posts."
+        )
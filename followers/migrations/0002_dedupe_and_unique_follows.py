@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:56
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def dedupe_follows(apps, schema_editor):
+    """Keep the oldest row of each duplicated follow."""
+    for model_name, fields in (
+        ("UserFollower", ("follower", "followed_user")),
+        ("UserTag", ("follower", "tag")),
+    ):
+        model = apps.get_model("followers", model_name)
+        keep = (
+            model.objects.order_by().values(*fields).annotate(keep=Min("id")).values("keep")
+        )
+        model.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("followers", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="userfollower",
+            constraint=models.UniqueConstraint(
+                fields=("follower", "followed_user"),
+                name="followers_userfollower_follower_followed_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="usertag",
+            constraint=models.UniqueConstraint(
+                fields=("follower", "tag"), name="followers_usertag_follower_tag_uniq"
+            ),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
-from posts.models import Tag
+from posts.models import Post, Tag
 
 
 class UserFollower(models.Model):
@@ -16,6 +16,12 @@ class UserFollower(models.Model):
         ordering = ["-created_at"]
         verbose_name = "User Follower"
         verbose_name_plural = "User Followers"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "followed_user"],
+                name="followers_userfollower_follower_followed_uniq",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} is following {self.followed_user.username}"
@@ -32,6 +38,50 @@ class UserTag(models.Model):
         ordering = ["-created_at"]
         verbose_name = "User Tag"
         verbose_name_plural = "User Tags"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "tag"], name="followers_usertag_follower_tag_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} is following {self.tag.name}"
+
+
+class TimelineEntry(models.Model):
+    """A published post in a user's ``userFeed``, see followers.timeline."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline")
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # The post's created_at, so the feed is read in order from the index alone.
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Timeline Entry"
+        verbose_name_plural = "Timeline Entries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="followers_timeline_user_post_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "post"],
+                name="followers_timeline_user_idx",
+            ),
+        ]
+
+
+class CelebrityAuthor(models.Model):
+    """An author whose posts are merged into feeds when read, not fanned out."""
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="celebrity"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Celebrity Author"
+        verbose_name_plural = "Celebrity Authors"
@@ -1,11 +1,27 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.db.models import Q
 from django.core.paginator import Paginator
+from django.utils import timezone
 from graphene_django import DjangoObjectType
 from graphql.error import GraphQLError
-from posts.schema import PostType
+from posts.schema import PostConnection
+from posts.models import Tag
+from posts.loaders import queue_posts
+from followers.feeds import read_merged, tag_source
 from followers.models import UserFollower, UserTag
+from followers.timeline import (
+    backfill_follow,
+    backfill_tag,
+    read_feed,
+    remove_follow,
+    remove_tag,
+    submit_on_commit,
+)
 from profiles.schema import UserType
+from postify.dataloaders import get_loaders
+from postify.aio import is_async
+from postify.sql import insert_ignore
+from functools import partial
 import graphene
 
 
@@ -18,10 +34,16 @@ class UserFollowerType(DjangoObjectType):
     user = graphene.Field(UserType)
 
     def resolve_user_id(self, info):
-        return self.user_id
+        return self.follower_id
 
     def resolve_user(self, info):
-        return self.user
+        return get_loaders(info).users.load(self.follower_id)
+
+    def resolve_follower(self, info):
+        return get_loaders(info).users.load(self.follower_id)
+
+    def resolve_followed_user(self, info):
+        return get_loaders(info).users.load(self.followed_user_id)
 
 
 class UserTagType(DjangoObjectType):
@@ -33,83 +55,121 @@ class UserTagType(DjangoObjectType):
     user = graphene.Field(UserType)
 
     def resolve_user_id(self, info):
-        return self.user_id
+        return self.follower_id
 
     def resolve_user(self, info):
-        return self.user
+        return get_loaders(info).users.load(self.follower_id)
+
+    def resolve_follower(self, info):
+        return get_loaders(info).users.load(self.follower_id)
+
+    def resolve_tag(self, info):
+        return get_loaders(info).tags.load(self.tag_id)
 
 
 class Query(graphene.ObjectType):
     user_tag_follower_count = graphene.Int(tag_id=graphene.Int(required=True))
     user_follower_count = graphene.Int(user_id=graphene.Int(required=True))
-    posts_by_followed_tags = graphene.List(PostType)
-    user_feed = graphene.List(PostType)
+    posts_by_followed_tags = graphene.relay.ConnectionField(PostConnection)
+    user_feed = graphene.relay.ConnectionField(PostConnection)
 
     def resolve_user_tag_follower_count(self, info, tag_id):
-        return UserTag.objects.filter(tag__id=tag_id).count()
+        followers = UserTag.objects.filter(tag__id=tag_id)
+        return followers.acount() if is_async(info) else followers.count()
 
     def resolve_user_followers_count(self, info, user_id):
-        return UserFollower.objects.filter(followed_user__id=user_id).count()
+        followers = UserFollower.objects.filter(followed_user__id=user_id)
+        return followers.acount() if is_async(info) else followers.count()
 
-    def resolve_posts_by_followed_tags(self, info):
+    def resolve_posts_by_followed_tags(self, info, **kwargs):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        followed_tags = user.user_tags.values_list("tag", flat=True)
-        posts = Post.objects.filter(tags__in=followed_tags)
-        return posts
-
-    def resolve_user_feed(self, info):
+        followed_tags = UserTag.objects.filter(follower=user).values_list(
+            "tag_id", flat=True
+        )
+        feed = partial(
+            read_merged,
+            [tag_source(followed_tags)],
+            PostConnection,
+            on_page=partial(queue_posts, get_loaders(info)),
+            **kwargs
+        )
+        return sync_to_async(feed)() if is_async(info) else feed()
+
+    def resolve_user_feed(self, info, **kwargs):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        followed_tags = user.user_tags.values_list("tag", flat=True)
-        followers = user.followers.values_list("followed_user", flat=True)
-        user_feed = Post.objects.filter(
-            Q(author__in=followers) | Q(tags__in=followed_tags)
-        ).order_by("-created_at")
-        return user_feed
+        feed = partial(
+            read_feed,
+            user,
+            PostConnection,
+            on_page=partial(queue_posts, get_loaders(info)),
+            **kwargs
+        )
+        return sync_to_async(feed)() if is_async(info) else feed()
 
 
 class FollowUserMutation(graphene.Mutation):
     user_follower = graphene.Field(UserFollowerType)
 
     class Arguments:
-        follower_id = graphene.Int(required=True)
+        follower_id = graphene.Int(
+            description="Deprecated, the authenticated user is the follower."
+        )
         followed_user_id = graphene.Int(required=True)
 
-    def mutate(self, info, followed_user_id):
+    def mutate(self, info, followed_user_id, follower_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        try:
-            followed_user = User.objects.get(id=followed_user_id)
-            user_follower, created = UserFollower.objects.get_or_create(
-                follower=user, followed_user=followed_user
-            )
-            return FollowUserMutation(follower=user_follower)
-        except User.DoesNotExist:
-            raise GraphQLError("User not found")
+        if follower_id is not None and int(follower_id) != user.id:
+            raise GraphQLError("User is not authorized")
+        keys = {"follower_id": user.id, "followed_user_id": followed_user_id}
+        now = timezone.now()
+        user_follower_id = insert_ignore(
+            UserFollower,
+            {**keys, "created_at": now},
+            ("follower", "followed_user"),
+            requires=(User, followed_user_id),
+        )
+        if user_follower_id is not None:
+            user_follower = UserFollower(id=user_follower_id, created_at=now, **keys)
+            submit_on_commit(backfill_follow, user.id, followed_user_id)
+        else:
+            user_follower = UserFollower.objects.filter(**keys).first()
+            if user_follower is None:
+                raise GraphQLError("User not found")
+        return FollowUserMutation(user_follower=user_follower)
 
 
 class UnfollowUserMutation(graphene.Mutation):
     success = graphene.Boolean()
 
     class Arguments:
-        user_follower_id = graphene.Int(required=True)
+        followed_user_id = graphene.Int()
+        user_follower_id = graphene.Int(description="Deprecated, use followedUserId.")
 
-    def mutate(self, info, user_follower_id):
+    def mutate(self, info, followed_user_id=None, user_follower_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        try:
-            user_follower = UserFollower.objects.get(id=user_follower_id, follower=user)
-            user_follower.delete()
-            return UnfollowUserMutation(success=True)
-        except UserFollower.DoesNotExist:
-            raise GraphQLError(
-                "UserFollower not found or you are not authorized to unfollow"
+        if followed_user_id is not None:
+            follows = UserFollower.objects.filter(
+                follower=user, followed_user_id=followed_user_id
             )
+        elif user_follower_id is not None:
+            follows = UserFollower.objects.filter(id=user_follower_id, follower=user)
+            followed_user_id = follows.values_list(
+                "followed_user_id", flat=True
+            ).first()
+        else:
+            raise GraphQLError("Bad Request. Provide followedUserId")
+        deleted, _ = follows.delete()
+        if deleted:
+            submit_on_commit(remove_follow, user.id, followed_user_id)
+        return UnfollowUserMutation(success=bool(deleted))
 
 
 class CreateUserTagMutation(graphene.Mutation):
@@ -122,33 +182,46 @@ class CreateUserTagMutation(graphene.Mutation):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        try:
-            tag = Tag.objects.get(id=tag_id)
-            user_tag, created = UserTag.objects.get_or_create(tag=tag, follower=user)
-            return CreateUserTagMutation(user_tag=user_tag)
-        except Tag.DoesNotExist:
-            raise GraphQLError("Tag not found")
+        keys = {"follower_id": user.id, "tag_id": tag_id}
+        now = timezone.now()
+        user_tag_id = insert_ignore(
+            UserTag,
+            {**keys, "created_at": now},
+            ("follower", "tag"),
+            requires=(Tag, tag_id),
+        )
+        if user_tag_id is not None:
+            user_tag = UserTag(id=user_tag_id, created_at=now, **keys)
+            submit_on_commit(backfill_tag, user.id, tag_id)
+        else:
+            user_tag = UserTag.objects.filter(**keys).first()
+            if user_tag is None:
+                raise GraphQLError("Tag not found")
+        return CreateUserTagMutation(user_tag=user_tag)
 
 
 class RemoveUserTagMutation(graphene.Mutation):
     success = graphene.Boolean()
 
     class Arguments:
-        user_tag_id = graphene.Int(required=True)
+        tag_id = graphene.Int()
+        user_tag_id = graphene.Int(description="Deprecated, use tagId.")
 
-    def mutate(self, info, user_tag_id):
+    def mutate(self, info, tag_id=None, user_tag_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-        try:
-            user_tag = UserTag.objects.get(id=user_tag_id)
-            if user_tag.follower != user:
-                raise GraphQLError("User is not authorized")
-
-            user_tag.delete()
-            return RemoveUserTagMutation(success=True)
-        except UserTag.DoesNotExist:
-            raise GraphQLError("User tag not found")
+        if tag_id is not None:
+            user_tags = UserTag.objects.filter(follower=user, tag_id=tag_id)
+        elif user_tag_id is not None:
+            user_tags = UserTag.objects.filter(id=user_tag_id, follower=user)
+            tag_id = user_tags.values_list("tag_id", flat=True).first()
+        else:
+            raise GraphQLError("Bad Request. Provide tagId")
+        deleted, _ = user_tags.delete()
+        if deleted:
+            submit_on_commit(remove_tag, user.id, tag_id)
+        return RemoveUserTagMutation(success=bool(deleted))
 
 
 class Mutation(graphene.ObjectType):
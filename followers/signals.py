@@ -0,0 +1,9 @@
+from django.dispatch import receiver
+from followers.timeline import fan_out_posts, submit_on_commit
+from posts.signals import post_published, post_tagged
+
+
+@receiver(post_published)
+@receiver(post_tagged)
+def fan_out_published_posts(sender, post_ids, **kwargs):
+    submit_on_commit(fan_out_posts, list(post_ids))
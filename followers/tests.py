@@ -1,3 +1,390 @@
-from django.test import TestCase
+import io
+import json
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+from followers.models import CelebrityAuthor, TimelineEntry, UserFollower, UserTag
+from followers.timeline import fan_out_posts, fanout
+from postify.testing import query_plan
+from posts.flags import toggle_post_flag
+from posts.models import Post, Tag
 
-# Create your tests here.
+
+class FollowMutationTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="follower")
+        self.other = User.objects.create(username="followed")
+        self.tag = Tag.objects.create(name="followed-tag")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+    def mutate(self, query, **variables):
+        response = self.query(query, variables=variables, headers=self.headers)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]
+
+    def follow(self, user_id):
+        return self.query(
+            """
+            mutation ($id: Int!) {
+                followUser(followedUserId: $id) {
+                    userFollower { id followedUser { username } }
+                }
+            }
+            """,
+            variables={"id": user_id},
+            headers=self.headers,
+        )
+
+    def test_follow_is_idempotent(self):
+        # Authentication, the INSERT and loading followedUser.
+        with self.assertNumQueries(3):
+            response = self.follow(self.other.id)
+        self.assertResponseNoErrors(response)
+        payload = json.loads(response.content)["data"]["followUser"]["userFollower"]
+        self.assertEqual(payload["followedUser"]["username"], "followed")
+
+        again = json.loads(self.follow(self.other.id).content)
+        self.assertEqual(
+            again["data"]["followUser"]["userFollower"]["id"], payload["id"]
+        )
+        self.assertEqual(UserFollower.objects.count(), 1)
+
+        response = self.follow(0)
+        self.assertEqual(
+            json.loads(response.content)["errors"][0]["message"], "User not found"
+        )
+
+    def test_unfollow_is_keyed_by_the_followed_user(self):
+        self.follow(self.other.id)
+        query = """
+            mutation ($id: Int!) { unfollowUser(followedUserId: $id) { success } }
+        """
+        with self.assertNumQueries(2):
+            data = self.mutate(query, id=self.other.id)
+        self.assertTrue(data["unfollowUser"]["success"])
+        self.assertFalse(
+            self.mutate(query, id=self.other.id)["unfollowUser"]["success"]
+        )
+        self.assertFalse(UserFollower.objects.exists())
+
+    def test_tag_follows(self):
+        query = """
+            mutation ($id: Int!) { createUserTag(tagId: $id) { userTag { id } } }
+        """
+        first = self.mutate(query, id=self.tag.id)["createUserTag"]["userTag"]["id"]
+        second = self.mutate(query, id=self.tag.id)["createUserTag"]["userTag"]["id"]
+        self.assertEqual(first, second)
+        self.assertEqual(UserTag.objects.count(), 1)
+
+        data = self.mutate(
+            "mutation ($id: Int!) { removeUserTag(tagId: $id) { success } }",
+            id=self.tag.id,
+        )
+        self.assertTrue(data["removeUserTag"]["success"])
+        self.assertFalse(UserTag.objects.exists())
+
+
+class FollowedTagsFeedTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+    FEED = """
+        query ($first: Int, $after: String) {
+            postsByFollowedTags(first: $first, after: $after) {
+                edges { node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.viewer = User.objects.create(username="reader")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.viewer)}"}
+        self.tags = [Tag.objects.create(name=f"tag-{index}") for index in range(3)]
+        for tag in self.tags[:2]:
+            UserTag.objects.create(follower=self.viewer, tag=tag)
+        # Oldest first: "both" has the two followed tags.
+        for title, tags in [
+            ("unfollowed", self.tags[2:]),
+            ("first", self.tags[:1]),
+            ("both", self.tags[:2]),
+            ("second", self.tags[1:2]),
+        ]:
+            post = Post.objects.create(
+                title=title, content="content", author=self.viewer
+            )
+            post.tags.set(tags)
+
+    def feed(self, **variables):
+        response = self.query(self.FEED, variables=variables, headers=self.headers)
+        self.assertResponseNoErrors(response)
+        feed = json.loads(response.content)["data"]["postsByFollowedTags"]
+        return [edge["node"]["title"] for edge in feed["edges"]], feed["pageInfo"]
+
+    def test_streams_are_merged_without_duplicates(self):
+        # Authentication, the followed tags and one query for their streams.
+        with self.assertNumQueries(3):
+            titles, page_info = self.feed()
+        self.assertEqual(titles, ["second", "both", "first"])
+        self.assertFalse(page_info["hasNextPage"])
+
+        titles, page_info = self.feed(first=2)
+        self.assertEqual(titles, ["second", "both"])
+        self.assertTrue(page_info["hasNextPage"])
+        titles, page_info = self.feed(first=2, after=page_info["endCursor"])
+        self.assertEqual(titles, ["first"])
+        self.assertFalse(page_info["hasNextPage"])
+
+    def test_thousands_of_followed_tags(self):
+        tags = Tag.objects.bulk_create(
+            [Tag(name=f"many-{index}") for index in range(1100)]
+        )
+        UserTag.objects.bulk_create(
+            [UserTag(follower=self.viewer, tag=tag) for tag in tags]
+        )
+        post = Post.objects.create(title="last", content="content", author=self.viewer)
+        post.tags.add(tags[-1])
+        titles, page_info = self.feed(first=2)
+        self.assertEqual(titles, ["last", "second"])
+        self.assertTrue(page_info["hasNextPage"])
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite query plans")
+    def test_each_tag_stream_is_an_index_range_with_a_limit(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.feed(first=1)
+        [sql] = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "posts_post"' in query["sql"]
+        ]
+        plan = query_plan(sql)
+        # One LIMIT subquery per followed tag on the index, then rows by
+        # primary key. SQLite lists the subqueries under every OR branch.
+        self.assertEqual(
+            {step for step in plan if step.startswith("LIST SUBQUERY")},
+            {"LIST SUBQUERY 1", "LIST SUBQUERY 2"},
+        )
+        self.assertEqual(
+            {step for step in plan if step.startswith("SEARCH U1")},
+            {
+                "SEARCH U1 USING COVERING INDEX posts_posttag_tag_created_idx "
+                "(tag_id=?)"
+            },
+        )
+        self.assertFalse([step for step in plan if step.startswith("SCAN")])
+        self.assertEqual(
+            [step for step in plan if "TEMP B-TREE" in step],
+            ["USE TEMP B-TREE FOR ORDER BY"],
+        )
+
+
+@override_settings(TIMELINE={"BACKGROUND": False, "CELEBRITY_FOLLOWERS": 2})
+class TimelineTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+    FEED = """
+        query ($first: Int, $after: String) {
+            userFeed(first: $first, after: $after) {
+                edges { node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.viewer = User.objects.create(username="reader")
+        self.author = User.objects.create(username="author")
+        self.tag = Tag.objects.create(name="timeline")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.viewer)}"}
+        UserFollower.objects.create(follower=self.viewer, followed_user=self.author)
+        UserTag.objects.create(follower=self.viewer, tag=self.tag)
+
+    def publish(self, title, author=None, published=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                title=title,
+                content="content",
+                author=author or self.author,
+                published=published,
+            )
+
+    def feed(self, **variables):
+        response = self.query(self.FEED, variables=variables, headers=self.headers)
+        self.assertResponseNoErrors(response)
+        feed = json.loads(response.content)["data"]["userFeed"]
+        return [edge["node"]["title"] for edge in feed["edges"]], feed["pageInfo"]
+
+    def test_published_posts_are_fanned_out(self):
+        self.publish("Followed")
+        draft = self.publish("Draft", published=False)
+        stranger = User.objects.create(username="stranger")
+        tagged = self.publish("Tagged", author=stranger, published=False)
+        tagged.tags.add(self.tag)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.viewer).count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.query(
+                "mutation ($id: ID!) { postTogglePublish(id: $id) { value } }",
+                variables={"id": tagged.id},
+                headers=self.headers,
+            )
+        self.assertResponseNoErrors(response)
+        titles, page_info = self.feed()
+        self.assertEqual(titles, ["Tagged", "Followed"])
+        self.assertNotIn(draft.id, TimelineEntry.objects.values_list("post", flat=True))
+
+        titles, page_info = self.feed(first=1)
+        self.assertEqual(titles, ["Tagged"])
+        self.assertTrue(page_info["hasNextPage"])
+        titles, page_info = self.feed(first=1, after=page_info["endCursor"])
+        self.assertEqual(titles, ["Followed"])
+        self.assertFalse(page_info["hasNextPage"])
+
+    def test_celebrity_posts_are_merged_when_read(self):
+        self.publish("Before")
+        for index in range(2):
+            fan = User.objects.create(username=f"fan-{index}")
+            UserFollower.objects.create(follower=fan, followed_user=self.author)
+        self.publish("After")
+        self.assertTrue(CelebrityAuthor.objects.filter(user=self.author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(post__title="After").exists())
+        self.publish("Fanned", author=User.objects.create(username="other"))
+
+        # "Before" is both in the timeline and read from the celebrity.
+        self.assertEqual(self.feed()[0], ["After", "Before"])
+        with self.assertNumQueries(4):
+            self.query(self.FEED, headers=self.headers)
+
+    @skipUnless(connection.vendor == "sqlite", "Reads SQLite query plans")
+    def test_each_celebrity_stream_is_an_index_range_with_a_limit(self):
+        for author in [self.author, User.objects.create(username="famous")]:
+            CelebrityAuthor.objects.create(user=author)
+            UserFollower.objects.get_or_create(
+                follower=self.viewer, followed_user=author
+            )
+        with CaptureQueriesContext(connection) as queries:
+            self.feed(first=1)
+        [sql] = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'U0."author_id"' in query["sql"]
+        ]
+        plan = query_plan(sql)
+        # One LIMIT subquery per celebrity on the index, then rows by
+        # primary key. SQLite lists the subqueries under every OR branch.
+        self.assertEqual(
+            {step for step in plan if step.startswith("LIST SUBQUERY")},
+            {"LIST SUBQUERY 1", "LIST SUBQUERY 2"},
+        )
+        self.assertEqual(
+            {step for step in plan if step.startswith("SEARCH U0")},
+            {"SEARCH U0 USING INDEX posts_post_author_created_idx (author_id=?)"},
+        )
+        self.assertFalse([step for step in plan if step.startswith("SCAN")])
+        self.assertEqual(
+            [step for step in plan if "TEMP B-TREE" in step],
+            ["USE TEMP B-TREE FOR ORDER BY"],
+        )
+
+    def test_follows_backfill_and_clean_up_the_timeline(self):
+        other = User.objects.create(username="other")
+        self.publish("Earlier", author=other)
+        self.assertEqual(self.feed()[0], [])
+
+        follow = """
+            mutation ($id: Int!) {
+                followUser(followedUserId: $id) { userFollower { id } }
+            }
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(follow, variables={"id": other.id}, headers=self.headers)
+        self.assertEqual(self.feed()[0], ["Earlier"])
+
+        unfollow = (
+            "mutation ($id: Int!) { unfollowUser(followedUserId: $id) { success } }"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            tagged = self.publish("Tagged", author=other, published=False)
+            tagged.tags.add(self.tag)
+            toggle_post_flag(tagged.id, "published")
+        self.assertEqual(self.feed()[0], ["Tagged", "Earlier"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(unfollow, variables={"id": other.id}, headers=self.headers)
+        # "Tagged" still reaches the viewer through the followed tag.
+        self.assertEqual(self.feed()[0], ["Tagged"])
+
+    def test_tag_follows_backfill_and_clean_up_the_timeline(self):
+        later = Tag.objects.create(name="later")
+        stranger = User.objects.create(username="stranger")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.publish("Stranger's", author=stranger).tags.add(later)
+            self.publish("Followed's").tags.add(later)
+        self.assertEqual(self.feed()[0], ["Followed's"])
+
+        follow = """
+            mutation ($id: Int!) { createUserTag(tagId: $id) { userTag { id } } }
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(follow, variables={"id": later.id}, headers=self.headers)
+        self.assertEqual(self.feed()[0], ["Followed's", "Stranger's"])
+
+        unfollow = "mutation ($id: Int!) { removeUserTag(tagId: $id) { success } }"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.query(unfollow, variables={"id": later.id}, headers=self.headers)
+        # "Followed's" still reaches the viewer through its author.
+        self.assertEqual(self.feed()[0], ["Followed's"])
+
+    def test_posts_tagged_after_publishing_reach_tag_followers(self):
+        stranger = User.objects.create(username="stranger")
+        added = self.publish("Added", author=stranger)
+        replaced = self.publish("Replaced", author=stranger)
+        self.assertEqual(self.feed()[0], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added.tags.add(self.tag)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.query(
+                """
+                mutation ($postId: ID!, $tagIds: [ID!]) {
+                    setPostTags(postId: $postId, tagIds: $tagIds) { tags { name } }
+                }
+                """,
+                variables={"postId": replaced.id, "tagIds": [self.tag.id]},
+                headers=self.headers,
+            )
+        self.assertResponseNoErrors(response)
+        self.assertEqual(self.feed()[0], ["Replaced", "Added"])
+
+    def test_fan_out_counts_new_entries_only(self):
+        post = Post.objects.create(
+            title="Counted", content="content", author=self.author, published=True
+        )
+        self.assertEqual(fan_out_posts([post.id]), 1)
+        self.assertEqual(fan_out_posts([post.id]), 0)
+
+    def test_fan_out_posts_command(self):
+        post = Post.objects.create(
+            title="Imported", content="content", author=self.author, published=True
+        )
+        stdout = io.StringIO()
+        call_command("fan_out_posts", stdout=stdout)
+        self.assertIn("Wrote 1 timeline entries for 1 posts", stdout.getvalue())
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+
+
+class TimelineFanoutTestCase(TransactionTestCase):
+    def test_fan_out_runs_in_the_background(self):
+        reader = User.objects.create(username="reader")
+        author = User.objects.create(username="author")
+        UserFollower.objects.create(follower=reader, followed_user=author)
+        post = Post.objects.create(
+            title="Background", content="content", author=author, published=True
+        )
+        fanout.join()
+        self.assertTrue(TimelineEntry.objects.filter(user=reader, post=post).exists())
+        fanout.close()
@@ -0,0 +1,244 @@
+"""
+Fan-out-on-write timelines for ``userFeed``.
+
+When a post is published (``posts.signals.post_published``) it is written
+to the ``TimelineEntry`` rows of the author's followers and of the followers
+of its tags, in batched INSERTs run by a background thread once the
+publishing transaction commits. A published post that gets new tags
+(``posts.signals.post_tagged``) is fanned out again. ``userFeed`` then pages
+through the viewer's timeline on the ``(user, created_at, post)`` index.
+
+Authors with more than ``CELEBRITY_FOLLOWERS`` followers are marked as
+``CelebrityAuthor`` and skipped by the fan-out: their posts are merged into
+the feeds of their followers when read, see ``followers.feeds``. Tags are
+always fanned out. With ``BACKGROUND`` off, the fan-out runs in the
+publishing request.
+
+Following an author or a tag copies its latest ``BACKFILL`` posts into the
+follower's timeline and unfollowing removes those not reaching them through
+another follow. Posts published before the timeline existed are fanned out
+by ``manage.py fan_out_posts``.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from followers.feeds import author_source, read_merged
+from followers.models import CelebrityAuthor, TimelineEntry, UserFollower, UserTag
+from postify.sql import bulk_insert_ignore
+from posts.models import Post, PostTag
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKGROUND": True,
+    "CELEBRITY_FOLLOWERS": 10000,
+    "BATCH_SIZE": 1000,
+    "BACKFILL": 200,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, "TIMELINE", {})}
+
+
+def is_celebrity(author_id, threshold):
+    followers = UserFollower.objects.filter(followed_user_id=author_id)
+    return followers[: threshold + 1].count() > threshold
+
+
+def write_entries(user_ids, post_id, created_at, batch_size):
+    """Add ``post_id`` to the timelines of ``user_ids``, returning how many were new."""
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append({"user_id": user_id, "post_id": post_id, "created_at": created_at})
+        if len(batch) >= batch_size:
+            written += bulk_insert_ignore(TimelineEntry, batch, ("user", "post"))
+            batch = []
+    if batch:
+        written += bulk_insert_ignore(TimelineEntry, batch, ("user", "post"))
+    return written
+
+
+def fan_out_posts(post_ids):
+    """Write published ``post_ids`` to their readers' timelines."""
+    options = get_options()
+    threshold = options["CELEBRITY_FOLLOWERS"]
+    written = 0
+    posts = Post.objects.filter(id__in=post_ids, published=True).values_list(
+        "id", "author_id", "created_at"
+    )
+    for post_id, author_id, created_at in posts:
+        readers = (
+            UserTag.objects.filter(
+                tag__in=PostTag.objects.filter(post_id=post_id).values("tag_id")
+            )
+            .order_by()
+            .values_list("follower_id", flat=True)
+        )
+        if is_celebrity(author_id, threshold):
+            CelebrityAuthor.objects.get_or_create(user_id=author_id)
+        else:
+            readers = readers.union(
+                UserFollower.objects.filter(followed_user_id=author_id)
+                .order_by()
+                .values_list("follower_id", flat=True)
+            )
+        written += write_entries(
+            readers.iterator(chunk_size=options["BATCH_SIZE"]),
+            post_id,
+            created_at,
+            options["BATCH_SIZE"],
+        )
+    return written
+
+
+def backfill(follower_id, posts):
+    """Copy ``posts``, ``(post_id, created_at)`` pairs, into a timeline."""
+    return bulk_insert_ignore(
+        TimelineEntry,
+        [
+            {"user_id": follower_id, "post_id": post_id, "created_at": created_at}
+            for post_id, created_at in posts
+        ],
+        ("user", "post"),
+    )
+
+
+def backfill_follow(follower_id, author_id):
+    """Copy ``author_id``'s latest posts into a new follower's timeline."""
+    if CelebrityAuthor.objects.filter(user_id=author_id).exists():
+        return 0
+    posts = Post.objects.filter(author_id=author_id, published=True).order_by(
+        "-created_at", "-id"
+    )[: get_options()["BACKFILL"]]
+    return backfill(follower_id, posts.values_list("id", "created_at"))
+
+
+def backfill_tag(follower_id, tag_id):
+    """Copy the latest posts tagged ``tag_id`` into a new follower's timeline."""
+    links = PostTag.objects.filter(tag_id=tag_id, post__published=True).order_by(
+        "-created_at", "-post_id"
+    )[: get_options()["BACKFILL"]]
+    return backfill(follower_id, links.values_list("post_id", "created_at"))
+
+
+def remove_follow(follower_id, author_id):
+    """
+    Drop ``author_id``'s posts from an unfollowing user's timeline, keeping
+    those that still reach them through a followed tag.
+    """
+    followed_tags = UserTag.objects.filter(follower_id=follower_id).values("tag_id")
+    posts = Post.objects.filter(author_id=author_id).exclude(tags__in=followed_tags)
+    return remove_posts(follower_id, posts)
+
+
+def remove_tag(follower_id, tag_id):
+    """
+    Drop the posts tagged ``tag_id`` from an unfollowing user's timeline,
+    keeping those that still reach them through a followed author or tag.
+    """
+    followed_tags = UserTag.objects.filter(follower_id=follower_id).values("tag_id")
+    followed_authors = UserFollower.objects.filter(follower_id=follower_id).values(
+        "followed_user_id"
+    )
+    posts = (
+        Post.objects.filter(tags=tag_id)
+        .exclude(author__in=followed_authors)
+        .exclude(tags__in=followed_tags)
+    )
+    return remove_posts(follower_id, posts)
+
+
+def remove_posts(follower_id, posts):
+    entries = TimelineEntry.objects.filter(
+        user_id=follower_id, post__in=posts.values("id")
+    )
+    return entries.delete()[0]
+
+
+def feed_sources(user):
+    """The querysets merged into ``user``'s feed and their orderings."""
+    timeline = Post.objects.filter(timeline_entries__user=user, published=True).alias(
+        feed_created_at=F("timeline_entries__created_at"),
+        feed_post_id=F("timeline_entries__post_id"),
+    )
+    celebrities = UserFollower.objects.filter(
+        follower=user, followed_user__celebrity__isnull=False
+    ).values_list("followed_user_id", flat=True)
+    return [
+        (timeline, ("-feed_created_at", "-feed_post_id")),
+        author_source(celebrities, published=True),
+    ]
+
+
+def read_feed(user, connection_type, on_page=None, **kwargs):
+    return read_merged(feed_sources(user), connection_type, on_page=on_page, **kwargs)
+
+
+class TimelineFanout:
+    """Runs timeline writes on one background thread, in submission order."""
+
+    def __init__(self):
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._exit_registered = False
+
+    def submit(self, fn, *args):
+        if not get_options()["BACKGROUND"]:
+            return fn(*args)
+        self._start()
+        self._tasks.put((fn, args))
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="timeline-fanout", daemon=True
+                )
+                self._thread.start()
+                if not self._exit_registered:
+                    atexit.register(self.close)
+                    self._exit_registered = True
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            try:
+                if task is None:
+                    return
+                fn, args = task
+                fn(*args)
+            except Exception:
+                logger.exception("Failed to write timelines")
+            finally:
+                close_old_connections()
+                self._tasks.task_done()
+
+    def join(self):
+        """Wait until every submitted write has run."""
+        if self._thread is not None:
+            self._tasks.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._tasks.put(None)
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+fanout = TimelineFanout()
+
+
+def submit_on_commit(fn, *args):
+    transaction.on_commit(lambda: fanout.submit(fn, *args))
@@ -0,0 +1,233 @@
+"""
+Write-behind buffer for post likes.
+
+With ``LIKE_BUFFER["ENABLED"]``, likePost and unlikePost record the intent
+in memory, keyed by ``(user_id, post_id)`` with the last write winning, and
+return straight away. A background thread applies the buffered intents every
+``FLUSH_INTERVAL`` seconds with one bulk INSERT, one DELETE and one counter
+UPDATE, so a viral post takes a handful of writes per interval instead of one
+transaction per tap. When ``MAX_ENTRIES`` intents are pending the acting
+request flushes them. While those flushes fail, new intents are rejected
+with ``BufferFull`` so the buffer stays bounded.
+
+Until an intent is written, ``intent()`` lets the acting user read their own
+like back (``viewerHasLiked``, ``likeCount``). The buffer lives in one
+process: other processes see the like once it is flushed. It is flushed on
+interpreter exit; anything still buffered when a process is killed is lost.
+"""
+
+import atexit
+import logging
+import threading
+from collections import Counter
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, Q, When
+from graphql.pyutils import is_awaitable
+from likes.models import PostLike
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"ENABLED": False, "FLUSH_INTERVAL": 0.05, "MAX_ENTRIES": 5000}
+DELETE_BATCH_SIZE = 200
+
+
+class BufferFull(Exception):
+    pass
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, "LIKE_BUFFER", {})}
+
+
+def apply_like_intents(intents):
+    """Write ``{(user_id, post_id): liked}`` and adjust the like counters."""
+    post_ids = {post_id for _, post_id in intents}
+    user_ids = {user_id for user_id, _ in intents}
+    with transaction.atomic():
+        existing = set(
+            PostLike.objects.filter(
+                post_id__in=post_ids, user_id__in=user_ids
+            ).values_list("user_id", "post_id")
+        )
+        live_posts = set(
+            Post.objects.filter(id__in=post_ids).values_list("id", flat=True)
+        )
+        added = [
+            key
+            for key, liked in intents.items()
+            if liked and key not in existing and key[1] in live_posts
+        ]
+        removed = [
+            key for key, liked in intents.items() if not liked and key in existing
+        ]
+        PostLike.objects.bulk_create(
+            [PostLike(user_id=user_id, post_id=post_id) for user_id, post_id in added],
+            ignore_conflicts=True,
+            batch_size=500,
+        )
+        for start in range(0, len(removed), DELETE_BATCH_SIZE):
+            pairs = removed[start : start + DELETE_BATCH_SIZE]
+            PostLike.objects.filter(
+                reduce(
+                    or_,
+                    (Q(user_id=user_id, post_id=post_id) for user_id, post_id in pairs),
+                )
+            ).delete()
+
+        deltas = Counter(post_id for _, post_id in added)
+        deltas.subtract(post_id for _, post_id in removed)
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        if deltas:
+            Post.objects.filter(id__in=deltas).update(
+                like_count=Case(
+                    *(
+                        When(
+                            id=post_id,
+                            then=ExpressionWrapper(
+                                F("like_count") + delta, output_field=IntegerField()
+                            ),
+                        )
+                        for post_id, delta in deltas.items()
+                    ),
+                    default=F("like_count"),
+                    output_field=IntegerField(),
+                )
+            )
+    return len(added), len(removed)
+
+
+class LikeBuffer:
+    def __init__(self, flush_interval=0.05, max_entries=5000):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._exit_registered = False
+
+    @property
+    def enabled(self):
+        return get_options()["ENABLED"]
+
+    def like(self, user_id, post_id):
+        self._record((user_id, int(post_id)), True)
+
+    def unlike(self, user_id, post_id):
+        self._record((user_id, int(post_id)), False)
+
+    def intent(self, user_id, post_id):
+        """The buffered like state of ``user_id`` on ``post_id``, if any."""
+        key = (user_id, int(post_id))
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            return self._flushing.get(key)
+
+    def like_count(self, post, viewer, load_liked):
+        """
+        ``post.like_count`` as ``viewer`` should see it, counting their own
+        buffered intent. ``load_liked`` is only called when there is one and
+        returns whether the database has their like, possibly as an awaitable.
+        """
+        intent = self.intent(viewer.id, post.id)
+        if intent is None:
+            return post.like_count
+
+        def adjust(liked):
+            return max(post.like_count - int(bool(liked)) + int(intent), 0)
+
+        liked = load_liked()
+        if is_awaitable(liked):
+            return _then(liked, adjust)
+        return adjust(liked)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _record(self, key, liked):
+        with self._lock:
+            room = key in self._pending or len(self._pending) < self.max_entries
+        if not room:
+            try:
+                self.flush()
+            except Exception as error:
+                raise BufferFull("Too many likes are waiting to be written") from error
+        with self._lock:
+            self._pending[key] = liked
+            full = len(self._pending) >= self.max_entries
+        self._start()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered likes")
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="like-buffer", daemon=True
+                )
+                self._thread.start()
+                if not self._exit_registered:
+                    atexit.register(self.close)
+                    self._exit_registered = True
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered likes")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write every buffered intent, returning ``(added, removed)``."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0, 0
+                self._flushing, self._pending = self._pending, {}
+            try:
+                return apply_like_intents(self._flushing)
+            except Exception:
+                with self._lock:
+                    # Keep the intents for the next flush unless superseded.
+                    self._pending = {**self._flushing, **self._pending}
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        self._stop.clear()
+        self._thread = None
+
+
+def build_like_buffer():
+    options = get_options()
+    return LikeBuffer(
+        flush_interval=options["FLUSH_INTERVAL"], max_entries=options["MAX_ENTRIES"]
+    )
+
+
+like_buffer = build_like_buffer()
+
+
+async def _then(awaitable, fn):
+    return fn(await awaitable)
@@ -0,0 +1,123 @@
+"""
+Like writes and the denormalized ``like_count`` columns on Post and Comment.
+
+``add_like`` and ``remove_like`` are single-statement, idempotent writes keyed
+by the liked row and the user, and adjust the counters with ``F()`` updates
+in the same transaction, so reads never have to COUNT the like tables.
+Anything that bypasses them (bulk inserts, cascading deletes of users)
+leaves the counters drifting until ``reconcile_like_counts`` repairs them.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from comments.models import Comment
+from likes.models import CommentLike, PostLike
+from posts.models import Post
+from postify.sql import insert_ignore
+
+# (counted model, like model, like foreign key)
+COUNTERS = (
+    (Post, PostLike, "post"),
+    (Comment, CommentLike, "comment"),
+)
+
+
+def adjust_like_count(model, pk, delta):
+    """Add ``delta`` to the counter of one row, never going below zero."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(like_count__gte=-delta)
+    return queryset.update(like_count=F("like_count") + delta)
+
+
+def _like_model(model):
+    for counted, like_model, field in COUNTERS:
+        if counted is model:
+            return like_model, field
+    raise ValueError(f"{model._meta.label} has no like counter")
+
+
+def add_like(model, target_id, user_id):
+    """
+    Like ``target_id`` as ``user_id`` and return the like, new or existing,
+    or ``None`` when the target does not exist.
+    """
+    like_model, field = _like_model(model)
+    keys = {f"{field}_id": target_id, "user_id": user_id}
+    now = timezone.now()
+    with transaction.atomic():
+        like_id = insert_ignore(
+            like_model,
+            {**keys, "created_at": now},
+            (field, "user"),
+            requires=(model, target_id),
+        )
+        if like_id is not None:
+            adjust_like_count(model, target_id, 1)
+            return like_model(id=like_id, created_at=now, **keys)
+    return like_model.objects.filter(**keys).first()
+
+
+def remove_like(model, user_id, target_id=None, like_id=None):
+    """Remove the user's like of ``target_id`` (or like ``like_id``) if any."""
+    like_model, field = _like_model(model)
+    if target_id is None:
+        target_id = (
+            like_model.objects.filter(id=like_id, user_id=user_id)
+            .values_list(f"{field}_id", flat=True)
+            .first()
+        )
+        if target_id is None:
+            return False
+    with transaction.atomic():
+        deleted, _ = like_model.objects.filter(
+            **{f"{field}_id": target_id, "user_id": user_id}
+        ).delete()
+        if deleted:
+            adjust_like_count(model, target_id, -1)
+    return bool(deleted)
+
+
+def counted_likes(like_model, field):
+    counts = (
+        like_model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0), output_field=IntegerField())
+
+
+def reconcile_like_counts(batch_size=1000, dry_run=False):
+    """Repair drifted counters in primary key batches and report the rows fixed."""
+    repaired = {}
+    for model, like_model, field in COUNTERS:
+        actual = counted_likes(like_model, field)
+        fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+            drifted = (
+                model.objects.filter(pk__in=batch)
+                .annotate(actual=actual)
+                .exclude(like_count=F("actual"))
+                .values_list("pk", flat=True)
+            )
+            if dry_run:
+                fixed += drifted.count()
+            else:
+                fixed += model.objects.filter(pk__in=list(drifted)).update(
+                    like_count=actual
+                )
+        repaired[model._meta.label] = fixed
+    return repaired
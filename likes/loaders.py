@@ -0,0 +1,24 @@
+from postify.dataloaders import register_loader
+from likes.models import CommentLike, PostLike
+
+
+def liked_by_viewer(loaders, like_model, field, keys):
+    viewer = loaders.viewer
+    if viewer is None:
+        return {key: False for key in keys}
+    liked = set(
+        like_model.objects.filter(user=viewer, **{f"{field}_id__in": keys}).values_list(
+            f"{field}_id", flat=True
+        )
+    )
+    return {key: key in liked for key in keys}
+
+
+@register_loader("viewer_liked_posts")
+def load_viewer_liked_posts(loaders, keys):
+    return liked_by_viewer(loaders, PostLike, "post", keys)
+
+
+@register_loader("viewer_liked_comments")
+def load_viewer_liked_comments(loaders, keys):
+    return liked_by_viewer(loaders, CommentLike, "comment", keys)
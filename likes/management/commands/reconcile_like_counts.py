@@ -0,0 +1,23 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from likes.counters import reconcile_like_counts
+
+
+class Command(BaseCommand):
+    help = "Recount likes and repair drifted like_count columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many rows have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        repaired = reconcile_like_counts(
+            batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        self.stdout.write(json.dumps(repaired, indent=2))
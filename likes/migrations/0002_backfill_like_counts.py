@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_counts(apps, schema_editor):
+    for model_label, like_label, field in (
+        ("posts.Post", "likes.PostLike", "post"),
+        ("comments.Comment", "likes.CommentLike", "comment"),
+    ):
+        model = apps.get_model(model_label)
+        like_model = apps.get_model(like_label)
+        counts = (
+            like_model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        model.objects.update(
+            like_count=Coalesce(Subquery(counts), Value(0), output_field=IntegerField())
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("likes", "0001_initial"),
+        ("posts", "0007_post_like_count"),
+        ("comments", "0002_comment_like_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+LIKES = (
+    ("posts.Post", "likes.PostLike", "post"),
+    ("comments.Comment", "likes.CommentLike", "comment"),
+)
+
+
+def dedupe_likes(apps, schema_editor):
+    """Keep the oldest like of each (target, user) pair and recount."""
+    for model_label, like_label, field in LIKES:
+        model = apps.get_model(model_label)
+        like_model = apps.get_model(like_label)
+        keep = (
+            like_model.objects.order_by()
+            .values(field, "user")
+            .annotate(keep=Min("id"))
+            .values("keep")
+        )
+        if not like_model.objects.exclude(id__in=keep).delete()[0]:
+            continue
+        counts = (
+            like_model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        model.objects.update(
+            like_count=Coalesce(Subquery(counts), Value(0), output_field=IntegerField())
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("likes", "0002_backfill_like_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="commentlike",
+            constraint=models.UniqueConstraint(
+                fields=("comment", "user"), name="likes_commentlike_comment_user_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="postlike",
+            constraint=models.UniqueConstraint(
+                fields=("post", "user"), name="likes_postlike_post_user_uniq"
+            ),
+        ),
+    ]
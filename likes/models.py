@@ -18,6 +18,11 @@ class PostLike(Like):
     class Meta:
         verbose_name = "Post Like"
         verbose_name_plural = "Post Likes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "user"], name="likes_postlike_post_user_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"User: {self.user.username} liked Post: {self.post.title}"
@@ -29,6 +34,11 @@ class CommentLike(Like):
     class Meta:
         verbose_name = "Comment Like"
         verbose_name_plural = "Comment Likes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["comment", "user"], name="likes_commentlike_comment_user_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"User: {self.user.username} Liked Comment: {self.comment.id}"
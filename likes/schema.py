@@ -1,12 +1,17 @@
 import graphene
+from asgiref.sync import sync_to_async
+from functools import partial
 from graphene_django import DjangoObjectType
 from graphql.error import GraphQLError
-from django.contrib.auth.models import User
-from django.db.models import Q
+from .buffer import BufferFull, like_buffer
+from .counters import add_like, remove_like
 from .models import PostLike, CommentLike
 from posts.models import Post
 from profiles.schema import UserType
 from comments.models import Comment
+from postify.aio import is_async
+from postify.dataloaders import get_loaders
+import posts.loaders
 
 
 class PostLikeType(DjangoObjectType):
@@ -21,7 +26,10 @@ class PostLikeType(DjangoObjectType):
         return self.user_id
 
     def resolve_user(self, info):
-        return self.user
+        return get_loaders(info).users.load(self.user_id)
+
+    def resolve_post(self, info):
+        return get_loaders(info).posts.load(self.post_id)
 
 
 class CommentLikeType(DjangoObjectType):
@@ -36,7 +44,10 @@ class CommentLikeType(DjangoObjectType):
         return self.user_id
 
     def resolve_user(self, info):
-        return self.user
+        return get_loaders(info).users.load(self.user_id)
+
+    def resolve_comment(self, info):
+        return get_loaders(info).comments.load(self.comment_id)
 
 
 class Query(graphene.ObjectType):
@@ -44,57 +55,102 @@ class Query(graphene.ObjectType):
     comment_likes_count = graphene.Int(comment_id=graphene.Int(required=True))
 
     def resolve_post_likes_count(self, info, post_id):
-        post = Post.objects.get(id=post_id)
-        return post.likes.count()
+        viewer = info.context.user
+        if (
+            like_buffer.enabled
+            and viewer.is_authenticated
+            and like_buffer.intent(viewer.id, post_id) is not None
+        ):
+            count = partial(viewer_like_count, viewer, post_id)
+            return sync_to_async(count)() if is_async(info) else count()
+        if is_async(info):
+            return like_count_async(Post, post_id)
+        return Post.objects.values_list("like_count", flat=True).get(id=post_id)
 
     def resolve_comment_likes_count(self, info, comment_id):
-        comment = Comment.objects.get(id=comment_id)
-        return comment.likes.count()
+        if is_async(info):
+            return like_count_async(Comment, comment_id)
+        return Comment.objects.values_list("like_count", flat=True).get(id=comment_id)
+
+
+async def like_count_async(model, id):
+    return await model.objects.values_list("like_count", flat=True).aget(id=id)
+
+
+def viewer_like_count(viewer, post_id):
+    post = Post.objects.only("like_count").get(id=post_id)
+    return like_buffer.like_count(
+        post,
+        viewer,
+        lambda: PostLike.objects.filter(post_id=post_id, user=viewer).exists(),
+    )
+
+
+def check_liker(user, user_id):
+    if not user.is_authenticated:
+        raise GraphQLError("User is not authenticated")
+    if user_id is not None and int(user_id) != user.id:
+        raise GraphQLError("Bad Request. Users can only like as themselves")
 
 
 class PostLikeCreateMutation(graphene.Mutation):
     like = graphene.Field(PostLikeType)
+    buffered = graphene.Boolean(
+        description="The like is queued for a bulk write and has no row yet."
+    )
 
     class Arguments:
         post_id = graphene.Int(required=True)
-        user_id = graphene.Int(required=True)
+        user_id = graphene.Int(
+            description="Deprecated, likes are made by the authenticated user."
+        )
 
-    def mutate(self, info, post_id, user_id):
+    def mutate(self, info, post_id, user_id=None):
         user = info.context.user
-        if not user.is_authenticated:
-            raise GraphQLError("User is not authenticated")
-        try:
-            post = Post.objects.get(id=post_id)
-            user = User.objects.get(id=user_id)
-            post_like, created = PostLike.objects.get_or_create(post=post, user=user)
-            return PostLikeCreateMutation(like=post_like)
-        except User.DoesNotExist:
-            raise GraphQLError("User not found")
-        except Post.DoesNotExist:
+        check_liker(user, user_id)
+        if like_buffer.enabled:
+            if not Post.objects.filter(id=post_id).exists():
+                raise GraphQLError("Post not found")
+            try:
+                like_buffer.like(user.id, post_id)
+            except BufferFull as error:
+                raise GraphQLError(str(error))
+            return PostLikeCreateMutation(like=None, buffered=True)
+        post_like = add_like(Post, post_id, user.id)
+        if post_like is None:
             raise GraphQLError("Post not found")
+        return PostLikeCreateMutation(like=post_like, buffered=False)
 
 
 class PostLikeRemoveMutation(graphene.Mutation):
     success = graphene.Boolean()
 
     class Arguments:
-        like_id = graphene.Int(required=True)
+        post_id = graphene.Int()
+        like_id = graphene.Int(description="Deprecated, use postId.")
 
-    def mutate(self, info, like_id):
+    def mutate(self, info, post_id=None, like_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-
-        try:
-            post_like = PostLike.objects.get(id=like_id)
-            if user != post_like.user:
-                raise GraphQLError("Bad Request. User has not liked this post")
-            post_like.delete()
+        if post_id is None and like_id is None:
+            raise GraphQLError("Bad Request. Provide postId")
+        if like_buffer.enabled:
+            if post_id is None:
+                post_id = (
+                    PostLike.objects.filter(id=like_id, user=user)
+                    .values_list("post_id", flat=True)
+                    .first()
+                )
+                if post_id is None:
+                    return PostLikeRemoveMutation(success=False)
+            try:
+                like_buffer.unlike(user.id, post_id)
+            except BufferFull as error:
+                raise GraphQLError(str(error))
             return PostLikeRemoveMutation(success=True)
-        except User.DoesNotExist:
-            raise GraphQLError("User not found")
-        except Post.DoesNotExist:
-            raise GraphQLError("Post not found")
+        removed = remove_like(Post, user.id, target_id=post_id, like_id=like_id)
+        return PostLikeRemoveMutation(success=removed)
 
 
 class CommentLikeCreateMutation(graphene.Mutation):
@@ -102,47 +158,34 @@ class CommentLikeCreateMutation(graphene.Mutation):
 
     class Arguments:
         comment_id = graphene.Int(required=True)
-        user_id = graphene.Int(required=True)
+        user_id = graphene.Int(
+            description="Deprecated, likes are made by the authenticated user."
+        )
 
-    def mutate(self, info, comment_id, user_id):
+    def mutate(self, info, comment_id, user_id=None):
         user = info.context.user
-        if not user.is_authenticated:
-            raise GraphQLError("User is not authenticated")
-
-        try:
-            comment = Comment.objects.get(id=comment_id)
-            user = User.objects.get(id=user_id)
-            comment_like, created = CommentLike.objects.get_or_create(
-                comment=comment, user=user
-            )
-            return CommentLikeCreateMutation(like=comment_like)
-        except User.DoesNotExist:
-            raise GraphQLError("User not found")
-        except Comment.DoesNotExist:
+        check_liker(user, user_id)
+        comment_like = add_like(Comment, comment_id, user.id)
+        if comment_like is None:
             raise GraphQLError("Comment not found")
+        return CommentLikeCreateMutation(like=comment_like)
 
 
 class CommentLikeRemoveMutation(graphene.Mutation):
     success = graphene.Boolean()
 
     class Arguments:
-        like_id = graphene.Int(required=True)
+        comment_id = graphene.Int()
+        like_id = graphene.Int(description="Deprecated, use commentId.")
 
-    def mutate(self, info, like_id):
+    def mutate(self, info, comment_id=None, like_id=None):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
-
-        try:
-            comment_like = CommentLike.objects.get(id=like_id)
-            if user != comment_like.user:
-                raise GraphQLError("Bad Request. User has not liked this post")
-            comment_like.delete()
-            return CommentLikeRemoveMutation(success=True)
-        except User.DoesNotExist:
-            raise GraphQLError("User not found")
-        except Comment.DoesNotExist:
-            raise GraphQLError("Comment not found")
+        if comment_id is None and like_id is None:
+            raise GraphQLError("Bad Request. Provide commentId")
+        removed = remove_like(Comment, user.id, target_id=comment_id, like_id=like_id)
+        return CommentLikeRemoveMutation(success=removed)
 
 
 class Mutation(graphene.ObjectType):
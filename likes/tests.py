@@ -1,3 +1,431 @@
-from django.test import TestCase
+import io
+import json
+import time
+from functools import partialmethod
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TransactionTestCase, override_settings
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+from comments.models import Comment
+from likes.buffer import LikeBuffer
+from likes.counters import add_like
+from likes.models import CommentLike, PostLike
+from postify.dataloaders import LoaderRegistry
+from posts.models import Category, Post
 
-# Create your tests here.
+
+class LikeCountTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="fan")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.post = Post.objects.create(
+            title="Liked", content="content", author=self.user
+        )
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.user, comment="nice"
+        )
+
+    def mutate(self, query, **variables):
+        response = self.query(query, variables=variables, headers=self.headers)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]
+
+    def like_post(self):
+        return self.mutate(
+            """
+            mutation ($postId: Int!, $userId: Int!) {
+                likePost(postId: $postId, userId: $userId) { like { id } }
+            }
+            """,
+            postId=self.post.id,
+            userId=self.user.id,
+        )["likePost"]["like"]["id"]
+
+    def test_like_mutations_maintain_the_counters(self):
+        like_id = self.like_post()
+        self.like_post()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        data = self.mutate(
+            "mutation ($postId: Int!) { unlikePost(postId: $postId) { success } }",
+            postId=self.post.id,
+        )
+        self.assertTrue(data["unlikePost"]["success"])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        data = self.mutate(
+            "mutation ($likeId: Int!) { unlikePost(likeId: $likeId) { success } }",
+            likeId=int(like_id),
+        )
+        self.assertFalse(data["unlikePost"]["success"])
+
+        data = self.mutate(
+            """
+            mutation ($commentId: Int!, $userId: Int!) {
+                likeComment(commentId: $commentId, userId: $userId) { like { id } }
+            }
+            """,
+            commentId=self.comment.id,
+            userId=self.user.id,
+        )
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 1)
+        self.mutate(
+            "mutation ($likeId: Int!) { unlikeComment(likeId: $likeId) { success } }",
+            likeId=int(data["likeComment"]["like"]["id"]),
+        )
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 0)
+
+    def test_likes_are_single_statement_upserts(self):
+        # Authentication, then INSERT and counter UPDATE in a savepoint.
+        with self.assertNumQueries(5):
+            like_id = self.like_post()
+        # The conflicting INSERT falls back to reading the existing like.
+        with self.assertNumQueries(5):
+            self.assertEqual(self.like_post(), like_id)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), 1)
+        # DELETE and counter UPDATE.
+        with self.assertNumQueries(5):
+            self.mutate(
+                "mutation ($postId: Int!) { unlikePost(postId: $postId) { success } }",
+                postId=self.post.id,
+            )
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_likes_without_insert_returning(self):
+        with mock.patch("postify.sql.supports_returning", return_value=False):
+            like_id = self.like_post()
+            self.assertEqual(self.like_post(), like_id)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_missing_targets_and_other_users(self):
+        response = self.query(
+            "mutation { likePost(postId: 0) { like { id } } }", headers=self.headers
+        )
+        self.assertEqual(
+            json.loads(response.content)["errors"][0]["message"], "Post not found"
+        )
+        response = self.query(
+            """
+            mutation ($postId: Int!, $userId: Int!) {
+                likePost(postId: $postId, userId: $userId) { like { id } }
+            }
+            """,
+            variables={"postId": self.post.id, "userId": self.user.id + 1},
+            headers=self.headers,
+        )
+        self.assertResponseHasErrors(response)
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_counts_are_read_without_counting_likes(self):
+        self.like_post()
+        with self.assertNumQueries(1):
+            response = self.query(
+                "query ($postId: Int!) { postLikesCount(postId: $postId) }",
+                variables={"postId": self.post.id},
+            )
+        self.assertEqual(json.loads(response.content)["data"]["postLikesCount"], 1)
+
+        with self.assertNumQueries(1):
+            response = self.query(
+                "query ($id: ID!) { post(id: $id) { likeCount } }",
+                variables={"id": self.post.id},
+            )
+        self.assertEqual(json.loads(response.content)["data"]["post"]["likeCount"], 1)
+
+    def test_edits_keep_concurrent_likes(self):
+        save_post, save_comment = Post.save, Comment.save
+
+        def like_then(instance, save, *args, **kwargs):
+            # A like committed between the mutation's read and its write.
+            type(instance).objects.filter(id=instance.id).update(like_count=7)
+            return save(instance, *args, **kwargs)
+
+        category = Category.objects.first()
+        with mock.patch.object(Post, "save", partialmethod(like_then, save_post)):
+            self.mutate(
+                """
+                mutation ($id: ID!) {
+                    updatePost(id: $id, input: {title: "Edited", content: "new"}) {
+                        post { id }
+                    }
+                }
+                """,
+                id=self.post.id,
+            )
+            self.post.refresh_from_db()
+            self.assertEqual((self.post.title, self.post.like_count), ("Edited", 7))
+            Post.objects.filter(id=self.post.id).update(like_count=0)
+            self.mutate(
+                """
+                mutation ($postId: ID!, $categoryId: ID!) {
+                    addPostCategory(postId: $postId, categoryId: $categoryId) {
+                        category { id }
+                    }
+                }
+                """,
+                postId=self.post.id,
+                categoryId=category.id,
+            )
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.category, self.post.like_count), (category, 7))
+
+        with mock.patch.object(Comment, "save", partialmethod(like_then, save_comment)):
+            self.mutate(
+                """
+                mutation ($id: ID!) {
+                    updateComment(input: {commentId: $id, comment: "edited"}) {
+                        comment { id }
+                    }
+                }
+                """,
+                id=self.comment.id,
+            )
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.comment, self.comment.like_count), ("edited", 7))
+
+    def test_full_saves_keep_concurrent_likes(self):
+        # As the admin does, on an instance read before the like.
+        post = Post.objects.get(id=self.post.id)
+        self.like_post()
+        post.title = "Edited"
+        post.save()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.title, self.post.like_count), ("Edited", 1))
+
+    def test_reconcile_repairs_drift(self):
+        other = User.objects.create(username="other")
+        PostLike.objects.bulk_create(
+            [PostLike(post=self.post, user=user) for user in (self.user, other)]
+        )
+        CommentLike.objects.create(comment=self.comment, user=other)
+        Comment.objects.filter(id=self.comment.id).update(like_count=5)
+
+        stdout = io.StringIO()
+        call_command("reconcile_like_counts", dry_run=True, stdout=stdout)
+        self.assertEqual(
+            json.loads(stdout.getvalue()), {"posts.Post": 1, "comments.Comment": 1}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+        call_command("reconcile_like_counts", batch_size=1, stdout=io.StringIO())
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.comment.like_count), (2, 1))
+
+
+class ViewerHasLikedTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+    QUERY = """
+        query {
+            posts {
+                edges {
+                    node {
+                        title
+                        likeCount
+                        viewerHasLiked
+                        comments { edges { node { likeCount viewerHasLiked } } }
+                    }
+                }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.viewer = User.objects.create(username="viewer")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.viewer)}"}
+
+    def create_posts(self, count):
+        for index in range(count):
+            post = Post.objects.create(
+                title=f"Post {index}", content="content", author=self.viewer
+            )
+            comment = Comment.objects.create(
+                post=post, author=self.viewer, comment="comment"
+            )
+            if index % 2 == 0:
+                add_like(Post, post.id, self.viewer.id)
+                add_like(Comment, comment.id, self.viewer.id)
+
+    def fetch(self, headers=None):
+        response = self.query(self.QUERY, headers=headers)
+        self.assertResponseNoErrors(response)
+        return [
+            edge["node"]
+            for edge in json.loads(response.content)["data"]["posts"]["edges"]
+        ]
+
+    def test_viewer_likes_are_loaded_in_one_batch_per_type(self):
+        self.create_posts(2)
+        # Authentication, posts, comments and one IN query per like table.
+        with self.assertNumQueries(5):
+            self.fetch(self.headers)
+        self.create_posts(6)
+        with self.assertNumQueries(5):
+            nodes = self.fetch(self.headers)
+
+        for node in nodes:
+            liked = int(node["title"].split()[-1]) % 2 == 0
+            self.assertEqual(node["viewerHasLiked"], liked)
+            self.assertEqual(node["likeCount"], int(liked))
+            self.assertEqual(
+                node["comments"]["edges"][0]["node"]["viewerHasLiked"], liked
+            )
+
+    def test_posts_loaded_by_id_batch_their_likes(self):
+        self.create_posts(4)
+        loaders = LoaderRegistry(SimpleNamespace(user=self.viewer))
+        ids = list(Post.objects.order_by("id").values_list("id", flat=True))
+        # comment.post and like.post load posts by id.
+        with self.assertNumQueries(2):
+            posts = loaders.posts.load_many(ids)
+            liked = [loaders.viewer_liked_posts.load(post.id) for post in posts]
+        self.assertEqual(liked, [True, False, True, False])
+
+    def test_anonymous_viewers_have_not_liked_anything(self):
+        self.create_posts(2)
+        with self.assertNumQueries(2):
+            nodes = self.fetch()
+        self.assertEqual({node["viewerHasLiked"] for node in nodes}, {False})
+
+
+@override_settings(LIKE_BUFFER={"ENABLED": True})
+class LikeBufferTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="fan")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.post = Post.objects.create(
+            title="Viral", content="content", author=self.user
+        )
+        # Flushed explicitly, the flusher thread has its own connection.
+        self.buffer = LikeBuffer(flush_interval=3600, max_entries=3)
+        for target in ("likes.schema.like_buffer", "posts.schema.like_buffer"):
+            patcher = mock.patch(target, self.buffer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.buffer.close)
+
+    def mutate(self, mutation):
+        response = self.query(
+            "mutation ($postId: Int!) { %s(postId: $postId) { __typename } }"
+            % mutation,
+            variables={"postId": self.post.id},
+            headers=self.headers,
+        )
+        self.assertResponseNoErrors(response)
+
+    def read(self):
+        response = self.query(
+            """
+            query ($id: ID!, $postId: Int!) {
+                post(id: $id) { likeCount viewerHasLiked }
+                postLikesCount(postId: $postId)
+            }
+            """,
+            variables={"id": self.post.id, "postId": self.post.id},
+            headers=self.headers,
+        )
+        data = json.loads(response.content)["data"]
+        return (
+            data["post"]["likeCount"],
+            data["post"]["viewerHasLiked"],
+            data["postLikesCount"],
+        )
+
+    def test_intents_are_coalesced_and_read_back(self):
+        # Authentication and checking that the post exists.
+        with self.assertNumQueries(2):
+            self.mutate("likePost")
+        self.assertFalse(PostLike.objects.exists())
+        self.assertEqual(self.read(), (1, True, 1))
+
+        self.mutate("unlikePost")
+        self.mutate("likePost")
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.flush(), (1, 0))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.read(), (1, True, 1))
+
+        self.mutate("unlikePost")
+        self.assertEqual(self.read(), (0, False, 0))
+        self.buffer.close()
+        self.assertFalse(PostLike.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_missing_posts_are_not_buffered(self):
+        response = self.query(
+            "mutation { likePost(postId: 0) { buffered } }", headers=self.headers
+        )
+        self.assertEqual(
+            json.loads(response.content)["errors"][0]["message"], "Post not found"
+        )
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_failed_flushes_reject_new_intents(self):
+        users = [User.objects.create(username=f"fan-{index}") for index in range(3)]
+        with mock.patch(
+            "likes.buffer.apply_like_intents", side_effect=DatabaseError("locked")
+        ):
+            with self.assertLogs("likes.buffer", "ERROR"):
+                for user in users:
+                    self.buffer.like(user.id, self.post.id)
+            response = self.query(
+                "mutation ($postId: Int!) { likePost(postId: $postId) { buffered } }",
+                variables={"postId": self.post.id},
+                headers=self.headers,
+            )
+            self.assertEqual(
+                json.loads(response.content)["errors"][0]["message"],
+                "Too many likes are waiting to be written",
+            )
+            # Intents already pending can still change.
+            self.buffer.unlike(users[0].id, self.post.id)
+        self.assertEqual(len(self.buffer), 3)
+        self.assertEqual(self.buffer.intent(self.user.id, self.post.id), None)
+        self.assertEqual(self.buffer.flush(), (2, 0))
+
+    def test_bulk_flush(self):
+        users = [User.objects.create(username=f"fan-{index}") for index in range(3)]
+        for user in users:
+            self.buffer.like(user.id, self.post.id)
+        # Reaching max_entries flushes in the acting request.
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), 3)
+
+        self.buffer.unlike(users[0].id, self.post.id)
+        self.buffer.like(users[0].id, 0)
+        self.assertEqual(self.buffer.flush(), (0, 1))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+
+class LikeBufferFlusherTestCase(TransactionTestCase):
+    def test_background_flush_and_close(self):
+        user = User.objects.create(username="fan")
+        post = Post.objects.create(title="Viral", content="content", author=user)
+        buffer = LikeBuffer(flush_interval=0.01)
+        buffer.like(user.id, post.id)
+        for _ in range(200):
+            if PostLike.objects.filter(post=post, user=user).exists():
+                break
+            time.sleep(0.01)
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+
+        buffer.unlike(user.id, post.id)
+        buffer.close()
+        self.assertFalse(PostLike.objects.exists())
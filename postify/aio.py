@@ -0,0 +1,45 @@
+"""
+Helpers for resolvers shared by the sync and async GraphQL views.
+
+``AsyncPostifyGraphQLView`` marks its requests with ``async_execution``;
+resolvers check ``is_async(info)`` and return coroutines built on Django's
+async ORM instead of evaluating querysets. Code that can only run
+synchronously goes through ``run_sync``, which uses a bounded pool of
+``ASYNC_GRAPHQL["SYNC_WORKERS"]`` threads so it cannot starve the server.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+DEFAULTS = {"SYNC_WORKERS": 8}
+
+_options = {**DEFAULTS, **getattr(settings, "ASYNC_GRAPHQL", {})}
+sync_executor = ThreadPoolExecutor(
+    max_workers=_options["SYNC_WORKERS"], thread_name_prefix="graphql-sync"
+)
+
+
+def is_async(info):
+    return getattr(info.context, "async_execution", False)
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def _call_with_connections(fn, *args, **kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(fn, *args, **kwargs):
+    """Run ``fn`` on the bounded sync pool and return its result."""
+    call = sync_to_async(
+        _call_with_connections, thread_sensitive=False, executor=sync_executor
+    )
+    return await call(fn, *args, **kwargs)
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "postify.settings")
+os.environ.setdefault("POSTIFY_ASYNC_GRAPHQL", "1")
 
 application = get_asgi_application()
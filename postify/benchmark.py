@@ -0,0 +1,455 @@
+"""
+Synthetic dataset generator and timed scenarios for the hot operations.
+
+``generate_dataset`` seeds users, posts, tags, categories, comments, likes
+and follows. Authors, commenters, liked posts and followed users are drawn
+from a Zipf distribution, so a few celebrities own most of the activity.
+``run_scenarios`` sends operations through ``PostifyGraphQLView`` and
+reports latency percentiles, SQL queries per operation and peak Python
+memory for each one. Everything is driven by a seeded ``random.Random``,
+so two runs against the same dataset are comparable.
+"""
+
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from dataclasses import dataclass
+from itertools import accumulate
+from django import get_version
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory
+from graphql_jwt.shortcuts import get_token
+from comments.models import Comment
+from comments.threads import root_path
+from followers.models import UserFollower, UserTag
+from followers.timeline import fan_out_posts
+from likes.counters import counted_likes
+from likes.models import CommentLike, PostLike
+from posts.cache import invalidate_catalog
+from posts.models import Category, Post, PostTag, Tag
+from posts.search import index_posts
+from postify.views import PostifyGraphQLView
+
+USERNAME_PREFIX = "bench-"
+BATCH_SIZE = 1000
+WORDS = (
+    "django graphql python cache query index database latency feed search "
+    "performance python sqlite cursor batch loader schema resolver server "
+    "async thread memory profile benchmark release deploy monitor metric "
+    "design review testing release migration replica write read comment"
+).split()
+
+
+class ZipfSampler:
+    """Draw items with probability proportional to ``1 / rank ** skew``."""
+
+    def __init__(self, items, skew, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(
+            accumulate(1 / (rank**skew) for rank in range(1, len(self.items) + 1))
+        )
+
+    def sample(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def choice(self):
+        return self.sample()[0]
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _unique_pairs(sample_left, sample_right, count, exclude_self=False):
+    pairs = set()
+    for _ in range(count * 3):
+        if len(pairs) >= count:
+            break
+        left, right = sample_left(), sample_right()
+        if exclude_self and left == right:
+            continue
+        pairs.add((left, right))
+    return sorted(pairs)
+
+
+def clear_dataset():
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    Post.objects.filter(author__in=users).delete()
+    users.delete()
+    Tag.objects.filter(name__startswith=USERNAME_PREFIX).delete()
+    Category.objects.filter(name__startswith=USERNAME_PREFIX).delete()
+    invalidate_catalog()
+
+
+def generate_dataset(
+    users=1000,
+    posts=5000,
+    comments=20000,
+    post_likes=50000,
+    comment_likes=20000,
+    follows=10,
+    tags=50,
+    categories=10,
+    skew=1.1,
+    seed=42,
+):
+    """Seed the benchmark dataset and return the number of rows per table."""
+    rng = random.Random(seed)
+    password = make_password(None)
+
+    with transaction.atomic():
+        user_ids = [
+            user.id
+            for user in User.objects.bulk_create(
+                [
+                    User(username=f"{USERNAME_PREFIX}user-{index}", password=password)
+                    for index in range(users)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+        ]
+        tag_ids = [
+            tag.id
+            for tag in Tag.objects.bulk_create(
+                [Tag(name=f"{USERNAME_PREFIX}tag-{index}") for index in range(tags)]
+            )
+        ]
+        category_ids = [
+            category.id
+            for category in Category.objects.bulk_create(
+                [
+                    Category(name=f"{USERNAME_PREFIX}category-{index}")
+                    for index in range(categories)
+                ]
+            )
+        ]
+        user_sampler = ZipfSampler(user_ids, skew, rng)
+        tag_sampler = ZipfSampler(tag_ids, skew, rng)
+
+        post_objects = Post.objects.bulk_create(
+            [
+                Post(
+                    author_id=user_sampler.choice(),
+                    title=_sentence(rng, rng.randint(3, 8)).capitalize(),
+                    slug=f"{USERNAME_PREFIX}post-{seed}-{index}",
+                    content=_sentence(rng, rng.randint(20, 120)),
+                    published=rng.random() < 0.8,
+                    category_id=rng.choice(category_ids),
+                )
+                for index in range(posts)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        index_posts(post_objects, replace=False)
+        post_ids = [post.id for post in post_objects]
+        post_sampler = ZipfSampler(post_ids, skew, rng)
+
+        PostTag.objects.bulk_create(
+            [
+                PostTag(post_id=post.id, tag_id=tag_id, created_at=post.created_at)
+                for post in post_objects
+                for tag_id in set(tag_sampler.sample(rng.randint(1, 4)))
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        comment_ids = [
+            comment.id
+            for comment in Comment.objects.bulk_create(
+                [
+                    Comment(
+                        author_id=user_sampler.choice(),
+                        post_id=post_sampler.choice(),
+                        comment=_sentence(rng, rng.randint(5, 30)),
+                    )
+                    for _ in range(comments)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+        ]
+        # bulk_create skips Comment.save, which fills in the thread paths.
+        Comment.objects.filter(path="").update(path=root_path())
+        post_likes = PostLike.objects.bulk_create(
+            [
+                PostLike(user_id=user_id, post_id=post_id)
+                for user_id, post_id in _unique_pairs(
+                    lambda: rng.choice(user_ids), post_sampler.choice, post_likes
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        comment_like_count = 0
+        if comment_ids:
+            comment_sampler = ZipfSampler(comment_ids, skew, rng)
+            comment_like_count = len(
+                CommentLike.objects.bulk_create(
+                    [
+                        CommentLike(user_id=user_id, comment_id=comment_id)
+                        for user_id, comment_id in _unique_pairs(
+                            lambda: rng.choice(user_ids),
+                            comment_sampler.choice,
+                            comment_likes,
+                        )
+                    ],
+                    batch_size=BATCH_SIZE,
+                )
+            )
+        # bulk_create() bypasses the like mutations that keep the counters.
+        Post.objects.filter(author__username__startswith=USERNAME_PREFIX).update(
+            like_count=counted_likes(PostLike, "post")
+        )
+        Comment.objects.filter(
+            post__author__username__startswith=USERNAME_PREFIX
+        ).update(like_count=counted_likes(CommentLike, "comment"))
+        follow_pairs = _unique_pairs(
+            lambda: rng.choice(user_ids),
+            user_sampler.choice,
+            follows * users,
+            exclude_self=True,
+        )
+        UserFollower.objects.bulk_create(
+            [
+                UserFollower(follower_id=follower, followed_user_id=followed)
+                for follower, followed in follow_pairs
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        tag_follows = UserTag.objects.bulk_create(
+            [
+                UserTag(follower_id=follower, tag_id=tag_id)
+                for follower, tag_id in _unique_pairs(
+                    lambda: rng.choice(user_ids), tag_sampler.choice, users * 2
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        # Bulk inserts skip post_published, fan the posts out like a backfill.
+        timeline_entries = fan_out_posts(post_ids)
+    invalidate_catalog()
+
+    return {
+        "users": len(user_ids),
+        "posts": len(post_ids),
+        "tags": len(tag_ids),
+        "categories": len(category_ids),
+        "comments": len(comment_ids),
+        "post_likes": len(post_likes),
+        "comment_likes": comment_like_count,
+        "user_follows": len(follow_pairs),
+        "tag_follows": len(tag_follows),
+        "timeline_entries": timeline_entries,
+    }
+
+
+@dataclass
+class Scenario:
+    name: str
+    query: str
+    variables: object = None
+    mutation: bool = False
+
+
+POST_FIELDS = """
+    id
+    title
+    author { username }
+    category { name }
+    tags { name }
+    comments(first: 10) { edges { node { comment author { username } } } }
+"""
+
+SCENARIOS = [
+    Scenario(
+        "posts",
+        "query { posts(first: 20) { edges { node { %s } } } }" % POST_FIELDS,
+    ),
+    Scenario(
+        "posts_search",
+        "query Search($text: String) { posts(first: 20, search: $text) "
+        "{ edges { node { %s } } } }" % POST_FIELDS,
+        lambda data, rng: {"text": " ".join(rng.sample(WORDS, 2))},
+    ),
+    Scenario(
+        "post",
+        "query Post($id: ID!) { post(id: $id) { %s } }" % POST_FIELDS,
+        lambda data, rng: {"id": data.post_sampler.choice()},
+    ),
+    Scenario(
+        "user_feed",
+        "query { userFeed(first: 20) { edges { node { %s } } } }" % POST_FIELDS,
+    ),
+    Scenario(
+        "post_likes_count",
+        "query Likes($postId: Int!) { postLikesCount(postId: $postId) }",
+        lambda data, rng: {"postId": data.post_sampler.choice()},
+    ),
+    Scenario(
+        "create_comment",
+        "mutation Comment($input: CommentCreateInput!) "
+        "{ createComment(input: $input) { comment { id } } }",
+        lambda data, rng: {
+            "input": {
+                "comment": _sentence(rng, 12),
+                "authorId": data.viewer.id,
+                "postId": data.post_sampler.choice(),
+            }
+        },
+        mutation=True,
+    ),
+    Scenario(
+        "like_post",
+        "mutation Like($postId: Int!, $userId: Int!) "
+        "{ likePost(postId: $postId, userId: $userId) { like { id } } }",
+        lambda data, rng: {
+            "postId": data.post_sampler.choice(),
+            "userId": data.viewer.id,
+        },
+        mutation=True,
+    ),
+]
+
+
+class BenchmarkData:
+    """The seeded rows scenarios draw their inputs from."""
+
+    def __init__(self, skew, rng):
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        post_ids = list(
+            Post.objects.filter(author__in=users)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        if not post_ids:
+            raise ValueError("No benchmark data found, run seed_benchmark first.")
+        self.post_sampler = ZipfSampler(post_ids, skew, rng)
+        # The most active follower gets the heaviest feed.
+        self.viewer = (
+            users.annotate(follows=Count("user_followers"))
+            .order_by("-follows", "id")
+            .first()
+        )
+        self.token = get_token(self.viewer)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class BenchmarkRunner:
+    def __init__(self, iterations=200, warmup=20, skew=1.1, seed=42):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.rng = random.Random(seed)
+        self.data = BenchmarkData(skew, self.rng)
+        self.factory = RequestFactory()
+        self.view = PostifyGraphQLView.as_view()
+
+    def execute(self, scenario):
+        variables = (
+            scenario.variables(self.data, self.rng) if scenario.variables else {}
+        )
+        request = self.factory.post(
+            "/graphql/",
+            json.dumps({"query": scenario.query, "variables": variables}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"JWT {self.data.token}",
+        )
+        if scenario.mutation:
+            # Roll writes back so every iteration sees the same dataset.
+            with transaction.atomic():
+                response = self.view(request)
+                transaction.set_rollback(True)
+        else:
+            response = self.view(request)
+        body = json.loads(response.content)
+        if body.get("errors"):
+            raise RuntimeError(f"{scenario.name} failed: {body['errors']}")
+
+    def run(self, scenario):
+        for _ in range(self.warmup):
+            self.execute(scenario)
+
+        latencies, queries = [], []
+        for _ in range(self.iterations):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                self.execute(scenario)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+
+        # Measured separately, tracemalloc would distort the latencies.
+        tracemalloc.start()
+        try:
+            for _ in range(min(self.iterations, 10)):
+                self.execute(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "iterations": self.iterations,
+            "latency_ms": {
+                "mean": sum(latencies) / len(latencies),
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": max(latencies),
+            },
+            "queries": {
+                "mean": sum(queries) / len(queries),
+                "max": max(queries),
+            },
+            "peak_memory_bytes": peak,
+        }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenarios(names=None, iterations=200, warmup=20, skew=1.1, seed=42):
+    """Run the named scenarios (all by default) and return the JSON report."""
+    runner = BenchmarkRunner(iterations=iterations, warmup=warmup, skew=skew, seed=seed)
+    scenarios = [s for s in SCENARIOS if names is None or s.name in names]
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "django": get_version(),
+            "database": connection.vendor,
+            "iterations": iterations,
+            "warmup": warmup,
+            "seed": seed,
+        },
+        "scenarios": {scenario.name: runner.run(scenario) for scenario in scenarios},
+    }
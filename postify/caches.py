@@ -0,0 +1,21 @@
+"""Checks for cache aliases that must be shared between worker processes."""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+# Backends whose entries are not seen by other processes.
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_cache(alias, setting):
+    """The cache ``alias`` named by ``setting``, refusing process-local backends."""
+    backend = settings.CACHES[alias]["BACKEND"]
+    if backend in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f"{setting} uses {backend}, which is not shared between workers"
+        )
+    return caches[alias]
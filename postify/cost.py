@@ -0,0 +1,226 @@
+"""
+Static cost and depth analysis of GraphQL operations.
+
+Runs on a validated document before execution. Every field costs its
+weight (``FIELD_WEIGHTS``, by default 1 for object fields and 0 for leaf
+fields) plus the cost of its selections multiplied by the number of items
+it is expected to return. That number comes from the ``first``/``last``
+argument of the field or of the enclosing connection, from ``LIST_SIZES``,
+or from ``DEFAULT_LIST_SIZE`` for unbounded lists.
+"""
+
+from dataclasses import dataclass
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLIncludeDirective,
+    GraphQLSkipDirective,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+)
+from graphql.error import GraphQLError
+from graphql.execution.values import get_argument_values, get_directive_values
+from graphql.language import FragmentDefinitionNode, OperationDefinitionNode
+
+DEFAULTS = {
+    "MAX_DEPTH": 12,
+    "MAX_COST": 10000,
+    "DEFAULT_LIST_SIZE": 20,
+    "FIELD_WEIGHTS": {},
+    "LIST_SIZES": {},
+}
+
+
+@dataclass
+class CostReport:
+    cost: int
+    depth: int
+    max_cost: int
+    max_depth: int
+
+    def as_extension(self):
+        return {
+            "cost": self.cost,
+            "depth": self.depth,
+            "maxCost": self.max_cost,
+            "maxDepth": self.max_depth,
+        }
+
+    def errors(self):
+        errors = []
+        if self.depth > self.max_depth:
+            errors.append(
+                GraphQLError(
+                    f"Query depth {self.depth} exceeds the maximum depth of "
+                    f"{self.max_depth}.",
+                    extensions={"code": "QUERY_TOO_DEEP"},
+                )
+            )
+        if self.cost > self.max_cost:
+            errors.append(
+                GraphQLError(
+                    f"Query cost {self.cost} exceeds the maximum cost of "
+                    f"{self.max_cost}.",
+                    extensions={"code": "QUERY_TOO_COMPLEX"},
+                )
+            )
+        return errors
+
+
+class CostAnalyzer:
+    def __init__(
+        self,
+        max_depth=12,
+        max_cost=10000,
+        default_list_size=20,
+        field_weights=None,
+        list_sizes=None,
+    ):
+        self.max_depth = max_depth
+        self.max_cost = max_cost
+        self.default_list_size = default_list_size
+        self.field_weights = field_weights or {}
+        self.list_sizes = list_sizes or {}
+
+    def analyze(self, schema, document, operation_name=None, variables=None):
+        operation = None
+        fragments = {}
+        for definition in document.definitions:
+            if isinstance(definition, FragmentDefinitionNode):
+                fragments[definition.name.value] = definition
+            elif isinstance(definition, OperationDefinitionNode):
+                if operation_name is None or (
+                    definition.name and definition.name.value == operation_name
+                ):
+                    operation = operation or definition
+
+        cost = depth = 0
+        if operation is not None:
+            root_type = schema.get_root_type(operation.operation)
+            cost, depth = self._selection_set(
+                schema,
+                root_type,
+                operation.selection_set,
+                fragments,
+                variables or {},
+                page_size=None,
+                visited=frozenset(),
+            )
+        return CostReport(cost, depth, self.max_cost, self.max_depth)
+
+    def _included(self, node, variables):
+        skip = get_directive_values(GraphQLSkipDirective, node, variables)
+        if skip and skip.get("if") is True:
+            return False
+        include = get_directive_values(GraphQLIncludeDirective, node, variables)
+        return not (include and include.get("if") is False)
+
+    def _fields(self, schema, parent_type, selection_set, fragments, variables, seen):
+        for selection in selection_set.selections:
+            if not self._included(selection, variables):
+                continue
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = schema.get_type(selection.type_condition.name.value)
+                yield from self._fields(
+                    schema,
+                    fragment_type,
+                    selection.selection_set,
+                    fragments,
+                    variables,
+                    seen,
+                )
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = fragments.get(name)
+                if fragment is None or name in seen:
+                    continue
+                yield from self._fields(
+                    schema,
+                    schema.get_type(fragment.type_condition.name.value),
+                    fragment.selection_set,
+                    fragments,
+                    variables,
+                    seen | {name},
+                )
+
+    def _selection_set(
+        self,
+        schema,
+        parent_type,
+        selection_set,
+        fragments,
+        variables,
+        page_size,
+        visited,
+    ):
+        total_cost = max_depth = 0
+        for field_type, node in self._fields(
+            schema, parent_type, selection_set, fragments, variables, visited
+        ):
+            name = node.name.value
+            if name.startswith("__"):
+                continue
+            field = getattr(field_type, "fields", {}).get(name)
+            if field is None:
+                continue
+
+            key = f"{field_type.name}.{name}"
+            return_type = get_nullable_type(field.type)
+            named_type = get_named_type(field.type)
+            weight = self.field_weights.get(key, 0 if is_leaf_type(named_type) else 1)
+
+            try:
+                arguments = get_argument_values(field, node, variables)
+            except GraphQLError:
+                arguments = {}
+            requested = arguments.get("first") or arguments.get("last")
+
+            child_page_size = None
+            multiplier = 1
+            if is_list_type(return_type):
+                multiplier = (
+                    requested
+                    or page_size
+                    or self.list_sizes.get(key, self.default_list_size)
+                )
+            elif requested or "first" in field.args:
+                child_page_size = requested or self.list_sizes.get(
+                    key, self.default_list_size
+                )
+
+            child_cost = child_depth = 0
+            if node.selection_set is not None:
+                child_cost, child_depth = self._selection_set(
+                    schema,
+                    named_type,
+                    node.selection_set,
+                    fragments,
+                    variables,
+                    child_page_size,
+                    visited,
+                )
+            total_cost += weight + multiplier * child_cost
+            max_depth = max(max_depth, child_depth + 1)
+        return total_cost, max_depth
+
+
+def build_cost_analyzer():
+    options = {**DEFAULTS, **getattr(settings, "GRAPHQL_COST", {})}
+    return CostAnalyzer(
+        max_depth=options["MAX_DEPTH"],
+        max_cost=options["MAX_COST"],
+        default_list_size=options["DEFAULT_LIST_SIZE"],
+        field_weights=options["FIELD_WEIGHTS"],
+        list_sizes=options["LIST_SIZES"],
+    )
+
+
+cost_analyzer = build_cost_analyzer()
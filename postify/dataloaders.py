@@ -0,0 +1,155 @@
+"""
+Request-scoped batch loaders.
+
+List resolvers queue the keys of the rows they return, and the first field
+resolver that misses on a loader fetches every queued key in one query. A
+fresh LoaderRegistry is attached to ``info.context`` for each request;
+batch functions keyed per viewer read the request's user from
+``loaders.viewer``.
+
+Async executions use an AsyncLoaderRegistry over the same loaders: a miss
+returns an awaitable, and every key missed in the same event loop tick is
+fetched by one batch call run through ``sync_to_async``.
+"""
+
+import asyncio
+from asgiref.sync import sync_to_async
+
+_batch_functions = {}
+
+
+def register_loader(name, many=False):
+    def decorator(batch_load_fn):
+        _batch_functions[name] = (batch_load_fn, many)
+        return batch_load_fn
+
+    return decorator
+
+
+class DataLoader:
+    def __init__(self, registry, batch_load_fn, many=False):
+        self.registry = registry
+        self.batch_load_fn = batch_load_fn
+        self.many = many
+        self._cache = {}
+        self._queue = {}
+
+    def _missing(self):
+        return [] if self.many else None
+
+    def queue(self, keys):
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._queue[key] = None
+
+    def prime(self, key, value):
+        self._queue.pop(key, None)
+        self._cache[key] = value
+
+    def clear(self, key=None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    def load(self, key):
+        if key is None:
+            return self._missing()
+        if key not in self._cache:
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        self.queue(keys)
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        if not self._queue:
+            return
+        keys = list(self._queue)
+        self._queue.clear()
+        results = self.batch_load_fn(self.registry, keys)
+        for key in keys:
+            self._cache[key] = results.get(key, self._missing())
+
+
+class AsyncDataLoader:
+    def __init__(self, loader):
+        self.loader = loader
+        self._pending = None
+
+    def queue(self, keys):
+        self.loader.queue(keys)
+
+    def prime(self, key, value):
+        self.loader.prime(key, value)
+
+    def clear(self, key=None):
+        self.loader.clear(key)
+
+    def load(self, key):
+        loader = self.loader
+        if key is None:
+            return loader._missing()
+        if key in loader._cache:
+            return loader._cache[key]
+        loader._queue[key] = None
+        return self._load(key)
+
+    def load_many(self, keys):
+        self.queue(keys)
+        return [self.load(key) for key in keys]
+
+    async def _load(self, key):
+        while key not in self.loader._cache:
+            if self._pending is None:
+                self._pending = asyncio.ensure_future(self._dispatch())
+            await self._pending
+        return self.loader._cache[key]
+
+    async def _dispatch(self):
+        try:
+            await sync_to_async(self.loader.dispatch)()
+        finally:
+            self._pending = None
+
+
+class LoaderRegistry:
+    loader_class = DataLoader
+
+    def __init__(self, context=None):
+        self.context = context
+
+    @property
+    def viewer(self):
+        user = getattr(self.context, "user", None)
+        return user if user is not None and user.is_authenticated else None
+
+    def __getattr__(self, name):
+        try:
+            batch_load_fn, many = _batch_functions[name]
+        except KeyError:
+            raise AttributeError(f"No loader registered as '{name}'")
+        loader = self.loader_class(self, batch_load_fn, many=many)
+        self.__dict__[name] = loader
+        return loader
+
+
+class AsyncLoaderRegistry:
+    def __init__(self, registry=None):
+        self.registry = registry or LoaderRegistry()
+
+    def __getattr__(self, name):
+        loader = AsyncDataLoader(getattr(self.registry, name))
+        self.__dict__[name] = loader
+        return loader
+
+
+def get_loaders(info):
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = LoaderRegistry(context)
+        context.loaders = loaders
+    return loaders
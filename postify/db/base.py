@@ -0,0 +1,125 @@
+"""
+SQLite backend tuned for a web process serving concurrent requests.
+
+Use it with ``"ENGINE": "postify.db"``. On top of Django's backend it
+
+* applies ``PRAGMAS`` (WAL journal, ``synchronous=NORMAL``, mmap, page cache,
+  busy timeout, in-memory temp store) to every new connection;
+* opens ``atomic`` blocks with ``BEGIN IMMEDIATE`` so writers queue on the
+  database lock up front, instead of failing with "database is locked" when
+  a deferred read transaction tries to upgrade to a write;
+* retries statements run outside a transaction, and ``BEGIN`` itself, when
+  they still find the database locked after the busy timeout;
+* really checks persistent connections when ``CONN_HEALTH_CHECKS`` is on.
+
+The extra ``OPTIONS`` keys are ``pragmas`` (merged over ``PRAGMAS``),
+``transaction_mode`` and ``lock_retries``/``lock_retry_delay``.
+"""
+
+import random
+import time
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.backends.sqlite3.base import Database, SQLiteCursorWrapper
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative sizes are in KiB.
+    "cache_size": -64 * 1024,
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+def is_locked(error):
+    return isinstance(error, Database.OperationalError) and (
+        "database is locked" in str(error) or "database table is locked" in str(error)
+    )
+
+
+def apply_pragmas(connection, pragmas):
+    for name, value in pragmas.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+def retry_locked(fn, retries, delay):
+    """Call ``fn``, retrying with jittered backoff while the database is locked."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Database.OperationalError as error:
+            if attempt == retries or not is_locked(error):
+                raise
+            time.sleep(delay * 2**attempt * random.uniform(0.5, 1.5))
+
+
+class RetryingCursorWrapper(SQLiteCursorWrapper):
+    lock_retries = 0
+    lock_retry_delay = 0.0
+
+    def execute(self, query, params=None):
+        if self.connection.in_transaction:
+            # Retrying one statement of a transaction would not be safe.
+            return super().execute(query, params)
+        return retry_locked(
+            lambda: super(RetryingCursorWrapper, self).execute(query, params),
+            self.lock_retries,
+            self.lock_retry_delay,
+        )
+
+    def executemany(self, query, param_list):
+        if self.connection.in_transaction:
+            return super().executemany(query, param_list)
+        param_list = list(param_list)
+        return retry_locked(
+            lambda: super(RetryingCursorWrapper, self).executemany(query, param_list),
+            self.lock_retries,
+            self.lock_retry_delay,
+        )
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+    pragmas = PRAGMAS
+    transaction_mode = "IMMEDIATE"
+    lock_retries = 3
+    lock_retry_delay = 0.05
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop("pragmas", {})}
+        self.transaction_mode = params.pop(
+            "transaction_mode", self.transaction_mode
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}."
+            )
+        self.lock_retries = params.pop("lock_retries", self.lock_retries)
+        self.lock_retry_delay = params.pop("lock_retry_delay", self.lock_retry_delay)
+        # sqlite3's own busy handler, in seconds, for statements run before
+        # the busy_timeout pragma.
+        params.setdefault("timeout", self.pragmas["busy_timeout"] / 1000)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        cursor.lock_retry_delay = self.lock_retry_delay
+        return cursor
+
+    def is_usable(self):
+        try:
+            self.connection.execute("SELECT 1")
+        except Database.Error:
+            return False
+        return True
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
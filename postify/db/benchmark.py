@@ -0,0 +1,185 @@
+"""
+Read and write throughput of the stock and the tuned SQLite backends.
+
+Reader and writer threads hammer a scratch database file for a fixed time
+through each backend's ``DatabaseWrapper``. The ``stock`` profile mirrors
+Django's defaults, a fresh connection per request (``CONN_MAX_AGE = 0``) and
+deferred transactions; ``tuned`` keeps one connection per thread with the
+``postify.db`` pragmas, ``BEGIN IMMEDIATE`` and lock retries. Writers read a
+row before updating it, the pattern that fails with "database is locked" when
+a deferred transaction cannot upgrade its lock.
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from django.db.backends.sqlite3.base import DatabaseWrapper as StockDatabaseWrapper
+from postify.db.base import DatabaseWrapper as TunedDatabaseWrapper
+from postify.db.base import Database, is_locked
+
+ROWS = 10000
+PROFILES = {
+    "stock": (StockDatabaseWrapper, {}, False),
+    "tuned": (TunedDatabaseWrapper, {"transaction_mode": "IMMEDIATE"}, True),
+}
+
+
+def _settings_dict(name, options):
+    return {
+        "ENGINE": "",
+        "NAME": name,
+        "OPTIONS": options,
+        "ATOMIC_REQUESTS": False,
+        "AUTOCOMMIT": True,
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "TIME_ZONE": None,
+        "USER": "",
+        "PASSWORD": "",
+        "HOST": "",
+        "PORT": "",
+        "TEST": {},
+    }
+
+
+def _create_table(name, rows):
+    connection = Database.connect(name)
+    try:
+        connection.execute(
+            "CREATE TABLE bench_item "
+            "(id INTEGER PRIMARY KEY, value TEXT NOT NULL, counter INTEGER NOT NULL)"
+        )
+        connection.executemany(
+            "INSERT INTO bench_item (id, value, counter) VALUES (?, ?, 0)",
+            ((index, f"item {index}") for index in range(1, rows + 1)),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class Worker(threading.Thread):
+    def __init__(self, profile, name, rows, deadline, write, seed):
+        super().__init__(daemon=True)
+        self.wrapper_class, self.options, self.persistent = PROFILES[profile]
+        self.db_name = name
+        self.rows = rows
+        self.deadline = deadline
+        self.write = write
+        self.rng = random.Random(seed)
+        self.operations = 0
+        self.locked = 0
+        self.latencies = []
+
+    def connect(self):
+        wrapper = self.wrapper_class(_settings_dict(self.db_name, self.options))
+        wrapper.ensure_connection()
+        return wrapper
+
+    def run(self):
+        wrapper = self.connect() if self.persistent else None
+        try:
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                current = wrapper or self.connect()
+                try:
+                    (self.write_once if self.write else self.read_once)(current)
+                    self.operations += 1
+                    self.latencies.append(time.perf_counter() - start)
+                except Database.OperationalError as error:
+                    if not is_locked(error):
+                        raise
+                    self.locked += 1
+                    if current.connection.in_transaction:
+                        current.connection.rollback()
+                finally:
+                    if wrapper is None:
+                        current.close()
+        finally:
+            if wrapper is not None:
+                wrapper.close()
+
+    def read_once(self, wrapper):
+        item_id = self.rng.randint(1, self.rows)
+        with wrapper.cursor() as cursor:
+            cursor.execute(
+                "SELECT value, counter FROM bench_item WHERE id = %s", [item_id]
+            )
+            cursor.fetchone()
+            cursor.execute(
+                "SELECT id, value FROM bench_item WHERE id > %s ORDER BY id LIMIT 20",
+                [item_id],
+            )
+            cursor.fetchall()
+
+    def write_once(self, wrapper):
+        item_id = self.rng.randint(1, self.rows)
+        # What transaction.atomic() does on SQLite.
+        wrapper._start_transaction_under_autocommit()
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT counter FROM bench_item WHERE id = %s", [item_id])
+            (counter,) = cursor.fetchone()
+            cursor.execute(
+                "UPDATE bench_item SET counter = %s WHERE id = %s",
+                [counter + 1, item_id],
+            )
+        wrapper.commit()
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_profile(profile, readers=4, writers=4, duration=5.0, rows=ROWS, seed=42):
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.join(directory, f"{profile}.sqlite3")
+        _create_table(name, rows)
+        deadline = time.perf_counter() + duration
+        workers = [
+            Worker(profile, name, rows, deadline, write, seed + index)
+            for index, write in enumerate([False] * readers + [True] * writers)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+    report = {}
+    for kind, write in (("reads", False), ("writes", True)):
+        group = [worker for worker in workers if worker.write is write]
+        latencies = [value for worker in group for value in worker.latencies]
+        operations = sum(worker.operations for worker in group)
+        report[kind] = {
+            "operations": operations,
+            "per_second": round(operations / elapsed, 1),
+            "locked_errors": sum(worker.locked for worker in group),
+            "latency_ms": {
+                key: round(value * 1000, 3) if value is not None else None
+                for key, value in (
+                    ("p50", _percentile(latencies, 0.5)),
+                    ("p95", _percentile(latencies, 0.95)),
+                    ("p99", _percentile(latencies, 0.99)),
+                )
+            },
+        }
+    return report
+
+
+def run_benchmark(profiles=None, **options):
+    return {
+        "threads": {
+            "readers": options.get("readers", 4),
+            "writers": options.get("writers", 4),
+        },
+        "duration_seconds": options.get("duration", 5.0),
+        "profiles": {
+            profile: run_profile(profile, **options) for profile in profiles or PROFILES
+        },
+    }
@@ -0,0 +1,65 @@
+"""
+Bounded LRU cache of parsed and validated GraphQL documents.
+
+Keyed by the document text and operation name, so repeated operations skip
+``parse`` and ``validate`` and go straight to execution.
+"""
+
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from graphql import parse, validate
+from graphql.error import GraphQLError
+
+DEFAULTS = {"MAX_ENTRIES": 1000}
+
+
+class DocumentCache:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, schema, query, operation_name=None):
+        """Return ``(document, errors)`` for ``query`` against ``schema``."""
+        key = (id(schema), query, operation_name)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._documents.move_to_end(key)
+                return entry
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            entry = (None, [error])
+        else:
+            entry = (document, validate(schema, document))
+
+        with self._lock:
+            self._documents[key] = entry
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._documents),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+
+_options = {**DEFAULTS, **getattr(settings, "GRAPHQL_DOCUMENT_CACHE", {})}
+document_cache = DocumentCache(max_entries=_options["MAX_ENTRIES"])
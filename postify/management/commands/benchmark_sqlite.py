@@ -0,0 +1,50 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from postify.db.benchmark import PROFILES, ROWS, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare read and write throughput of the stock and the tuned SQLite "
+        "backends on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="append",
+            dest="profiles",
+            choices=list(PROFILES),
+            help="Profile to run, may be repeated. Defaults to all of them.",
+        )
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument(
+            "--duration", type=float, default=5.0, help="Seconds per profile."
+        )
+        parser.add_argument("--rows", type=int, default=ROWS)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["readers"] < 0 or options["writers"] < 0:
+            raise CommandError("Thread counts cannot be negative.")
+        if options["readers"] + options["writers"] == 0:
+            raise CommandError("Need at least one reader or writer.")
+        if options["rows"] < 1 or options["duration"] <= 0:
+            raise CommandError("--rows and --duration must be positive.")
+
+        report = run_benchmark(
+            profiles=options["profiles"],
+            readers=options["readers"],
+            writers=options["writers"],
+            duration=options["duration"],
+            rows=options["rows"],
+            seed=options["seed"],
+        )
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,42 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from postify.benchmark import SCENARIOS, run_scenarios
+
+
+class Command(BaseCommand):
+    help = "Run the timed GraphQL scenarios and report the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            choices=[scenario.name for scenario in SCENARIOS],
+            help="Scenario to run, may be repeated. Defaults to all of them.",
+        )
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--skew", type=float, default=1.1)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        try:
+            report = run_scenarios(
+                names=options["scenarios"],
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                skew=options["skew"],
+                seed=options["seed"],
+            )
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(error)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,51 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from postify.benchmark import USERNAME_PREFIX, clear_dataset, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic dataset for the benchmark suite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--post-likes", type=int, default=50000)
+        parser.add_argument("--comment-likes", type=int, default=20000)
+        parser.add_argument(
+            "--follows", type=int, default=10, help="Average follows per user."
+        )
+        parser.add_argument("--tags", type=int, default=50)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument(
+            "--skew", type=float, default=1.1, help="Zipf exponent of activity."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete a previously seeded dataset first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            clear_dataset()
+        elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError("Benchmark data already exists, pass --clear to reseed.")
+        if options["users"] < 2 or options["tags"] < 1 or options["categories"] < 1:
+            raise CommandError("Need at least 2 users, 1 tag and 1 category.")
+
+        counts = generate_dataset(
+            users=options["users"],
+            posts=options["posts"],
+            comments=options["comments"],
+            post_likes=options["post_likes"],
+            comment_likes=options["comment_likes"],
+            follows=options["follows"],
+            tags=options["tags"],
+            categories=options["categories"],
+            skew=options["skew"],
+            seed=options["seed"],
+        )
+        self.stdout.write(json.dumps(counts, indent=2))
@@ -0,0 +1,42 @@
+import sqlite3
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from postify.routers import get_options
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the read replicas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "aliases",
+            nargs="*",
+            help="Replica aliases to refresh, defaults to READ_REPLICAS ALIASES.",
+        )
+
+    def handle(self, *args, **options):
+        aliases = options["aliases"] or get_options()["ALIASES"]
+        primary = connections[DEFAULT_DB_ALIAS]
+        for alias in [DEFAULT_DB_ALIAS, *aliases]:
+            if alias not in connections:
+                raise CommandError(f"Unknown database alias {alias!r}.")
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(
+                    f"{alias!r} is not SQLite, use the database's own replication."
+                )
+
+        primary.ensure_connection()
+        for alias in aliases:
+            replica = connections[alias]
+            name = str(replica.settings_dict["NAME"])
+            if name == str(primary.settings_dict["NAME"]):
+                raise CommandError(f"{alias!r} points at the primary database.")
+            replica.close()
+            target = sqlite3.connect(name)
+            try:
+                # The online backup API gives a consistent snapshot even while
+                # the primary is being written to.
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Copied {DEFAULT_DB_ALIAS} to {alias} ({name}).")
@@ -0,0 +1,302 @@
+"""
+Keyset (cursor) pagination for Relay connections.
+
+A cursor encodes the values of the ordering keys of a row, so fetching the
+page after it is an indexed range scan instead of an OFFSET scan.
+"""
+
+import base64
+import datetime
+import heapq
+import json
+from functools import reduce
+from itertools import groupby
+from operator import attrgetter, or_
+import graphene
+from django.db.models import Q
+from graphql.error import GraphQLError
+from postify.aio import is_async
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Groups read by one query in ``_group_pages``.
+GROUPS_PER_QUERY = 100
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    payload = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise GraphQLError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise GraphQLError("Invalid cursor")
+    return values
+
+
+def reverse_ordering(ordering):
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def keyset_filter(ordering, values):
+    """Rows strictly after ``values`` in ``ordering``."""
+    condition = Q()
+    for index, name in enumerate(ordering):
+        field = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        branch = Q(**{f"{field}__{lookup}": values[index]})
+        for previous, value in zip(ordering[:index], values[:index]):
+            branch &= Q(**{previous.lstrip("-"): value})
+        condition |= branch
+    return condition
+
+
+def cursor_for(node, ordering):
+    return encode_cursor(getattr(node, name.lstrip("-")) for name in ordering)
+
+
+def page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    if value < 0:
+        raise GraphQLError("Page size must not be negative")
+    return min(value, MAX_PAGE_SIZE)
+
+
+def _page_filter(queryset, ordering, first, after, last, before):
+    if after:
+        queryset = queryset.filter(
+            keyset_filter(ordering, decode_cursor(after, len(ordering)))
+        )
+    if before:
+        reverse = reverse_ordering(ordering)
+        queryset = queryset.filter(
+            keyset_filter(reverse, decode_cursor(before, len(ordering)))
+        )
+
+    backward = last is not None and first is None
+    limit = page_size(last if backward else first)
+    order_by = reverse_ordering(ordering) if backward else ordering
+    return queryset, order_by, limit, backward
+
+
+def _page_query(queryset, ordering, first, after, last, before):
+    queryset, order_by, limit, backward = _page_filter(
+        queryset, ordering, first, after, last, before
+    )
+    return queryset.order_by(*order_by)[: limit + 1], limit, backward
+
+
+def _connection(
+    nodes, limit, backward, connection_type, ordering, on_page, after, before
+):
+    has_more = len(nodes) > limit
+    nodes = nodes[:limit]
+    if backward:
+        nodes.reverse()
+
+    if on_page is not None:
+        on_page(nodes)
+
+    edges = [
+        connection_type.Edge(node=node, cursor=cursor_for(node, ordering))
+        for node in nodes
+    ]
+    page_info = graphene.relay.PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=has_more if backward else bool(after),
+        has_next_page=bool(before) if backward else has_more,
+    )
+    return connection_type(edges=edges, page_info=page_info)
+
+
+def paginate(
+    queryset,
+    connection_type,
+    ordering=("-created_at", "-id"),
+    on_page=None,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    **kwargs,
+):
+    ordering = list(ordering)
+    page, limit, backward = _page_query(queryset, ordering, first, after, last, before)
+    return _connection(
+        list(page), limit, backward, connection_type, ordering, on_page, after, before
+    )
+
+
+async def apaginate(
+    queryset,
+    connection_type,
+    ordering=("-created_at", "-id"),
+    on_page=None,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    **kwargs,
+):
+    """``paginate`` fetching the page with the async ORM."""
+    ordering = list(ordering)
+    page, limit, backward = _page_query(queryset, ordering, first, after, last, before)
+    nodes = [node async for node in page]
+    return _connection(
+        nodes, limit, backward, connection_type, ordering, on_page, after, before
+    )
+
+
+def _group_pages(
+    queryset, group_field, groups, ordering, first, after, last, before, key="pk"
+):
+    """
+    The first ``limit + 1`` rows of every group, each group's rows together.
+    ``groups`` holds values of ``group_field`` or maps each group to the
+    filter selecting its rows. Each group is read by its own ``ORDER BY ...
+    LIMIT`` subquery, so an index on the group and ordering columns stops
+    after one page, and the rows it picks are fetched by ``key``, unique per
+    row of ``queryset``. The subqueries of ``GROUPS_PER_QUERY`` groups are
+    OR'd into one query, keeping the WHERE clause within the database's
+    expression depth and parameter limits.
+    """
+    queryset, order_by, limit, backward = _page_filter(
+        queryset, ordering, first, after, last, before
+    )
+    if not isinstance(groups, dict):
+        groups = {group: Q(**{group_field: group}) for group in groups}
+    pages = [
+        Q(
+            **{
+                f"{key}__in": queryset.filter(condition)
+                .order_by(*order_by)
+                .values(key)[: limit + 1]
+            }
+        )
+        for condition in groups.values()
+    ]
+    rows = []
+    for start in range(0, len(pages), GROUPS_PER_QUERY):
+        batch = pages[start : start + GROUPS_PER_QUERY]
+        rows.extend(
+            queryset.filter(reduce(or_, batch)).order_by(group_field, *order_by)
+        )
+    return rows, limit, backward
+
+
+def paginate_groups(
+    queryset,
+    group_field,
+    groups,
+    connection_type,
+    ordering=("-created_at", "-id"),
+    on_page=None,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    **kwargs,
+):
+    """
+    ``paginate`` applied to each group of ``groups``, see ``_group_pages``,
+    with one query per ``GROUPS_PER_QUERY`` groups. Returns ``{group:
+    connection}`` and calls ``on_page`` once with the rows of every page.
+    """
+    ordering = list(ordering)
+    rows, limit, backward = _group_pages(
+        queryset, group_field, groups, ordering, first, after, last, before
+    )
+    nodes_by_group = {group: [] for group in groups}
+    for node in rows:
+        nodes_by_group[getattr(node, group_field)].append(node)
+    if on_page is not None:
+        on_page([node for nodes in nodes_by_group.values() for node in nodes[:limit]])
+    return {
+        group: _connection(
+            nodes, limit, backward, connection_type, ordering, None, after, before
+        )
+        for group, nodes in nodes_by_group.items()
+    }
+
+
+def paginate_merged(
+    sources,
+    connection_type,
+    ordering=("-created_at", "-id"),
+    on_page=None,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    **kwargs,
+):
+    """
+    ``paginate`` over the union of ``sources``, querysets of one model given
+    as ``(queryset, ordering)``, or as ``(queryset, ordering, group_field,
+    groups[, key])`` for one stream per group read as by ``_group_pages``.
+    Their orderings name the columns holding the values of ``ordering`` in
+    that source. Every stream is read for at most one page past the cursor,
+    and the streams are k-way merged, dropping duplicate rows, until the page
+    is full.
+    """
+    ordering = list(ordering)
+    descending = ordering[0].startswith("-")
+    if any(name.startswith("-") != descending for name in ordering):
+        raise ValueError("Merged orderings must sort every key the same way")
+
+    streams = []
+    for queryset, source_ordering, *grouping in sources:
+        if grouping:
+            group_field, groups, *key = grouping
+            rows, limit, backward = _group_pages(
+                queryset,
+                group_field,
+                groups,
+                list(source_ordering),
+                first,
+                after,
+                last,
+                before,
+                *key,
+            )
+            streams.extend(
+                list(stream) for _, stream in groupby(rows, key=attrgetter(group_field))
+            )
+        else:
+            page, limit, backward = _page_query(
+                queryset, list(source_ordering), first, after, last, before
+            )
+            streams.append(page)
+
+    nodes = []
+    seen = set()
+    for node in heapq.merge(
+        *streams,
+        key=lambda node: [getattr(node, name.lstrip("-")) for name in ordering],
+        reverse=descending != backward,
+    ):
+        if node.pk not in seen:
+            seen.add(node.pk)
+            nodes.append(node)
+            if len(nodes) > limit:
+                break
+    return _connection(
+        nodes, limit, backward, connection_type, ordering, on_page, after, before
+    )
+
+
+def paginator(info):
+    """The paginate function matching how ``info``'s operation executes."""
+    return apaginate if is_async(info) else paginate
@@ -0,0 +1,156 @@
+"""
+Automatic persisted queries (APQ).
+
+Clients send ``extensions.persistedQuery.sha256Hash`` instead of the query
+document. On a miss the server answers ``PersistedQueryNotFound`` and the
+client retries with both the hash and the document, which is then
+registered in the configured store. With ``ALLOWLIST_ONLY`` only documents
+listed in the ``MANIFEST`` file (or already in the store) are executed and
+nothing new is registered.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    "STORE": "postify.persisted_queries.MemoryQueryStore",
+    "OPTIONS": {},
+    "MANIFEST": None,
+    "ALLOWLIST_ONLY": False,
+}
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class BaseQueryStore:
+    def get(self, sha256_hash):
+        raise NotImplementedError
+
+    def set(self, sha256_hash, query):
+        raise NotImplementedError
+
+
+class MemoryQueryStore(BaseQueryStore):
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sha256_hash):
+        with self._lock:
+            query = self._queries.get(sha256_hash)
+            if query is not None:
+                self._queries.move_to_end(sha256_hash)
+            return query
+
+    def set(self, sha256_hash, query):
+        with self._lock:
+            self._queries[sha256_hash] = query
+            self._queries.move_to_end(sha256_hash)
+            while len(self._queries) > self.max_entries:
+                self._queries.popitem(last=False)
+
+
+class CacheQueryStore(BaseQueryStore):
+    """
+    Stores documents in a Django cache alias. Use a DatabaseCache alias for
+    a database-backed store; its MAX_ENTRIES option bounds the table.
+    """
+
+    def __init__(self, cache_alias="default", timeout=None, key_prefix="apq:"):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, sha256_hash):
+        return caches[self.cache_alias].get(self.key_prefix + sha256_hash)
+
+    def set(self, sha256_hash, query):
+        caches[self.cache_alias].set(
+            self.key_prefix + sha256_hash, query, timeout=self.timeout
+        )
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message, code, status=200):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.status = status
+
+
+class PersistedQueries:
+    def __init__(self, store, manifest=None, allowlist_only=False):
+        self.store = store
+        self.manifest = manifest or {}
+        self.allowlist_only = allowlist_only
+
+    def lookup(self, sha256_hash):
+        return self.manifest.get(sha256_hash) or self.store.get(sha256_hash)
+
+    def resolve(self, query, extensions):
+        """Return the document to execute for a request."""
+        persisted = (extensions or {}).get("persistedQuery") or {}
+        sha256_hash = persisted.get("sha256Hash")
+
+        if sha256_hash is None:
+            if query and self.allowlist_only and not self.lookup(query_hash(query)):
+                raise PersistedQueryError(
+                    "Query is not in the persisted query allowlist",
+                    "PERSISTED_QUERY_NOT_ALLOWED",
+                    status=400,
+                )
+            return query
+
+        if persisted.get("version", 1) != 1:
+            raise PersistedQueryError(
+                "Unsupported persisted query version",
+                "PERSISTED_QUERY_NOT_SUPPORTED",
+                status=400,
+            )
+
+        if not query:
+            query = self.lookup(sha256_hash)
+            if query is None:
+                raise PersistedQueryError(
+                    "PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"
+                )
+            return query
+
+        if query_hash(query) != sha256_hash:
+            raise PersistedQueryError(
+                "provided sha does not match query", "INVALID_PERSISTED_QUERY", 400
+            )
+        if self.lookup(sha256_hash) is None:
+            if self.allowlist_only:
+                raise PersistedQueryError(
+                    "Query is not in the persisted query allowlist",
+                    "PERSISTED_QUERY_NOT_ALLOWED",
+                    status=400,
+                )
+            self.store.set(sha256_hash, query)
+        return query
+
+
+def load_manifest(path):
+    with open(path) as manifest_file:
+        entries = json.load(manifest_file)
+    if isinstance(entries, dict):
+        return entries
+    return {query_hash(query): query for query in entries}
+
+
+def build_persisted_queries():
+    options = {**DEFAULTS, **getattr(settings, "PERSISTED_QUERIES", {})}
+    store = import_string(options["STORE"])(**options["OPTIONS"])
+    manifest = load_manifest(options["MANIFEST"]) if options["MANIFEST"] else {}
+    return PersistedQueries(
+        store, manifest=manifest, allowlist_only=options["ALLOWLIST_ONLY"]
+    )
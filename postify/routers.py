@@ -0,0 +1,93 @@
+"""
+Read-replica routing for GraphQL operations.
+
+The GraphQL views wrap every ``query`` operation in ``route_reads`` with an
+alias picked from ``READ_REPLICAS["ALIASES"]``, so all of its resolvers read
+from that replica. Mutations, and any code running outside a routed block,
+use the primary. After a mutation the session is pinned to the primary for
+``STICKY_SECONDS`` so it reads its own writes while the replicas catch up.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from graphql import OperationType
+from postify.caches import shared_cache
+
+DEFAULTS = {
+    "ENABLED": False,
+    "ALIASES": [],
+    "STICKY_SECONDS": 5,
+    "CACHE_ALIAS": "shared",
+}
+
+_read_alias = ContextVar("postify_read_alias", default=None)
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, "READ_REPLICAS", {})}
+
+
+@contextmanager
+def route_reads(alias):
+    """Send the reads made inside the block to ``alias``, ``None`` for the primary."""
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def _sticky_cache(options):
+    return shared_cache(options["CACHE_ALIAS"], "READ_REPLICAS['CACHE_ALIAS']")
+
+
+def _sticky_key(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"postify:read-primary:user:{user.pk}"
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"postify:read-primary:session:{session.session_key}"
+    return None
+
+
+def read_alias_for(request, operation_ast):
+    """Return the replica alias to read from for this operation, if any."""
+    options = get_options()
+    if not options["ENABLED"] or not options["ALIASES"]:
+        return None
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+    key = _sticky_key(request)
+    if key is not None and _sticky_cache(options).get(key):
+        return None
+    return random.choice(options["ALIASES"])
+
+
+def mark_write(request):
+    """Pin the request's session to the primary after it wrote."""
+    options = get_options()
+    key = _sticky_key(request)
+    if options["ENABLED"] and key is not None:
+        _sticky_cache(options).set(key, True, options["STICKY_SECONDS"])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, see the sync_replica command.
+        if db in get_options()["ALIASES"]:
+            return False
+        return None
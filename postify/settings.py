@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 import sys
+import tempfile
 
 
 def get_env_variable(var_name):
@@ -56,6 +57,7 @@ INSTALLED_APPS = [
     "profiles",
     "likes",
     "followers",
+    "postify",
 ]
 
 MIDDLEWARE = [
@@ -93,20 +95,143 @@ WSGI_APPLICATION = "postify.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# postify.db is Django's SQLite backend with WAL, mmap and busy-timeout
+# pragmas, BEGIN IMMEDIATE transactions and retries on "database is locked".
+# See postify/db/base.py for the OPTIONS it understands and
+# "manage.py benchmark_sqlite" for its effect.
+SQLITE_OPTIONS = {
+    "transaction_mode": "IMMEDIATE",
+    "pragmas": {"busy_timeout": 5000, "mmap_size": 256 * 1024 * 1024},
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "postify.db",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": SQLITE_OPTIONS,
+    },
+    "replica": {
+        "ENGINE": "postify.db",
+        "NAME": get_env_variable("POSTIFY_REPLICA_DB")
+        or BASE_DIR / "db.replica.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": SQLITE_OPTIONS,
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+# GraphQL queries read from one of ALIASES, mutations and everything else use
+# the primary. A session that ran a mutation reads from the primary for
+# STICKY_SECONDS; CACHE_ALIAS must be shared by all workers, per-process
+# backends are refused. Locally, set POSTIFY_REPLICA_DB and refresh the copy
+# with "manage.py sync_replica".
+READ_REPLICAS = {
+    "ENABLED": get_env_variable("POSTIFY_REPLICA_DB") is not None,
+    "ALIASES": ["replica"],
+    "STICKY_SECONDS": 5,
+    "CACHE_ALIAS": "shared",
+}
+
+DATABASE_ROUTERS = ["postify.routers.ReplicaRouter"]
+
 GRAPHENE = {
     "SCHEMA": "postify.schema.schema",
     "MIDDLEWARE": [
+        "postify.tracing.TracingMiddleware",
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
     ],
 }
 
+# postify/asgi.py sets POSTIFY_ASYNC_GRAPHQL=1 so /graphql/ is served by the
+# async view there. Mutations and other sync-only work run on a pool of
+# SYNC_WORKERS threads.
+ASYNC_GRAPHQL = {
+    "ENABLED": os.environ.get("POSTIFY_ASYNC_GRAPHQL") == "1",
+    "SYNC_WORKERS": int(os.environ.get("POSTIFY_SYNC_WORKERS", 8)),
+}
+
+# Per-resolver timings exported on /metrics/. Send "X-GraphQL-Tracing: 1"
+# to get an Apollo-style extensions.tracing block back.
+GRAPHQL_TRACING = {
+    "ENABLED": True,
+    "HEADER": "HTTP_X_GRAPHQL_TRACING",
+}
+
+# "shared" is seen by every worker process on the host. Deployments spread
+# over several hosts should point it at memcached, redis or the database cache.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": get_env_variable("POSTIFY_CACHE_DIR")
+        or os.path.join(tempfile.gettempdir(), "postify-cache"),
+    },
+}
+
+# Tags and categories are served from an in-process LRU keyed by a catalog
+# version kept in CACHE_ALIAS, which must be shared by all workers so
+# invalidations reach every process. Per-process backends are refused.
+CATALOG_CACHE = {
+    "CACHE_ALIAS": "shared",
+    "TIMEOUT": 300,
+    "MAX_ENTRIES": 64,
+    "VERSION_CHECK_INTERVAL": 1,
+}
+
+# Automatic persisted queries for /graphql/. Use
+# "postify.persisted_queries.CacheQueryStore" with a DatabaseCache alias for a
+# database-backed store, and set ALLOWLIST_ONLY with a MANIFEST of approved
+# documents in production.
+PERSISTED_QUERIES = {
+    "STORE": "postify.persisted_queries.MemoryQueryStore",
+    "OPTIONS": {"max_entries": 5000},
+    "MANIFEST": get_env_variable("PERSISTED_QUERIES_MANIFEST"),
+    "ALLOWLIST_ONLY": get_env_variable("PERSISTED_QUERIES_ALLOWLIST_ONLY") == "1",
+}
+
+GRAPHQL_DOCUMENT_CACHE = {
+    "MAX_ENTRIES": 1000,
+}
+
+# Static cost analysis run before execution. Fields are keyed as
+# "TypeName.fieldName"; LIST_SIZES estimates unbounded lists.
+GRAPHQL_COST = {
+    "MAX_DEPTH": 12,
+    "MAX_COST": 10000,
+    "DEFAULT_LIST_SIZE": 20,
+    "FIELD_WEIGHTS": {
+        "Query.posts": 2,
+        "Query.userFeed": 3,
+        "Query.postsByFollowedTags": 3,
+    },
+    "LIST_SIZES": {
+        "PostType.tags": 5,
+    },
+}
+
+# Write-behind mode for likePost/unlikePost, see likes/buffer.py. Intents are
+# coalesced per process and written in bulk every FLUSH_INTERVAL seconds.
+LIKE_BUFFER = {
+    "ENABLED": get_env_variable("POSTIFY_LIKE_BUFFER") == "1",
+    "FLUSH_INTERVAL": 0.05,
+    "MAX_ENTRIES": 5000,
+}
+
+# Fan-out-on-write timelines behind userFeed, see followers/timeline.py.
+# Posts by authors with more than CELEBRITY_FOLLOWERS followers are merged
+# into their followers' feeds when read instead of being fanned out.
+TIMELINE = {
+    "BACKGROUND": True,
+    "CELEBRITY_FOLLOWERS": 10000,
+    "BATCH_SIZE": 1000,
+    "BACKFILL": 200,
+}
+
 AUTHENTICATION_BACKENDS = [
     "graphql_jwt.backends.JSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
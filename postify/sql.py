@@ -0,0 +1,129 @@
+"""
+Single-statement writes the ORM cannot express.
+
+``insert_ignore`` inserts one row with ``INSERT ... ON CONFLICT DO NOTHING
+RETURNING``, so idempotent "add" mutations cost one statement whether or not
+the row already exists, and concurrent duplicates are absorbed by the unique
+constraint instead of slipping in between a SELECT and an INSERT.
+``bulk_insert_ignore`` does the same for many rows and reports how many
+were actually inserted.
+"""
+
+from django.db import IntegrityError, connections, router, transaction
+
+
+def supports_returning(connection):
+    return connection.vendor == "postgresql" or (
+        connection.vendor == "sqlite"
+        and connection.features.can_return_columns_from_insert
+    )
+
+
+def insert_ignore(model, values, conflict_fields, requires=None, using=None):
+    """
+    Insert ``values`` (field name to value) into ``model`` unless it would
+    violate the unique constraint on ``conflict_fields``.
+
+    ``requires`` is an optional ``(model, pk)`` row that must exist for the
+    insert to happen, which turns a missing foreign key target into "nothing
+    inserted" rather than an error at commit. Returns the new primary key, or
+    ``None`` when nothing was inserted.
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if not supports_returning(connection):
+        return _insert_ignore_fallback(model, values, requires, using)
+
+    quote = connection.ops.quote_name
+    opts = model._meta
+    fields = [opts.get_field(name) for name in values]
+    params = [
+        field.get_db_prep_save(value, connection)
+        for field, value in zip(fields, values.values())
+    ]
+    condition = "1 = 1"
+    if requires is not None:
+        required_model, required_pk = requires
+        required_opts = required_model._meta
+        condition = (
+            f"EXISTS (SELECT 1 FROM {quote(required_opts.db_table)} "
+            f"WHERE {quote(required_opts.pk.column)} = %s)"
+        )
+        params.append(required_opts.pk.get_db_prep_value(required_pk, connection))
+    # SQLite needs the WHERE clause to tell ON CONFLICT from a join constraint.
+    columns = ", ".join(quote(field.column) for field in fields)
+    conflict = ", ".join(quote(opts.get_field(name).column) for name in conflict_fields)
+    sql = (
+        f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+        f"SELECT {', '.join(['%s'] * len(fields))} WHERE {condition} "
+        f"ON CONFLICT ({conflict}) DO NOTHING RETURNING {quote(opts.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _insert_ignore_fallback(model, values, requires, using):
+    if requires is not None:
+        required_model, required_pk = requires
+        if not required_model.objects.using(using).filter(pk=required_pk).exists():
+            return None
+    try:
+        with transaction.atomic(using=using):
+            return model.objects.using(using).create(**values).pk
+    except IntegrityError:
+        return None
+
+
+def bulk_insert_ignore(model, rows, conflict_fields, using=None):
+    """
+    Insert ``rows`` (field name to value, the same fields in every row) into
+    ``model``, skipping those that would violate the unique constraint on
+    ``conflict_fields``. Returns the number of rows inserted.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return _bulk_insert_ignore_fallback(model, rows, using)
+
+    quote = connection.ops.quote_name
+    opts = model._meta
+    names = list(rows[0])
+    fields = [opts.get_field(name) for name in names]
+    columns = ", ".join(quote(field.column) for field in fields)
+    conflict = ", ".join(quote(opts.get_field(name).column) for name in conflict_fields)
+    row_sql = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            params = [
+                field.get_db_prep_save(row[name], connection)
+                for row in batch
+                for name, field in zip(names, fields)
+            ]
+            cursor.execute(
+                f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+                f"VALUES {', '.join([row_sql] * len(batch))} "
+                f"ON CONFLICT ({conflict}) DO NOTHING",
+                params,
+            )
+            inserted += cursor.rowcount
+    return inserted
+
+
+def _bulk_insert_ignore_fallback(model, rows, using):
+    inserted = 0
+    for values in rows:
+        try:
+            with transaction.atomic(using=using):
+                model.objects.using(using).create(**values)
+        except IntegrityError:
+            continue
+        inserted += 1
+    return inserted
@@ -0,0 +1,207 @@
+"""
+Query-budget harness for the GraphQL schema.
+
+Runs the named operations in ``operations.graphql`` against fixture data
+seeded at several sizes and checks that each one issues exactly the number
+of SQL queries pinned in ``query_budgets.json``, whatever the size. A
+failure lists every query with the resolver path that issued it.
+"""
+
+import json
+from pathlib import Path
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from graphql import OperationDefinitionNode, parse
+from graphql_jwt.shortcuts import get_token
+from comments.models import Comment
+from comments.threads import root_path
+from followers.models import UserFollower, UserTag
+from followers.timeline import fan_out_posts
+from posts.cache import catalog_cache
+from posts.models import Category, Post, PostTag, Tag
+from postify.tracing import tracer
+
+OPERATIONS_PATH = Path(__file__).with_name("operations.graphql")
+BUDGETS_PATH = Path(__file__).with_name("query_budgets.json")
+SEED_SIZES = (10, 100, 1000)
+
+
+def query_plan(sql, params=()):
+    """The steps of SQLite's ``EXPLAIN QUERY PLAN`` for ``sql``."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def load_operations(path=OPERATIONS_PATH):
+    source = Path(path).read_text()
+    names = [
+        definition.name.value
+        for definition in parse(source).definitions
+        if isinstance(definition, OperationDefinitionNode)
+    ]
+    return source, names
+
+
+def load_budgets(path=BUDGETS_PATH):
+    return json.loads(Path(path).read_text())
+
+
+def seed(size, tags=10, categories=5, comments_per_post=3):
+    """Create ``size`` posts with their authors, tags and comments."""
+    password = make_password(None)
+    users = User.objects.bulk_create(
+        [
+            User(username=f"seed-user-{index}", password=password)
+            for index in range(size // 10 + 2)
+        ]
+    )
+    commenters = User.objects.bulk_create(
+        [
+            User(username=f"seed-commenter-{index}", password=password)
+            for index in range(comments_per_post)
+        ]
+    )
+    viewer = User.objects.create_user(username="seed-viewer", password="password")
+    tag_objects = Tag.objects.bulk_create(
+        [Tag(name=f"seed-tag-{index}") for index in range(tags)]
+    )
+    category_objects = Category.objects.bulk_create(
+        [Category(name=f"seed-category-{index}") for index in range(categories)]
+    )
+    posts = Post.objects.bulk_create(
+        [
+            Post(
+                author=users[index % len(users)],
+                title=f"Seed post {index}",
+                slug=f"seed-post-{index}",
+                content=f"Seeded content {index}",
+                published=index % 2 == 0,
+                category=category_objects[index % len(category_objects)],
+            )
+            for index in range(size)
+        ],
+        batch_size=500,
+    )
+    PostTag.objects.bulk_create(
+        [
+            PostTag(post_id=post.id, tag_id=tag.id, created_at=post.created_at)
+            for index, post in enumerate(posts)
+            for tag in (
+                tag_objects[index % len(tag_objects)],
+                tag_objects[(index + 1) % len(tag_objects)],
+            )
+        ],
+        batch_size=500,
+    )
+    Comment.objects.bulk_create(
+        [
+            Comment(
+                author=commenters[offset],
+                post=post,
+                comment=f"Seed comment {offset}",
+            )
+            for post in posts
+            for offset in range(comments_per_post)
+        ],
+        batch_size=500,
+    )
+    # bulk_create skips Comment.save, which fills in the thread paths.
+    Comment.objects.filter(path="").update(path=root_path())
+    UserFollower.objects.bulk_create(
+        [UserFollower(follower=viewer, followed_user=user) for user in users[:2]]
+    )
+    UserTag.objects.bulk_create(
+        [UserTag(follower=viewer, tag=tag) for tag in tag_objects[:2]]
+    )
+    # Bulk inserts skip post_published, fan the posts out like a backfill.
+    fan_out_posts([post.id for post in posts])
+    catalog_cache.invalidate()
+    return {"viewer": viewer, "postId": posts[0].id}
+
+
+class QueryRecorder:
+    """Record every SQL query together with the resolver path running it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        trace = tracer.current
+        path = trace.path if trace is not None else None
+        self.queries.append(
+            (".".join(map(str, path.as_list())) if path else "(request)", sql)
+        )
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def report(self):
+        return "\n".join(
+            f"{index}. [{path}] {sql}"
+            for index, (path, sql) in enumerate(self.queries, start=1)
+        )
+
+
+class QueryBudgetMixin:
+    """``TestCase`` mixin asserting the query budgets of named operations."""
+
+    operations_path = OPERATIONS_PATH
+    budgets_path = BUDGETS_PATH
+    seed_sizes = SEED_SIZES
+
+    def run_operation(self, name, fixtures):
+        source, _ = load_operations(self.operations_path)
+        catalog_cache.invalidate()
+        with QueryRecorder() as recorder:
+            response = self.client.post(
+                "/graphql/",
+                json.dumps(
+                    {
+                        "query": source,
+                        "operationName": name,
+                        "variables": {"postId": fixtures["postId"]},
+                    }
+                ),
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"JWT {get_token(fixtures['viewer'])}",
+                HTTP_X_GRAPHQL_TRACING="1",
+            )
+        body = json.loads(response.content)
+        self.assertNotIn("errors", body, f"{name} failed: {body.get('errors')}")
+        return recorder
+
+    def assertQueryBudget(self, name, budget):
+        for size in self.seed_sizes:
+            with self.subTest(operation=name, size=size):
+                with transaction.atomic():
+                    fixtures = seed(size)
+                    recorder = self.run_operation(name, fixtures)
+                    transaction.set_rollback(True)
+                # The catalog cache would otherwise keep the rolled-back rows.
+                catalog_cache.invalidate()
+                self.assertEqual(
+                    len(recorder),
+                    budget,
+                    f"{name} ran {len(recorder)} queries against {size} seeded "
+                    f"posts, its budget is {budget}:\n{recorder.report()}",
+                )
+
+    def assertQueryBudgets(self):
+        _, names = load_operations(self.operations_path)
+        budgets = load_budgets(self.budgets_path)
+        self.assertEqual(
+            sorted(names), sorted(budgets), "Every operation needs a query budget."
+        )
+        for name in names:
+            self.assertQueryBudget(name, budgets[name])
@@ -0,0 +1,605 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from asgiref.sync import async_to_sync
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import (
+    AsyncRequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from graphql import parse
+from postify.cost import CostAnalyzer
+from postify.db.base import Database, retry_locked
+from comments.models import Comment
+from graphql_jwt.shortcuts import get_token
+from followers.timeline import fan_out_posts
+from posts.models import Post, Tag
+from postify.documents import DocumentCache, document_cache
+from postify.persisted_queries import (
+    CacheQueryStore,
+    MemoryQueryStore,
+    PersistedQueries,
+    query_hash,
+)
+from postify.routers import mark_write
+from postify.testing import QueryBudgetMixin
+from postify.tracing import tracer
+from postify.views import AsyncPostifyGraphQLView, PostifyGraphQLView
+
+TAGS_QUERY = "query { tags { name } }"
+
+
+class PersistedQueryTestCase(TestCase):
+    def setUp(self):
+        self.persisted_queries = PersistedQueries(MemoryQueryStore(max_entries=2))
+        PostifyGraphQLView.persisted_queries = self.persisted_queries
+
+    def tearDown(self):
+        PostifyGraphQLView.persisted_queries = None
+
+    def post(self, body):
+        response = self.client.post(
+            "/graphql/", json.dumps(body), content_type="application/json"
+        )
+        return response.status_code, json.loads(response.content)
+
+    def persisted(self, query):
+        return {"persistedQuery": {"version": 1, "sha256Hash": query_hash(query)}}
+
+    def test_hash_is_registered_after_a_miss(self):
+        extensions = self.persisted(TAGS_QUERY)
+        status, body = self.post({"extensions": extensions})
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            body["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND"
+        )
+
+        status, body = self.post({"query": TAGS_QUERY, "extensions": extensions})
+        self.assertIn("tags", body["data"])
+
+        status, body = self.post({"extensions": extensions})
+        self.assertEqual(status, 200)
+        self.assertIn("tags", body["data"])
+
+        response = self.client.get(
+            "/graphql/",
+            {"extensions": json.dumps(extensions)},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertIn("tags", json.loads(response.content)["data"])
+
+    def test_mismatched_hash_is_rejected(self):
+        status, body = self.post(
+            {
+                "query": "query { categories { name } }",
+                "extensions": self.persisted(TAGS_QUERY),
+            }
+        )
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            body["errors"][0]["extensions"]["code"], "INVALID_PERSISTED_QUERY"
+        )
+
+    def test_allowlist_only_mode(self):
+        self.persisted_queries.manifest = {query_hash(TAGS_QUERY): TAGS_QUERY}
+        self.persisted_queries.allowlist_only = True
+
+        status, body = self.post({"extensions": self.persisted(TAGS_QUERY)})
+        self.assertIn("tags", body["data"])
+        status, body = self.post({"query": TAGS_QUERY})
+        self.assertIn("tags", body["data"])
+
+        other = "query { categories { name } }"
+        for request in (
+            {"query": other},
+            {"query": other, "extensions": self.persisted(other)},
+        ):
+            status, body = self.post(request)
+            self.assertEqual(status, 400)
+            self.assertEqual(
+                body["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_ALLOWED"
+            )
+
+    def test_memory_store_is_bounded(self):
+        store = MemoryQueryStore(max_entries=2)
+        for name in ("a", "b", "c"):
+            store.set(name, name)
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("c"), "c")
+
+
+class DocumentCacheTestCase(TestCase):
+    def setUp(self):
+        document_cache.clear()
+
+    def post(self, query, **body):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": query, **body}),
+            content_type="application/json",
+        )
+        return json.loads(response.content)
+
+    def test_repeated_documents_skip_parsing_and_validation(self):
+        with mock.patch("postify.documents.parse", wraps=parse) as parse_mock:
+            for _ in range(3):
+                self.assertIn("tags", self.post(TAGS_QUERY)["data"])
+        self.assertEqual(parse_mock.call_count, 1)
+        self.assertEqual(document_cache.stats()["hits"], 2)
+        self.assertEqual(document_cache.stats()["misses"], 1)
+
+        response = self.client.get("/metrics/")
+        self.assertIn(b"graphql_document_cache_hits_total 2", response.content)
+
+    def test_invalid_documents_are_cached_with_their_errors(self):
+        for _ in range(2):
+            body = self.post("query { missingField }")
+            self.assertIn("missingField", body["errors"][0]["message"])
+        self.assertIn("Syntax Error", self.post("query {")["errors"][0]["message"])
+        self.assertEqual(document_cache.stats()["hits"], 1)
+
+    def test_cache_is_bounded(self):
+        cache = DocumentCache(max_entries=1)
+        schema = PostifyGraphQLView().schema.graphql_schema
+        cache.get(schema, TAGS_QUERY)
+        cache.get(schema, "query { categories { name } }")
+        cache.get(schema, TAGS_QUERY)
+        self.assertEqual(
+            cache.stats(), {"hits": 0, "misses": 3, "size": 1, "max_entries": 1}
+        )
+
+
+class CostAnalysisTestCase(TestCase):
+    def setUp(self):
+        self.analyzer = CostAnalyzer(max_depth=8, max_cost=500, default_list_size=20)
+        patcher = mock.patch.object(PostifyGraphQLView, "cost_analyzer", self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, query):
+        response = self.client.post(
+            "/graphql/", json.dumps({"query": query}), content_type="application/json"
+        )
+        return response.status_code, json.loads(response.content)
+
+    def test_cost_is_reported_in_extensions(self):
+        status, body = self.post(TAGS_QUERY)
+        self.assertEqual(status, 200)
+        self.assertEqual(body["extensions"]["cost"]["cost"], 1)
+        self.assertEqual(body["extensions"]["cost"]["depth"], 2)
+
+    def test_page_size_multiplies_the_cost_of_selections(self):
+        query = "query { posts(first: %d) { edges { node { title author { id } } } } }"
+        _, small = self.post(query % 5)
+        _, large = self.post(query % 10)
+        self.assertEqual(small["extensions"]["cost"]["cost"], 1 + 1 + 5 * 2)
+        self.assertEqual(large["extensions"]["cost"]["cost"], 1 + 1 + 10 * 2)
+
+    def test_expensive_queries_are_rejected_before_execution(self):
+        query = (
+            "query { posts(first: 100) { edges { node { "
+            "comments { edges { node { author { id } } } } } } } }"
+        )
+        with self.assertNumQueries(0):
+            status, body = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertNotIn("data", body)
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+
+    def test_deep_queries_are_rejected(self):
+        query = (
+            "query { posts { edges { node { comments { edges { node { post { "
+            "comments { edges { node { id } } } } } } } } } } }"
+        )
+        status, body = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        tracer.metrics.clear()
+        author = User.objects.create_user(username="author", password="password")
+        Post.objects.create(title="Traced", content="Content", author=author)
+
+    def post(self, query, **headers):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": query}),
+            content_type="application/json",
+            **headers,
+        )
+        return json.loads(response.content)
+
+    def test_resolver_timings_are_recorded_per_field_path(self):
+        body = self.post("query { posts { edges { node { title author { id } } } } }")
+        self.assertNotIn("tracing", body["extensions"])
+        posts = tracer.metrics.snapshot("posts")
+        self.assertEqual(posts["count"], 1)
+        self.assertGreaterEqual(posts["sql_queries"], 1)
+        self.assertEqual(tracer.metrics.snapshot("posts.author")["count"], 1)
+        self.assertIsNone(tracer.metrics.snapshot("posts.title"))
+
+        metrics = self.client.get("/metrics/").content.decode()
+        self.assertIn(
+            'graphql_resolver_duration_seconds_count{field="posts.author"} 1', metrics
+        )
+        self.assertIn('graphql_resolver_sql_queries_bucket{field="posts",le=', metrics)
+
+    def test_tracing_extension_is_returned_on_request(self):
+        body = self.post(
+            "query { posts { edges { node { title } } } }",
+            HTTP_X_GRAPHQL_TRACING="1",
+        )
+        tracing = body["extensions"]["tracing"]
+        self.assertEqual(tracing["version"], 1)
+        resolvers = {
+            tuple(resolver["path"]): resolver
+            for resolver in tracing["execution"]["resolvers"]
+        }
+        self.assertGreaterEqual(resolvers[("posts",)]["sqlQueries"], 1)
+        self.assertEqual(
+            resolvers[("posts", "edges", 0, "node", "title")]["returnType"], "String!"
+        )
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def test_operations_stay_within_their_query_budgets(self):
+        self.assertQueryBudgets()
+
+
+class BenchmarkCommandTestCase(TestCase):
+    seed_options = {
+        "users": 10,
+        "posts": 30,
+        "comments": 60,
+        "post_likes": 50,
+        "comment_likes": 20,
+        "follows": 3,
+        "tags": 5,
+        "categories": 2,
+        "stdout": io.StringIO(),
+    }
+
+    def test_seeds_a_skewed_dataset(self):
+        call_command("seed_benchmark", **self.seed_options)
+        self.assertEqual(
+            Post.objects.filter(author__username__startswith="bench-").count(), 30
+        )
+        with self.assertRaises(CommandError):
+            call_command("seed_benchmark", **self.seed_options)
+        call_command("seed_benchmark", clear=True, **self.seed_options)
+        self.assertEqual(
+            Post.objects.filter(author__username__startswith="bench-").count(), 30
+        )
+
+    def test_reports_every_scenario_as_json(self):
+        call_command("seed_benchmark", **self.seed_options)
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command("run_benchmark", iterations=3, warmup=1, output=output.name)
+            report = json.load(output)
+        self.assertEqual(
+            set(report["scenarios"]),
+            {
+                "posts",
+                "posts_search",
+                "post",
+                "user_feed",
+                "post_likes_count",
+                "create_comment",
+                "like_post",
+            },
+        )
+        for result in report["scenarios"].values():
+            self.assertEqual(result["iterations"], 3)
+            self.assertLessEqual(
+                result["latency_ms"]["p50"], result["latency_ms"]["max"]
+            )
+            self.assertGreater(result["queries"]["max"], 0)
+            self.assertGreater(result["peak_memory_bytes"], 0)
+
+
+class AsyncGraphQLMixin:
+    view = staticmethod(AsyncPostifyGraphQLView.as_view())
+
+    async def execute(self, query, variables=None, user=None, extensions=None):
+        headers = {}
+        if user is not None:
+            headers["Authorization"] = f"JWT {get_token(user)}"
+        body = {"variables": variables or {}}
+        if query is not None:
+            body["query"] = query
+        if extensions is not None:
+            body["extensions"] = extensions
+        request = AsyncRequestFactory().post(
+            "/graphql/",
+            json.dumps(body),
+            content_type="application/json",
+            headers=headers,
+        )
+        response = await self.view(request)
+        return response.status_code, json.loads(response.content)
+
+
+class AsyncGraphQLViewTestCase(AsyncGraphQLMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username="viewer", password="password")
+        tag = Tag.objects.create(name="async")
+        for index in range(3):
+            author = User.objects.create_user(username=f"author-{index}")
+            post = Post.objects.create(
+                title=f"Async {index}", content="content", author=author, published=True
+            )
+            post.tags.add(tag)
+            Comment.objects.create(post=post, author=cls.viewer, comment="hi")
+            cls.viewer.user_followers.create(followed_user=author)
+        fan_out_posts(Post.objects.values_list("id", flat=True))
+
+    async def test_queries_batch_through_async_loaders(self):
+        query = """
+            query {
+                posts {
+                    edges {
+                        node {
+                            title
+                            author { username }
+                            tags { name }
+                            comments { edges { node { comment author { username } } } }
+                        }
+                    }
+                }
+                tags { name }
+            }
+        """
+        status, body = await self.execute(query)
+        self.assertEqual(status, 200, body)
+        edges = body["data"]["posts"]["edges"]
+        self.assertEqual(len(edges), 3)
+        self.assertEqual(edges[0]["node"]["author"]["username"], "author-2")
+        self.assertEqual(edges[0]["node"]["tags"], [{"name": "async"}])
+        self.assertEqual(
+            edges[0]["node"]["comments"]["edges"][0]["node"]["author"]["username"],
+            "viewer",
+        )
+        self.assertIn({"name": "async"}, body["data"]["tags"])
+
+    def test_query_count_matches_the_sync_view(self):
+        query = """
+            query {
+                posts {
+                    edges { node { author { username } comments { edges { node { comment } } } } }
+                }
+            }
+        """
+        # Thread-sensitive ORM calls run on this thread, so they are counted.
+        with self.assertNumQueries(3):
+            status, body = async_to_sync(self.execute)(query)
+        self.assertEqual(status, 200, body)
+
+    async def test_authenticates_before_executing(self):
+        query = "query { userFeed { edges { node { title } } } }"
+        _, body = await self.execute(query, user=self.viewer)
+        self.assertEqual(len(body["data"]["userFeed"]["edges"]), 3)
+
+        _, body = await self.execute(query)
+        self.assertEqual(body["errors"][0]["message"], "User is not authenticated")
+
+    async def test_post_by_id(self):
+        post = await Post.objects.aget(title="Async 1")
+        query = "query Post($id: ID!) { post(id: $id) { title author { username } } }"
+        _, body = await self.execute(query, {"id": post.id})
+        self.assertEqual(body["data"]["post"]["author"]["username"], "author-1")
+
+        _, body = await self.execute(query, {"id": 0})
+        self.assertEqual(body["errors"][0]["message"], "Post not found")
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "apq": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "postify_apq",
+        },
+    }
+)
+class AsyncPersistedQueryTestCase(AsyncGraphQLMixin, TestCase):
+    def setUp(self):
+        call_command("createcachetable", "postify_apq")
+        PostifyGraphQLView.persisted_queries = PersistedQueries(
+            CacheQueryStore(cache_alias="apq")
+        )
+
+    def tearDown(self):
+        PostifyGraphQLView.persisted_queries = None
+
+    async def test_database_backed_store_is_read_off_the_event_loop(self):
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": query_hash(TAGS_QUERY)}
+        }
+        _, body = await self.execute(None, extensions=extensions)
+        self.assertEqual(
+            body["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND"
+        )
+
+        status, body = await self.execute(TAGS_QUERY, extensions=extensions)
+        self.assertEqual(status, 200, body)
+        status, body = await self.execute(None, extensions=extensions)
+        self.assertEqual(status, 200, body)
+        self.assertIn({"name": "Science"}, body["data"]["tags"])
+
+
+class AsyncGraphQLMutationTestCase(AsyncGraphQLMixin, TransactionTestCase):
+    async def test_mutations_run_on_the_sync_pool(self):
+        viewer = await User.objects.acreate(username="viewer")
+        post = await Post.objects.acreate(
+            title="Pooled", content="content", author=viewer
+        )
+        query = """
+            mutation Comment($input: CommentCreateInput!) {
+                createComment(input: $input) { comment { comment } }
+            }
+        """
+        variables = {
+            "input": {"comment": "pooled", "authorId": viewer.id, "postId": post.id}
+        }
+        status, body = await self.execute(query, variables, user=viewer)
+        self.assertEqual(status, 200, body)
+        self.assertEqual(body["data"]["createComment"]["comment"]["comment"], "pooled")
+        self.assertTrue(await Comment.objects.filter(comment="pooled").aexists())
+
+
+@override_settings(
+    READ_REPLICAS={
+        "ENABLED": True,
+        "ALIASES": ["replica"],
+        "STICKY_SECONDS": 5,
+        "CACHE_ALIAS": "shared",
+    }
+)
+class ReadReplicaTestCase(TransactionTestCase):
+    # "replica" mirrors the test database, so it sees the committed rows.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        caches["shared"].clear()
+        self.viewer = User.objects.create_user(username="viewer", password="password")
+        self.post = Post.objects.create(
+            title="Replicated", content="content", author=self.viewer
+        )
+
+    def execute(self, query, variables=None):
+        response = self.client.post(
+            "/graphql/",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"JWT {get_token(self.viewer)}",
+        )
+        body = json.loads(response.content)
+        self.assertNotIn("errors", body)
+        return body["data"]
+
+    def capture(self, query, variables=None):
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                data = self.execute(query, variables)
+        return data, len(primary), len(replica)
+
+    def test_queries_read_from_the_replica(self):
+        data, primary, replica = self.capture(
+            "query { posts { edges { node { title author { username } } } } }"
+        )
+        self.assertEqual(data["posts"]["edges"][0]["node"]["title"], "Replicated")
+        self.assertGreater(replica, 0)
+        # Only authenticating the token reads from the primary.
+        self.assertEqual(primary, 1)
+
+    def test_reads_stick_to_the_primary_after_a_mutation(self):
+        mutation = """
+            mutation Toggle($id: ID!) {
+                postTogglePublish(id: $id) { success }
+            }
+        """
+        _, _, replica = self.capture(mutation, {"id": self.post.id})
+        self.assertEqual(replica, 0)
+
+        _, _, replica = self.capture("query { posts { edges { node { title } } } }")
+        self.assertEqual(replica, 0)
+
+        caches["shared"].clear()
+        _, _, replica = self.capture("query { posts { edges { node { title } } } }")
+        self.assertGreater(replica, 0)
+
+    def test_process_local_sticky_caches_are_refused(self):
+        options = {**settings.READ_REPLICAS, "CACHE_ALIAS": "default"}
+        with override_settings(READ_REPLICAS=options):
+            with self.assertRaises(ImproperlyConfigured):
+                mark_write(mock.Mock(user=self.viewer))
+
+
+class SyncReplicaCommandTestCase(TransactionTestCase):
+    def test_copies_the_primary_onto_the_replica(self):
+        Post.objects.create(
+            title="Copied",
+            content="content",
+            author=User.objects.create_user(username="writer"),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, "replica.sqlite3")
+            settings_dict = connections["replica"].settings_dict
+            with mock.patch.dict(settings_dict, {"NAME": name}):
+                call_command("sync_replica", stdout=io.StringIO())
+            replica = sqlite3.connect(name)
+            try:
+                titles = replica.execute("SELECT title FROM posts_post").fetchall()
+            finally:
+                replica.close()
+        self.assertIn(("Copied",), titles)
+
+    def test_refuses_to_overwrite_the_primary(self):
+        with self.assertRaises(CommandError):
+            call_command("sync_replica", stdout=io.StringIO())
+
+
+class TunedSQLiteTestCase(TestCase):
+    def test_pragmas_are_applied_on_connect(self):
+        with connections["default"].cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(connections["default"].transaction_mode, "IMMEDIATE")
+        self.assertTrue(connections["default"].is_usable())
+
+    def test_locked_statements_are_retried(self):
+        calls = []
+
+        def locked_twice():
+            calls.append(1)
+            if len(calls) < 3:
+                raise Database.OperationalError("database is locked")
+            return "done"
+
+        self.assertEqual(retry_locked(locked_twice, retries=3, delay=0), "done")
+        calls.clear()
+        with self.assertRaises(Database.OperationalError):
+            retry_locked(locked_twice, retries=1, delay=0)
+
+        def broken():
+            calls.append(1)
+            raise Database.OperationalError("no such table: missing")
+
+        calls.clear()
+        with self.assertRaises(Database.OperationalError):
+            retry_locked(broken, retries=3, delay=0)
+        self.assertEqual(len(calls), 1)
+
+    def test_benchmark_reports_both_profiles(self):
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "benchmark_sqlite",
+                readers=1,
+                writers=2,
+                duration=0.2,
+                rows=100,
+                output=output.name,
+            )
+            report = json.load(output)
+        self.assertEqual(set(report["profiles"]), {"stock", "tuned"})
+        for profile in report["profiles"].values():
+            self.assertGreater(profile["reads"]["operations"], 0)
+            self.assertGreater(profile["writes"]["operations"], 0)
@@ -0,0 +1,296 @@
+"""
+Per-resolver timing and SQL instrumentation.
+
+``TracingMiddleware`` times every resolver of an object or list field and
+attributes the SQL run while it executes, through a
+``connection.execute_wrapper`` installed for the whole request. Samples are
+keyed by resolver path (``posts.author``, ``userFeed.tags``) with list
+indices and Relay ``edges``/``node`` wrappers dropped, and are folded into
+per-field histograms once per request. Leaf fields and the wrappers
+themselves run untimed unless the client asked for an Apollo-style
+``extensions.tracing`` block. Resolvers returning awaitables are timed until
+they complete, without SQL attribution since they overlap.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import connections
+from graphql import get_named_type, is_leaf_type
+from graphql.pyutils import is_awaitable
+
+DEFAULTS = {
+    "ENABLED": True,
+    "HEADER": "HTTP_X_GRAPHQL_TRACING",
+    "DURATION_BUCKETS": (
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+    ),
+    "SQL_QUERY_BUCKETS": (0, 1, 2, 5, 10, 25, 50, 100),
+}
+WRAPPER_FIELDS = {"edges", "node"}
+
+
+def _format_time(value):
+    return (
+        datetime.fromtimestamp(value, timezone.utc).isoformat().replace("+00:00", "Z")
+    )
+
+
+def field_path(path):
+    return ".".join(
+        key
+        for key in path.as_list()
+        if isinstance(key, str) and key not in WRAPPER_FIELDS
+    )
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+
+class ResolverMetrics:
+    def __init__(self, duration_buckets, sql_query_buckets):
+        self.duration_buckets = duration_buckets
+        self.sql_query_buckets = sql_query_buckets
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def record(self, samples):
+        with self._lock:
+            for path, duration, sql_queries, sql_duration in samples:
+                field = self._fields.get(path)
+                if field is None:
+                    field = self._fields[path] = (
+                        Histogram(self.duration_buckets),
+                        Histogram(self.sql_query_buckets),
+                        [0.0],
+                    )
+                field[0].observe(duration)
+                field[1].observe(sql_queries)
+                field[2][0] += sql_duration
+
+    def clear(self):
+        with self._lock:
+            self._fields.clear()
+
+    def snapshot(self, path):
+        with self._lock:
+            field = self._fields.get(path)
+            if field is None:
+                return None
+            return {
+                "count": field[0].count,
+                "duration": field[0].sum,
+                "sql_queries": field[1].sum,
+                "sql_duration": field[2][0],
+            }
+
+    def render(self):
+        lines = [
+            "# HELP graphql_resolver_duration_seconds Resolver wall time",
+            "# TYPE graphql_resolver_duration_seconds histogram",
+        ]
+        with self._lock:
+            fields = sorted(self._fields.items())
+            for path, (duration, _, _) in fields:
+                lines.extend(
+                    _histogram_lines(
+                        "graphql_resolver_duration_seconds", path, duration
+                    )
+                )
+            lines.append(
+                "# HELP graphql_resolver_sql_queries SQL queries per resolver call"
+            )
+            lines.append("# TYPE graphql_resolver_sql_queries histogram")
+            for path, (_, sql_queries, _) in fields:
+                lines.extend(
+                    _histogram_lines("graphql_resolver_sql_queries", path, sql_queries)
+                )
+            lines.append(
+                "# HELP graphql_resolver_sql_duration_seconds_total "
+                "SQL time spent inside resolvers"
+            )
+            lines.append("# TYPE graphql_resolver_sql_duration_seconds_total counter")
+            for path, (_, _, sql_duration) in fields:
+                lines.append(
+                    f'graphql_resolver_sql_duration_seconds_total{{field="{path}"}} '
+                    f"{sql_duration[0]}"
+                )
+        return lines
+
+
+def _histogram_lines(metric, path, histogram):
+    for bound, count in histogram.cumulative():
+        yield f'{metric}_bucket{{field="{path}",le="{bound}"}} {count}'
+    yield f'{metric}_sum{{field="{path}"}} {histogram.sum}'
+    yield f'{metric}_count{{field="{path}"}} {histogram.count}'
+
+
+class Trace:
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.samples = []
+        self.resolvers = []
+        self.path = None
+        self._current = None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            current = self._current
+            if current is not None:
+                current[0] += 1
+                current[1] += time.perf_counter() - start
+
+    def resolve(self, next, root, info, **args):
+        leaf = info.field_name in WRAPPER_FIELDS or is_leaf_type(
+            get_named_type(info.return_type)
+        )
+        if leaf and not self.detailed:
+            return next(root, info, **args)
+
+        parent, current = self._current, [0, 0.0]
+        parent_path, self._current, self.path = self.path, current, info.path
+        start = time.perf_counter()
+        try:
+            result = next(root, info, **args)
+        finally:
+            self._current, self.path = parent, parent_path
+        if is_awaitable(result):
+            return self._resolve_async(result, info, leaf, start, current)
+
+        if parent is not None:
+            parent[0] += current[0]
+            parent[1] += current[1]
+        self._record(info, leaf, start, current)
+        return result
+
+    async def _resolve_async(self, result, info, leaf, start, current):
+        # Awaited resolvers overlap, so only their wall time is attributed.
+        try:
+            return await result
+        finally:
+            self._record(info, leaf, start, current)
+
+    def _record(self, info, leaf, start, current):
+        duration = time.perf_counter() - start
+        if not leaf:
+            self.samples.append(
+                (field_path(info.path), duration, current[0], current[1])
+            )
+        if self.detailed:
+            self.resolvers.append(
+                {
+                    "path": info.path.as_list(),
+                    "parentType": info.parent_type.name,
+                    "fieldName": info.field_name,
+                    "returnType": str(info.return_type),
+                    "startOffset": int((start - self.start) * 1e9),
+                    "duration": int(duration * 1e9),
+                    "sqlQueries": current[0],
+                    "sqlDuration": int(current[1] * 1e9),
+                }
+            )
+
+    def as_extension(self):
+        end = self.end or time.perf_counter()
+        duration = end - self.start
+        return {
+            "version": 1,
+            "startTime": _format_time(self.start_wall),
+            "endTime": _format_time(self.start_wall + duration),
+            "duration": int(duration * 1e9),
+            "execution": {"resolvers": self.resolvers},
+        }
+
+
+class Tracer:
+    def __init__(self, enabled, header, metrics):
+        self.enabled = enabled
+        self.header = header
+        self.metrics = metrics
+        self._current = ContextVar("graphql_trace", default=None)
+
+    @property
+    def current(self):
+        return self._current.get()
+
+    def requested(self, request):
+        return request.META.get(self.header, "").lower() in ("1", "true")
+
+    @contextmanager
+    def trace(self, request):
+        """Trace the resolvers executed inside the block for ``request``."""
+        if not self.enabled:
+            yield None
+            return
+
+        trace = Trace(detailed=self.requested(request))
+        token = self._current.set(trace)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(trace.execute_wrapper)
+                    )
+                yield trace
+        finally:
+            trace.end = time.perf_counter()
+            self._current.reset(token)
+            self.metrics.record(trace.samples)
+
+
+def _build_tracer():
+    options = {**DEFAULTS, **getattr(settings, "GRAPHQL_TRACING", {})}
+    return Tracer(
+        enabled=options["ENABLED"],
+        header=options["HEADER"],
+        metrics=ResolverMetrics(
+            options["DURATION_BUCKETS"], options["SQL_QUERY_BUCKETS"]
+        ),
+    )
+
+
+tracer = _build_tracer()
+
+
+class TracingMiddleware:
+    def resolve(self, next, root, info, **args):
+        trace = tracer.current
+        if trace is None:
+            return next(root, info, **args)
+        return trace.resolve(next, root, info, **args)
@@ -14,13 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from postify.views import AsyncPostifyGraphQLView, PostifyGraphQLView, metrics
+
+if settings.ASYNC_GRAPHQL["ENABLED"]:
+    graphql_view = AsyncPostifyGraphQLView.as_view(graphiql=True)
+    # csrf_exempt() turns async views into sync ones before Django 5.0.
+    graphql_view.csrf_exempt = True
+else:
+    graphql_view = csrf_exempt(PostifyGraphQLView.as_view(graphiql=True))
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("graphql/", graphql_view),
+    path("metrics/", metrics),
 ]
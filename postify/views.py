@@ -0,0 +1,357 @@
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import OperationType, execute, get_operation_ast
+from graphql.execution import ExecutionResult
+from graphql.pyutils import is_awaitable
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+from graphql_jwt.utils import get_http_authorization
+from postify.aio import run_sync
+from postify.cost import cost_analyzer
+from postify.dataloaders import AsyncLoaderRegistry, LoaderRegistry
+from postify.documents import document_cache
+from postify.persisted_queries import PersistedQueryError, build_persisted_queries
+from postify.routers import mark_write, read_alias_for, route_reads
+from postify.tracing import tracer
+
+
+class PostifyGraphQLView(GraphQLView):
+    persisted_queries = None
+    document_cache = document_cache
+    cost_analyzer = cost_analyzer
+    tracer = tracer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if PostifyGraphQLView.persisted_queries is None:
+            PostifyGraphQLView.persisted_queries = build_persisted_queries()
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        try:
+            query = self.persisted_queries.resolve(query, extensions)
+        except PersistedQueryError as error:
+            raise HttpError(HttpResponse(status=error.status), message=error)
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        prepared = self.prepare_operation(
+            request, query, variables, operation_name, show_graphiql
+        )
+        if not isinstance(prepared, tuple):
+            return prepared
+        try:
+            self.authenticate(request)
+        except JSONWebTokenError:
+            # JSONWebTokenMiddleware reports it on the fields that need a user.
+            pass
+        return self.run_operation(request, *prepared, variables, operation_name)
+
+    def prepare_operation(
+        self, request, query, variables, operation_name, show_graphiql=False
+    ):
+        """
+        Parse, validate and cost the operation.
+
+        Returns ``(document, operation_ast, extensions)`` when it should be
+        executed, otherwise the ``ExecutionResult`` (or ``None`` for
+        GraphiQL) to respond with.
+        """
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, errors = self.document_cache.get(
+            self.schema.graphql_schema, query, operation_name
+        )
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == "get":
+            if operation_ast and operation_ast.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None
+
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request.".format(
+                            operation_ast.operation.value
+                        ),
+                    )
+                )
+
+        report = self.cost_analyzer.analyze(
+            self.schema.graphql_schema, document, operation_name, variables
+        )
+        extensions = {"cost": report.as_extension()}
+        errors = report.errors()
+        if errors:
+            return ExecutionResult(data=None, errors=errors, extensions=extensions)
+        return document, operation_ast, extensions
+
+    def authenticate(self, request):
+        """
+        Resolve ``request.user`` before execution so it can pick the database
+        to read from, and so resolvers do not hit the DB for it.
+        """
+        user = None
+        if get_http_authorization(request) is not None:
+            user = authenticate(request=request)
+        if user is None:
+            # Evaluates the lazy session user here rather than on the event loop.
+            user = getattr(request, "user", None)
+            if user is None or not user.is_authenticated:
+                user = AnonymousUser()
+        request.user = user
+
+    def execution_options(self, request, document, variables, operation_name):
+        options = {
+            "document": document,
+            "root_value": self.get_root_value(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "context_value": self.get_context(request),
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            options["execution_context_class"] = self.execution_context_class
+        return options
+
+    def run_operation(
+        self, request, document, operation_ast, extensions, variables, operation_name
+    ):
+        read_alias = read_alias_for(request, operation_ast)
+        with route_reads(read_alias), self.tracer.trace(request) as trace:
+            try:
+                options = self.execution_options(
+                    request, document, variables, operation_name
+                )
+                if (
+                    operation_ast
+                    and operation_ast.operation == OperationType.MUTATION
+                    and (
+                        graphene_settings.ATOMIC_MUTATIONS is True
+                        or connection.settings_dict.get("ATOMIC_MUTATIONS", False)
+                        is True
+                    )
+                ):
+                    with transaction.atomic():
+                        result = self.execute_document(**options)
+                        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                            transaction.set_rollback(True)
+                else:
+                    result = self.execute_document(**options)
+            except Exception as e:
+                result = ExecutionResult(errors=[e])
+        if operation_ast and operation_ast.operation == OperationType.MUTATION:
+            mark_write(request)
+        return self.finish_result(result, trace, extensions)
+
+    def finish_result(self, result, trace, extensions):
+        if trace is not None and trace.detailed:
+            extensions["tracing"] = trace.as_extension()
+        result.extensions = {**(result.extensions or {}), **extensions}
+        return result
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id, show_graphiql=False):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def execute_document(self, **options):
+        result = execute(self.schema.graphql_schema, **options)
+        if is_awaitable(result):
+            raise RuntimeError("GraphQL execution failed to complete synchronously.")
+        return result
+
+    @staticmethod
+    def format_error(error):
+        if isinstance(error, HttpError) and isinstance(
+            error.message, PersistedQueryError
+        ):
+            return {
+                "message": error.message.message,
+                "extensions": {"code": error.message.code},
+            }
+        return GraphQLView.format_error(error)
+
+
+class AsyncPostifyGraphQLView(PostifyGraphQLView):
+    """
+    Executes queries natively on the event loop for the ASGI entry point.
+
+    Resolvers see ``request.async_execution`` and use the async ORM, loaders
+    batch through ``sync_to_async`` and sibling fields resolve concurrently.
+    Mutations keep their sync resolvers and transaction and run on the
+    bounded sync pool; GraphiQL and batch requests use the sync view.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.batch or (
+                self.graphiql and self.can_display_graphiql(request, data)
+            ):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            # The persisted query store may be a database-backed cache.
+            query, variables, operation_name, id = await sync_to_async(
+                self.get_graphql_params
+            )(request, data)
+            execution_result = await self.aexecute_graphql_request(
+                request, query, variables, operation_name
+            )
+            result, status_code = self.build_response(request, execution_result, id)
+            return HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    async def aexecute_graphql_request(self, request, query, variables, operation_name):
+        prepared = self.prepare_operation(request, query, variables, operation_name)
+        if not isinstance(prepared, tuple):
+            return prepared
+        document, operation_ast, extensions = prepared
+
+        try:
+            await sync_to_async(self.authenticate)(request)
+        except JSONWebTokenError as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await run_sync(
+                self.run_operation,
+                request,
+                document,
+                operation_ast,
+                extensions,
+                variables,
+                operation_name,
+            )
+
+        request.async_execution = True
+        request.loaders = AsyncLoaderRegistry(LoaderRegistry(request))
+        read_alias = await sync_to_async(read_alias_for)(request, operation_ast)
+        with route_reads(read_alias), self.tracer.trace(request) as trace:
+            try:
+                result = execute(
+                    self.schema.graphql_schema,
+                    **self.execution_options(
+                        request, document, variables, operation_name
+                    ),
+                )
+                if is_awaitable(result):
+                    result = await result
+            except Exception as e:
+                result = ExecutionResult(errors=[e])
+        return self.finish_result(result, trace, extensions)
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if getattr(request, "async_execution", False) and isinstance(middleware, list):
+            # authenticate() already ran, the JWT middleware would only repeat it.
+            middleware = [
+                m for m in middleware if not isinstance(m, JSONWebTokenMiddleware)
+            ]
+        return middleware
+
+
+def metrics(request):
+    stats = document_cache.stats()
+    samples = [
+        ("graphql_document_cache_hits_total", "counter", "Document cache hits", "hits"),
+        (
+            "graphql_document_cache_misses_total",
+            "counter",
+            "Document cache misses",
+            "misses",
+        ),
+        ("graphql_document_cache_size", "gauge", "Documents currently cached", "size"),
+        (
+            "graphql_document_cache_max_entries",
+            "gauge",
+            "Document cache capacity",
+            "max_entries",
+        ),
+    ]
+    lines = []
+    for metric, kind, help_text, key in samples:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {stats[key]}")
+    lines.extend(tracer.metrics.render())
+    return HttpResponse(
+        "\n".join(lines) + "\n", content_type="text/plain; version=0.0.4"
+    )
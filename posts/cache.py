@@ -0,0 +1,148 @@
+"""
+In-process cache for the category and tag catalogs.
+
+Entries live in a per-process LRU with a TTL and are keyed by a catalog
+version stored in Django's cache framework. Saving or deleting a Tag or
+Category bumps the version, so every worker sharing that cache backend
+stops serving the old entries on its next version check. A backend that is
+not shared between processes is refused.
+
+The version is bumped once the writing transaction commits. Until then the
+writing thread reads around the cache, so it sees its own changes without
+caching rows that may still be rolled back.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from postify.caches import shared_cache
+
+VERSION_KEY = "posts:catalog:version"
+DEFAULTS = {
+    "CACHE_ALIAS": "shared",
+    "TIMEOUT": 300,
+    "MAX_ENTRIES": 64,
+    "VERSION_CHECK_INTERVAL": 1,
+}
+
+
+class CatalogCache:
+    def __init__(self, cache_alias, timeout, max_entries, version_check_interval):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        self._local = threading.local()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def version(self):
+        now = time.monotonic()
+        if (
+            self._version is None
+            or now - self._version_checked_at >= self.version_check_interval
+        ):
+            version = self.shared.get(VERSION_KEY)
+            if version is None:
+                self.shared.add(VERSION_KEY, time.time_ns())
+                version = self.shared.get(VERSION_KEY)
+            self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def hold(self, connection):
+        """Read around the cache in this thread until ``connection`` commits."""
+        self._local.hold = (connection, connection.atomic_blocks[0])
+
+    def held(self):
+        hold = getattr(self._local, "hold", None)
+        if hold is None:
+            return False
+        connection, block = hold
+        if any(open_block is block for open_block in connection.atomic_blocks):
+            return True
+        self._local.hold = None
+        return False
+
+    def get(self, name, load):
+        if self.held():
+            return load()
+        key = (name, self.version())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (now + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        try:
+            self._version = self.shared.incr(VERSION_KEY)
+        except ValueError:
+            self.shared.set(VERSION_KEY, time.time_ns())
+            self._version = None
+        self._version_checked_at = time.monotonic()
+        self._local.hold = None
+        with self._lock:
+            self._entries.clear()
+
+
+def _build_catalog_cache():
+    options = {**DEFAULTS, **getattr(settings, "CATALOG_CACHE", {})}
+    shared_cache(options["CACHE_ALIAS"], "CATALOG_CACHE['CACHE_ALIAS']")
+    return CatalogCache(
+        cache_alias=options["CACHE_ALIAS"],
+        timeout=options["TIMEOUT"],
+        max_entries=options["MAX_ENTRIES"],
+        version_check_interval=options["VERSION_CHECK_INTERVAL"],
+    )
+
+
+catalog_cache = _build_catalog_cache()
+
+
+def invalidate_catalog(using=None):
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block:
+        catalog_cache.hold(connection)
+    transaction.on_commit(catalog_cache.invalidate, using=using)
+
+
+def get_categories():
+    from posts.models import Category
+
+    return catalog_cache.get("categories", lambda: list(Category.objects.all()))
+
+
+def get_tags():
+    from posts.models import Tag
+
+    return catalog_cache.get("tags", lambda: list(Tag.objects.all()))
+
+
+def get_categories_by_id():
+    return catalog_cache.get(
+        "categories_by_id",
+        lambda: {category.id: category for category in get_categories()},
+    )
+
+
+def get_tags_by_id():
+    return catalog_cache.get("tags_by_id", lambda: {tag.id: tag for tag in get_tags()})
@@ -0,0 +1,66 @@
+"""
+Single-statement boolean flag toggles on Post.
+
+``toggle_posts_flag`` flips a flag on a set of posts with
+``UPDATE ... SET flag = NOT flag`` and returns the new values, using
+RETURNING where the backend supports it, so toggles never load the posts'
+content or go through ``Post.save``. Publishing sends ``post_published``.
+"""
+
+from django.db import connections, router, transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.utils import timezone
+from posts.models import Post
+from posts.signals import post_published
+from postify.sql import supports_returning as supports_update_returning
+
+TOGGLEABLE_FLAGS = ("published", "comments_enabled", "is_featured", "is_archived")
+
+
+def toggle_posts_flag(post_ids, flag, using=None):
+    if flag not in TOGGLEABLE_FLAGS:
+        raise ValueError(f"'{flag}' is not a toggleable post flag")
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    values = _flip_posts_flag(post_ids, flag, using or router.db_for_write(Post))
+    if flag == "published":
+        published = [post_id for post_id, value in values.items() if value]
+        if published:
+            post_published.send(sender=Post, post_ids=published)
+    return values
+
+
+def _flip_posts_flag(post_ids, flag, using):
+    connection = connections[using]
+    now = timezone.now()
+
+    if supports_update_returning(connection):
+        quote = connection.ops.quote_name
+        column = quote(Post._meta.get_field(flag).column)
+        sql = (
+            f"UPDATE {quote(Post._meta.db_table)} "
+            f"SET {column} = NOT {column}, {quote('updated_at')} = %s "
+            f"WHERE {quote('id')} IN ({', '.join(['%s'] * len(post_ids))}) "
+            f"RETURNING {quote('id')}, {column}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, [connection.ops.adapt_datetimefield_value(now), *post_ids]
+            )
+            return {post_id: bool(value) for post_id, value in cursor.fetchall()}
+
+    posts = Post.objects.using(using).filter(id__in=post_ids)
+    with transaction.atomic(using=using):
+        flipped = Case(
+            When(**{flag: True}, then=Value(False)),
+            default=Value(True),
+            output_field=BooleanField(),
+        )
+        if not posts.update(**{flag: flipped, "updated_at": now}):
+            return {}
+        return dict(posts.values_list("id", flag))
+
+
+def toggle_post_flag(post_id, flag, using=None):
+    return toggle_posts_flag([post_id], flag, using=using).get(int(post_id))
@@ -0,0 +1,57 @@
+from collections import defaultdict
+from postify.dataloaders import register_loader
+from posts.cache import get_categories_by_id, get_tags_by_id
+from posts.models import Post, Tag, Category
+import comments.loaders
+import likes.loaders
+import profiles.loaders
+
+
+@register_loader("posts")
+def load_posts(loaders, keys):
+    loaders.viewer_liked_posts.queue(keys)
+    return Post.objects.in_bulk(keys)
+
+
+def catalog_lookup(catalog, model, keys):
+    found = {key: catalog[key] for key in keys if key in catalog}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        found.update(model.objects.in_bulk(missing))
+    return found
+
+
+@register_loader("tags")
+def load_tags(loaders, keys):
+    return catalog_lookup(get_tags_by_id(), Tag, keys)
+
+
+@register_loader("categories")
+def load_categories(loaders, keys):
+    return catalog_lookup(get_categories_by_id(), Category, keys)
+
+
+@register_loader("tags_by_post", many=True)
+def load_tags_by_post(loaders, keys):
+    rows = list(
+        Post.tags.through.objects.filter(post_id__in=keys)
+        .order_by("id")
+        .values_list("post_id", "tag_id")
+    )
+    loaders.tags.queue(tag_id for post_id, tag_id in rows)
+    tags_by_post = defaultdict(list)
+    for post_id, tag_id in rows:
+        tags_by_post[post_id].append(loaders.tags.load(tag_id))
+    return tags_by_post
+
+
+def queue_posts(loaders, posts):
+    for post in posts:
+        loaders.posts.prime(post.id, post)
+    post_ids = [post.id for post in posts]
+    loaders.users.queue(post.author_id for post in posts)
+    loaders.categories.queue(post.category_id for post in posts)
+    loaders.tags_by_post.queue(post_ids)
+    loaders.comment_pages.queue(post_ids)
+    loaders.viewer_liked_posts.queue(post_ids)
+    return posts
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0003_alter_category_options_alter_post_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["created_at", "id"], name="posts_post_created_id_idx"
+            ),
+        ),
+    ]
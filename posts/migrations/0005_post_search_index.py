@@ -0,0 +1,91 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:29
+
+from collections import Counter
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def fts5_supported(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(apps, schema_editor):
+    if fts5_supported(schema_editor):
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts "
+            "USING fts5(title, content, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO posts_post_fts (rowid, title, content) "
+            "SELECT id, title, content FROM posts_post"
+        )
+        return
+
+    Post = apps.get_model("posts", "Post")
+    PostSearchTerm = apps.get_model("posts", "PostSearchTerm")
+    for post in Post.objects.iterator():
+        weights = Counter()
+        for term in re.findall(r"\w+", post.title.lower()):
+            weights[term[:64]] += 10
+        for term in re.findall(r"\w+", post.content.lower()):
+            weights[term[:64]] += 1
+        PostSearchTerm.objects.bulk_create(
+            [
+                PostSearchTerm(post=post, term=term, weight=weight)
+                for term, weight in weights.items()
+            ]
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS posts_post_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0004_post_created_at_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(db_index=True, max_length=64)),
+                ("weight", models.PositiveIntegerField(default=1)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="posts.post",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Post Search Term",
+                "verbose_name_plural": "Post Search Terms",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="postsearchterm",
+            constraint=models.UniqueConstraint(
+                fields=("post", "term"), name="posts_searchterm_post_term_uniq"
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
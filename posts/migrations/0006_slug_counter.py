@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0005_post_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlugCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("base", models.SlugField(unique=True)),
+                ("value", models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                "verbose_name": "Slug Counter",
+                "verbose_name_plural": "Slug Counters",
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0006_slug_counter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0007_post_like_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "created_at", "id"],
+                name="posts_post_author_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2.1 on 2026-10-18 03:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_created_at(apps, schema_editor):
+    PostTag = apps.get_model("posts", "PostTag")
+    Post = apps.get_model("posts", "Post")
+    PostTag.objects.using(schema_editor.connection.alias).update(
+        created_at=Subquery(
+            Post.objects.filter(id=OuterRef("post_id")).values("created_at")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0008_post_author_created_index"),
+    ]
+
+    operations = [
+        # Post.tags keeps its table, the through model only takes it over.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="PostTag",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "post",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="tag_links",
+                                to="posts.post",
+                            ),
+                        ),
+                        (
+                            "tag",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="post_links",
+                                to="posts.tag",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "verbose_name": "Post Tag",
+                        "verbose_name_plural": "Post Tags",
+                        "db_table": "posts_post_tags",
+                        "unique_together": {("post", "tag")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="post",
+                    name="tags",
+                    field=models.ManyToManyField(
+                        through="posts.PostTag", to="posts.tag"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="posttag",
+            name="created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="posttag",
+            index=models.Index(
+                fields=["tag", "created_at", "post"],
+                name="posts_posttag_tag_created_idx",
+            ),
+        ),
+    ]
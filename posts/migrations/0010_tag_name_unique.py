@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 06:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Move the links of each duplicated tag name onto its oldest tag."""
+    using = schema_editor.connection.alias
+    Tag = apps.get_model("posts", "Tag")
+    links = [
+        (apps.get_model("posts", "PostTag"), "post_id"),
+        (apps.get_model("followers", "UserTag"), "follower_id"),
+    ]
+    duplicates = (
+        Tag.objects.using(using)
+        .order_by()
+        .values("name")
+        .annotate(keep=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        keep = duplicate["keep"]
+        extra = list(
+            Tag.objects.using(using)
+            .filter(name=duplicate["name"])
+            .exclude(id=keep)
+            .values_list("id", flat=True)
+        )
+        for model, owner in links:
+            for tag_id in extra:
+                owners = model.objects.using(using).filter(tag_id=keep).values(owner)
+                model.objects.using(using).filter(
+                    tag_id=tag_id, **{f"{owner}__in": owners}
+                ).delete()
+                model.objects.using(using).filter(tag_id=tag_id).update(tag_id=keep)
+        Tag.objects.using(using).filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0009_post_tag_created_at"),
+        ("followers", "0003_timeline"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="tag",
+            name="name",
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
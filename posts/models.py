@@ -1,6 +1,10 @@
-from django.db import models
+from functools import partial
+from django.db import models, router
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from posts.slugs import save_with_slug
+
+# Written by likes.counters, never by a full save.
+MAINTAINED_FIELDS = ("like_count",)
 
 
 class Post(models.Model):
@@ -8,34 +12,103 @@ class Post(models.Model):
     title = models.CharField(max_length=255)
     slug = models.SlugField(unique=True)
     content = models.TextField()
-    tags = models.ManyToManyField("Tag")
+    tags = models.ManyToManyField("Tag", through="PostTag")
     published = models.BooleanField(default=False)
     category = models.ForeignKey("Category", on_delete=models.SET_NULL, null=True)
     comments_enabled = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     is_archived = models.BooleanField(default=False)
+    # Maintained by likes.counters, repaired by "manage.py reconcile_like_counts".
+    like_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MAINTAINED_FIELDS
+            ]
+        if self.slug:
+            return super().save(*args, **kwargs)
 
-        if Post.objects.filter(slug=self.slug).exists():
-            count = Post.objects.filter(title__startswith=self.title).count()
-            self.slug = f"{slugify(self.title)}-{count}"
-        super().save(*args, **kwargs)
+        using = kwargs.get("using") or router.db_for_write(Post, instance=self)
+        save = partial(super().save, *args, **kwargs)
+        return save_with_slug(self, save, using=using)
 
     class Meta:
         verbose_name = "Post"
         verbose_name_plural = "Posts"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="posts_post_created_id_idx"),
+            models.Index(
+                fields=["author", "created_at", "id"],
+                name="posts_post_author_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class PostTag(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="tag_links")
+    tag = models.ForeignKey("Tag", on_delete=models.CASCADE, related_name="post_links")
+    # The post's created_at, so a tag's latest posts are one index range.
+    # Filled in by posts.signals for links made through Post.tags.
+    created_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = "posts_post_tags"
+        verbose_name = "Post Tag"
+        verbose_name_plural = "Post Tags"
+        unique_together = [("post", "tag")]
+        indexes = [
+            models.Index(
+                fields=["tag", "created_at", "post"],
+                name="posts_posttag_tag_created_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}:{self.tag_id}"
+
+
+class SlugCounter(models.Model):
+    base = models.SlugField(unique=True)
+    value = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Slug Counter"
+        verbose_name_plural = "Slug Counters"
+
+    def __str__(self):
+        return f"{self.base}-{self.value}"
+
+
+class PostSearchTerm(models.Model):
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="search_terms"
+    )
+    term = models.CharField(max_length=64, db_index=True)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Post Search Term"
+        verbose_name_plural = "Post Search Terms"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "term"], name="posts_searchterm_post_term_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
 class Tag(models.Model):
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, unique=True)
 
     class Meta:
         verbose_name = "Tag"
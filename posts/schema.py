@@ -1,11 +1,25 @@
 import graphene
+from asgiref.sync import sync_to_async
 from graphene_django import DjangoObjectType
 from graphql.error import GraphQLError
-from posts.models import Post, Tag, Category
+from posts.models import Post, PostTag, Tag, Category
 from django.contrib.auth.models import User
-from django.db.models import Q
-from comments.schema import CommentType
+from django.db import transaction
+from comments.loaders import page_key
+from comments.schema import comment_connection_field
 from profiles.schema import UserType
+from likes.buffer import like_buffer
+from postify.aio import is_async
+from postify.dataloaders import get_loaders
+from postify.pagination import apaginate, paginate
+from posts.cache import get_categories, get_tags
+from posts.flags import toggle_post_flag, toggle_posts_flag
+from posts.loaders import queue_posts
+from posts.search import batched_unindex, index_posts, search_posts
+from posts.signals import post_published
+from posts.slugs import allocate_slugs
+from posts.tagging import PostNotFound, TagNotFound, set_post_tags
+from functools import partial
 
 
 class TagType(DjangoObjectType):
@@ -23,9 +37,10 @@ class CategoryType(DjangoObjectType):
 class PostType(DjangoObjectType):
     author_id = graphene.Int()
     author = graphene.Field(UserType)
-    comments = graphene.List(CommentType)
+    comments = comment_connection_field()
     tags = graphene.List(TagType)
-    category = graphene.Field(TagType)
+    category = graphene.Field(CategoryType)
+    viewer_has_liked = graphene.Boolean()
 
     class Meta:
         model = Post
@@ -39,6 +54,7 @@ class PostType(DjangoObjectType):
             "comments_enabled",
             "is_archived",
             "is_featured",
+            "like_count",
             "created_at",
             "updated_at",
             "slug",
@@ -51,18 +67,38 @@ class PostType(DjangoObjectType):
         return self.author_id
 
     def resolve_author(self, info):
-        if self.author_id:
-            return User.objects.get(id=self.author_id)
-        return None
+        return get_loaders(info).users.load(self.author_id)
 
-    def resolve_comments(self, info):
-        return self.comments.all()
+    def resolve_comments(self, info, order=None, **kwargs):
+        order = getattr(order, "value", order) or "oldest"
+        return get_loaders(info).comment_pages.load(page_key(self.id, order, **kwargs))
 
     def resolve_tags(self, info):
-        return self.tags.all()
+        return get_loaders(info).tags_by_post.load(self.id)
 
     def resolve_category(self, info):
-        return self.category
+        return get_loaders(info).categories.load(self.category_id)
+
+    def resolve_like_count(self, info):
+        viewer = info.context.user
+        if not like_buffer.enabled or not viewer.is_authenticated:
+            return self.like_count
+        return like_buffer.like_count(
+            self, viewer, partial(get_loaders(info).viewer_liked_posts.load, self.id)
+        )
+
+    def resolve_viewer_has_liked(self, info):
+        viewer = info.context.user
+        if like_buffer.enabled and viewer.is_authenticated:
+            intent = like_buffer.intent(viewer.id, self.id)
+            if intent is not None:
+                return intent
+        return get_loaders(info).viewer_liked_posts.load(self.id)
+
+
+class PostConnection(graphene.relay.Connection):
+    class Meta:
+        node = PostType
 
 
 class PostCreateUpdateInput(graphene.InputObjectType):
@@ -71,11 +107,13 @@ class PostCreateUpdateInput(graphene.InputObjectType):
     author = graphene.ObjectType()
     author_id = graphene.ID()
     author_username = graphene.String()
+    tag_ids = graphene.List(graphene.NonNull(graphene.ID))
+    category_id = graphene.ID()
 
 
 class Query(graphene.ObjectType):
-    posts = graphene.List(
-        PostType,
+    posts = graphene.relay.ConnectionField(
+        PostConnection,
         published=graphene.Boolean(),
         author_username=graphene.String(),
         search=graphene.String(),
@@ -84,34 +122,74 @@ class Query(graphene.ObjectType):
     tags = graphene.List(TagType)
     post = graphene.Field(PostType, id=graphene.ID(required=True))
 
-    def resolve_posts(self, info, published=None, author_username=None, search=None):
-        queryset = Post.objects.all()
-
-        if published is not None:
-            queryset = queryset.filter(published=published)
-
-        if author_username:
-            queryset = queryset.filter(author__username=author_username)
-
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | Q(content__icontains=search)
+    def resolve_posts(
+        self, info, published=None, author_username=None, search=None, **kwargs
+    ):
+        on_page = partial(queue_posts, get_loaders(info))
+        if is_async(info):
+            return resolve_posts_async(
+                published, author_username, search, on_page, **kwargs
             )
 
-        return queryset
+        queryset, ordering = filter_posts(published, author_username, search)
+        return paginate(
+            queryset, PostConnection, ordering=ordering, on_page=on_page, **kwargs
+        )
 
     def resolve_post(self, info, id):
+        if is_async(info):
+            return resolve_post_async(get_loaders(info), id)
         try:
             post = Post.objects.get(id=id)
+            queue_posts(get_loaders(info), [post])
             return post
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
 
     def resolve_categories(self, info):
-        return Category.objects.all()
+        if is_async(info):
+            return sync_to_async(get_categories)()
+        return get_categories()
 
     def resolve_tags(self, info):
-        return Tag.objects.all()
+        if is_async(info):
+            return sync_to_async(get_tags)()
+        return get_tags()
+
+
+def filter_posts(published=None, author_username=None, search=None):
+    queryset = Post.objects.all()
+
+    if published is not None:
+        queryset = queryset.filter(published=published)
+
+    if author_username:
+        queryset = queryset.filter(author__username=author_username)
+
+    ordering = ("-created_at", "-id")
+    if search:
+        queryset = search_posts(queryset, search)
+        ordering = ("search_rank", "-id")
+    return queryset, ordering
+
+
+async def resolve_posts_async(published, author_username, search, on_page, **kwargs):
+    # search_posts introspects the database once to pick its backend.
+    queryset, ordering = await sync_to_async(filter_posts)(
+        published, author_username, search
+    )
+    return await apaginate(
+        queryset, PostConnection, ordering=ordering, on_page=on_page, **kwargs
+    )
+
+
+async def resolve_post_async(loaders, id):
+    try:
+        post = await Post.objects.aget(id=id)
+    except Post.DoesNotExist:
+        raise GraphQLError("Post not found")
+    queue_posts(loaders, [post])
+    return post
 
 
 class PostCreateMutation(graphene.Mutation):
@@ -143,9 +221,23 @@ class PostCreateMutation(graphene.Mutation):
             except User.DoesNotExist:
                 raise GraphQLError("Author not found.")
 
-        post = Post.objects.create(
-            title=title, author=author, content=content, published=True
-        )
+        category_id = input.get("category_id")
+        if category_id and not known_ids(Category, {str(category_id)}):
+            raise GraphQLError("Category not found.")
+
+        try:
+            with transaction.atomic():
+                post = Post.objects.create(
+                    title=title,
+                    author=author,
+                    content=content,
+                    category_id=category_id and int(category_id),
+                    published=True,
+                )
+                if input.get("tag_ids"):
+                    set_post_tags(post.id, tag_ids=input.tag_ids)
+        except TagNotFound:
+            raise GraphQLError("Tag not found")
         return PostCreateMutation(post=post)
 
 
@@ -165,12 +257,22 @@ class PostUpdateMutation(graphene.Mutation):
             post = Post.objects.get(id=id)
             post.title = input.get("title", post.title)
             post.content = input.get("content", post.content)
-            post.tags.set(input.get("tag_ids", list(post.tags.all())))
-            post.category_id = input.get("category_id", post.category_id)
-            post.save()
+            category_id = input.get("category_id", post.category_id)
+            if category_id and not known_ids(Category, {str(category_id)}):
+                raise GraphQLError("Category not found.")
+            post.category_id = category_id and int(category_id)
+            with transaction.atomic():
+                # like_count is maintained concurrently, write the edits only.
+                post.save(
+                    update_fields=["title", "content", "category", "slug", "updated_at"]
+                )
+                if input.get("tag_ids") is not None:
+                    set_post_tags(post.id, tag_ids=input.tag_ids)
             return PostUpdateMutation(post=post)
         except Post.DoesNotExist:
             raise GraphQLError("Post not found.")
+        except TagNotFound:
+            raise GraphQLError("Tag not found")
 
 
 class PostDeleteMutation(graphene.Mutation):
@@ -191,80 +293,215 @@ class PostDeleteMutation(graphene.Mutation):
             raise GraphQLError("Post not found.")
 
 
-class PostToggleArchiveMutation(graphene.Mutation):
+class PostToggleMutation(graphene.Mutation):
     success = graphene.Boolean()
+    value = graphene.Boolean()
+
+    class Meta:
+        abstract = True
 
     class Arguments:
         id = graphene.ID(required=True)
 
-    def mutate(self, info, id):
+    flag = None
+
+    @classmethod
+    def mutate(cls, root, info, id):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("User is not authenticated")
+        value = toggle_post_flag(id, cls.flag)
+        if value is None:
+            raise GraphQLError("Post not found.")
+        return cls(success=True, value=value)
+
+
+class PostToggleArchiveMutation(PostToggleMutation):
+    flag = "is_archived"
+
+
+class PostToggleFeatureMutation(PostToggleMutation):
+    flag = "is_featured"
+
+
+class PostTogglePublishMutation(PostToggleMutation):
+    flag = "published"
+
+
+class ToggleCommentsEnabledMutation(PostToggleMutation):
+    flag = "comments_enabled"
+
+
+class PostFlag(graphene.Enum):
+    PUBLISHED = "published"
+    COMMENTS_ENABLED = "comments_enabled"
+    IS_FEATURED = "is_featured"
+    IS_ARCHIVED = "is_archived"
+
+
+class BulkItemError(graphene.ObjectType):
+    index = graphene.Int()
+    id = graphene.ID()
+    message = graphene.String()
+
+
+def parse_bulk_ids(ids):
+    """Split ``ids`` into ``(index, id, pk)`` items and errors for bad ids."""
+    items = []
+    errors = []
+    for index, post_id in enumerate(ids):
         try:
-            user = info.context.user
-            if not user.is_authenticated:
-                raise GraphQLError("User is not authenticated")
-            post = Post.objects.get(id=id)
-            post.is_archived = not post.is_archived
-            post.save()
-            return PostToggleArchiveMutation(success=True)
-        except Post.DoesNotExist:
-            return GraphQLError("Post not found.")
+            items.append((index, post_id, int(post_id)))
+        except ValueError:
+            errors.append(BulkItemError(index=index, id=post_id, message="Invalid ID."))
+    return items, errors
 
 
-class PostToggleFeatureMutation(graphene.Mutation):
-    success = graphene.Boolean()
+def known_ids(model, ids):
+    """The ``ids`` of existing ``model`` rows, as strings."""
+    ids = [int(pk) for pk in ids if pk.isdigit()]
+    if not ids:
+        return set()
+    return {
+        str(pk) for pk in model.objects.filter(id__in=ids).values_list("id", flat=True)
+    }
+
+
+def missing_post_errors(items, found):
+    return [
+        BulkItemError(index=index, id=post_id, message="Post not found.")
+        for index, post_id, pk in items
+        if pk not in found
+    ]
+
+
+class BulkPostCreateMutation(graphene.Mutation):
+    posts = graphene.List(PostType)
+    errors = graphene.List(BulkItemError)
 
     class Arguments:
-        id = graphene.ID(required=True)
+        input = graphene.List(graphene.NonNull(PostCreateUpdateInput), required=True)
 
-    def mutate(self, info, id):
-        try:
-            user = info.context.user
-            if not user.is_authenticated:
-                raise GraphQLError("User is not authenticated")
-            post = Post.objects.get(id=id)
-            post.is_featured = not post.is_featured
-            post.save()
-            return PostToggleFeatureMutation(success=True)
-        except Post.DoesNotExist:
-            return GraphQLError("Post not found.")
+    def mutate(self, info, input):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("User is not authorized")
 
+        author_ids = {str(item.author_id) for item in input if item.author_id}
+        usernames = {
+            item.author_username
+            for item in input
+            if not item.author_id and item.author_username
+        }
+        known_authors = known_ids(User, author_ids)
+        authors_by_username = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "id")
+        )
+        tag_ids = {str(tag_id) for item in input for tag_id in item.tag_ids or ()}
+        category_ids = {str(item.category_id) for item in input if item.category_id}
+        known_tags = known_ids(Tag, tag_ids)
+        known_categories = known_ids(Category, category_ids)
+
+        errors = []
+        items = []
+        for index, item in enumerate(input):
+            if item.author_id:
+                author_id = str(item.author_id)
+                author_id = int(author_id) if author_id in known_authors else None
+            elif item.author_username:
+                author_id = authors_by_username.get(item.author_username)
+            else:
+                author_id = user.id
+            if author_id is None:
+                errors.append(BulkItemError(index=index, message="Author not found."))
+                continue
+            item_tags = {str(tag_id) for tag_id in item.tag_ids or ()}
+            if item_tags - known_tags:
+                errors.append(BulkItemError(index=index, message="Tag not found."))
+                continue
+            if item.category_id and str(item.category_id) not in known_categories:
+                errors.append(BulkItemError(index=index, message="Category not found."))
+                continue
+            items.append((item, author_id))
+
+        with transaction.atomic():
+            slugs = allocate_slugs([item.title for item, author_id in items])
+            posts = Post.objects.bulk_create(
+                [
+                    Post(
+                        title=item.title,
+                        content=item.content,
+                        author_id=author_id,
+                        category_id=item.category_id and int(item.category_id),
+                        slug=slug,
+                        published=True,
+                    )
+                    for (item, author_id), slug in zip(items, slugs)
+                ],
+                batch_size=500,
+            )
+            PostTag.objects.bulk_create(
+                [
+                    PostTag(
+                        post_id=post.id, tag_id=int(tag_id), created_at=post.created_at
+                    )
+                    for post, (item, author_id) in zip(posts, items)
+                    for tag_id in {str(tag_id) for tag_id in item.tag_ids or ()}
+                ],
+                batch_size=500,
+            )
+            index_posts(posts, replace=False)
+            post_published.send(sender=Post, post_ids=[post.id for post in posts])
+        queue_posts(get_loaders(info), posts)
+        return BulkPostCreateMutation(posts=posts, errors=errors)
 
-class PostTogglePublishMutation(graphene.Mutation):
-    success = graphene.Boolean()
+
+class BulkPostToggleMutation(graphene.Mutation):
+    posts = graphene.List(PostType)
+    errors = graphene.List(BulkItemError)
 
     class Arguments:
-        id = graphene.ID(required=True)
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+        flag = PostFlag(required=True)
 
-    def mutate(self, info, id):
-        try:
-            user = info.context.user
-            if not user.is_authenticated:
-                raise GraphQLError("User is not authenticated")
-            post = Post.objects.get(id=id)
-            post.published = not post.published
-            post.save()
-            return PostTogglePublishMutation(success=True)
-        except Post.DoesNotExist:
-            return GraphQLError("Post not found.")
+    def mutate(self, info, ids, flag):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("User is not authenticated")
+
+        flag = getattr(flag, "value", flag)
+        items, errors = parse_bulk_ids(ids)
+        with transaction.atomic():
+            values = toggle_posts_flag([pk for _, _, pk in items], flag)
+            posts = list(Post.objects.filter(id__in=values))
+        errors = sorted(
+            errors + missing_post_errors(items, values), key=lambda e: e.index
+        )
+        queue_posts(get_loaders(info), posts)
+        return BulkPostToggleMutation(posts=posts, errors=errors)
 
 
-class ToggleCommentsEnabledMutation(graphene.Mutation):
-    success = graphene.Boolean()
+class BulkPostDeleteMutation(graphene.Mutation):
+    deleted_ids = graphene.List(graphene.ID)
+    errors = graphene.List(BulkItemError)
 
     class Arguments:
-        id = graphene.ID(required=True)
+        ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
 
-    def mutate(self, info, id):
-        try:
-            user = info.context.user
-            if not user.is_authenticated:
-                raise GraphQLError("User is not authenticated")
-            post = Post.objects.get(id=id)
-            post.comments_enabled = not post.comments_enabled
-            post.save()
-            return ToggleCommentsEnabledMutation(success=True)
-        except Post.DoesNotExist:
-            return GraphQLError("Post not found.")
+    def mutate(self, info, ids):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("User is not authorized")
+
+        items, errors = parse_bulk_ids(ids)
+        with transaction.atomic(), batched_unindex():
+            posts = Post.objects.filter(id__in=[pk for _, _, pk in items])
+            deleted_ids = set(posts.values_list("id", flat=True))
+            posts.delete()
+        errors = sorted(
+            errors + missing_post_errors(items, deleted_ids), key=lambda e: e.index
+        )
+        return BulkPostDeleteMutation(deleted_ids=sorted(deleted_ids), errors=errors)
 
 
 class AddPostTagMutation(graphene.Mutation):
@@ -290,27 +527,51 @@ class AddPostTagMutation(graphene.Mutation):
 
 
 class DeletePostTagMutation(graphene.Mutation):
-    tag = graphene.Field(TagType)
+    success = graphene.Boolean()
 
     class Arguments:
         post_id = graphene.ID(required=True)
         tag_id = graphene.ID(required=True)
 
     def mutate(self, info, post_id, tag_id):
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("User is not authenticated")
+        deleted, _ = PostTag.objects.filter(post_id=post_id, tag_id=tag_id).delete()
+        if not deleted:
+            raise GraphQLError("Tag does not exist in post")
+        return DeletePostTagMutation(success=True)
+
+
+class SetPostTagsMutation(graphene.Mutation):
+    post = graphene.Field(PostType)
+    tags = graphene.List(TagType)
+
+    class Arguments:
+        post_id = graphene.ID(required=True)
+        tag_ids = graphene.List(graphene.NonNull(graphene.ID))
+        tag_names = graphene.List(graphene.NonNull(graphene.String))
+
+    def mutate(self, info, post_id, tag_ids=(), tag_names=()):
         user = info.context.user
         if not user.is_authenticated:
             raise GraphQLError("User is not authenticated")
         try:
-            post = Post.objects.get(id=post_id)
-            tag = Tag.objects.get(id=tag_id)
-            if tag_id not in post.tags.all():
-                raise GraphQLError("Tag does not exist in post")
-            post.tags.remove(tag)
-            return DeletePostTagMutation(success=True)
-        except Post.DoesNotExist:
+            set_post_tags(post_id, tag_ids=tag_ids or (), tag_names=tag_names or ())
+        except PostNotFound:
             raise GraphQLError("Post not found")
-        except Tag.DoesNotExist:
+        except TagNotFound:
             raise GraphQLError("Tag not found")
+        get_loaders(info).tags_by_post.clear(int(post_id))
+        payload = SetPostTagsMutation()
+        payload.post_id = int(post_id)
+        return payload
+
+    def resolve_post(self, info):
+        return get_loaders(info).posts.load(self.post_id)
+
+    def resolve_tags(self, info):
+        return get_loaders(info).tags_by_post.load(self.post_id)
 
 
 class AddPostCategoryMutation(graphene.Mutation):
@@ -328,7 +589,7 @@ class AddPostCategoryMutation(graphene.Mutation):
             post = Post.objects.get(id=post_id)
             category = Category.objects.get(id=category_id)
             post.category = category
-            post.save()
+            post.save(update_fields=["category", "updated_at"])
             return AddPostCategoryMutation(category=category)
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
@@ -345,9 +606,13 @@ class Mutation(graphene.ObjectType):
     post_toggle_publish = PostTogglePublishMutation.Field()
     add_post_tag = AddPostTagMutation.Field()
     delete_post_tag = DeletePostTagMutation.Field()
+    set_post_tags = SetPostTagsMutation.Field()
     add_post_category = AddPostCategoryMutation.Field()
     update_post_category = AddPostCategoryMutation.Field()
     toggle_comments_enabled = ToggleCommentsEnabledMutation.Field()
+    bulk_create_posts = BulkPostCreateMutation.Field()
+    bulk_toggle_posts = BulkPostToggleMutation.Field()
+    bulk_delete_posts = BulkPostDeleteMutation.Field()
 
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
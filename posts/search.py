@@ -0,0 +1,151 @@
+"""
+Full-text search over post titles and contents.
+
+On SQLite builds with FTS5 the ``posts_post_fts`` virtual table is the
+index and results are ranked with bm25. Other databases fall back to the
+``PostSearchTerm`` table of tokenized terms, ranked by summed term weight.
+Both backends annotate matching posts with ``search_rank`` (lower is more
+relevant) and treat every query token as a prefix.
+"""
+
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import reduce
+from operator import or_
+from django.db import connections, router
+from django.db.models import FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.expressions import RawSQL
+from posts.models import Post, PostSearchTerm
+
+FTS_TABLE = "posts_post_fts"
+TITLE_WEIGHT = 10
+CONTENT_WEIGHT = 1
+
+_fts5_enabled = {}
+_batch = threading.local()
+
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def uses_fts5(using):
+    if using not in _fts5_enabled:
+        connection = connections[using]
+        _fts5_enabled[using] = (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts5_enabled[using]
+
+
+def search_terms(post):
+    weights = Counter()
+    for term in tokenize(post.title):
+        weights[term[:64]] += TITLE_WEIGHT
+    for term in tokenize(post.content):
+        weights[term[:64]] += CONTENT_WEIGHT
+    return [
+        PostSearchTerm(post_id=post.id, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_posts(posts, replace=True):
+    posts = list(posts)
+    if not posts:
+        return
+    using = router.db_for_write(Post)
+    post_ids = [post.id for post in posts]
+    if uses_fts5(using):
+        with connections[using].cursor() as cursor:
+            if replace:
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+                    f"({', '.join(['%s'] * len(post_ids))})",
+                    post_ids,
+                )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                [(post.id, post.title, post.content) for post in posts],
+            )
+    else:
+        if replace:
+            PostSearchTerm.objects.using(using).filter(post_id__in=post_ids).delete()
+        PostSearchTerm.objects.using(using).bulk_create(
+            [term for post in posts for term in search_terms(post)],
+            batch_size=500,
+        )
+
+
+def index_post(post):
+    index_posts([post])
+
+
+@contextmanager
+def batched_unindex():
+    """Collect unindexed post ids and delete them in one statement on exit."""
+    _batch.post_ids = []
+    try:
+        yield
+        post_ids = _batch.post_ids
+    finally:
+        del _batch.post_ids
+    unindex_posts(post_ids)
+
+
+def unindex_posts(post_ids):
+    post_ids = list(post_ids)
+    if getattr(_batch, "post_ids", None) is not None:
+        _batch.post_ids.extend(post_ids)
+        return
+    using = router.db_for_write(Post)
+    if not post_ids or not uses_fts5(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+            f"({', '.join(['%s'] * len(post_ids))})",
+            post_ids,
+        )
+
+
+def search_posts(queryset, text):
+    tokens = tokenize(text)
+    if not tokens:
+        return queryset.none()
+
+    if uses_fts5(queryset.db):
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f"{FTS_TABLE}.rowid = {Post._meta.db_table}.id",
+                f"{FTS_TABLE} MATCH %s",
+            ],
+            params=[match],
+        ).annotate(
+            search_rank=RawSQL(
+                f"bm25({FTS_TABLE}, {TITLE_WEIGHT:.1f}, {CONTENT_WEIGHT:.1f})",
+                [],
+                output_field=FloatField(),
+            )
+        )
+
+    for token in tokens:
+        queryset = queryset.filter(
+            id__in=PostSearchTerm.objects.filter(term__startswith=token).values(
+                "post_id"
+            )
+        )
+    score = (
+        PostSearchTerm.objects.filter(post=OuterRef("pk"))
+        .filter(reduce(or_, [Q(term__startswith=token) for token in tokens]))
+        .values("post")
+        .annotate(score=Sum("weight"))
+        .values("score")
+    )
+    return queryset.annotate(search_rank=-Coalesce(Subquery(score), 0))
@@ -0,0 +1,61 @@
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from posts import search
+from posts.cache import invalidate_catalog
+from posts.models import Category, Post, PostTag, Tag
+
+# Sent with ``post_ids`` whenever posts are created published or toggled to
+# published, including by bulk writes that bypass ``post_save``.
+post_published = Signal()
+
+# Sent with ``post_ids`` whenever tags are added to existing posts, through
+# ``Post.tags`` or ``posts.tagging.set_post_tags``.
+post_tagged = Signal()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "content"} & set(update_fields):
+        search.index_posts([instance], replace=not created)
+
+
+@receiver(post_save, sender=Post)
+def announce_published_post(sender, instance, created=False, **kwargs):
+    if created and instance.published:
+        post_published.send(sender=Post, post_ids=[instance.id])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_posts([instance.id])
+
+
+@receiver(m2m_changed, sender=PostTag)
+def date_tag_links(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action != "post_add" or not pk_set:
+        return
+    if reverse:
+        links = PostTag.objects.filter(tag_id=instance.pk, post_id__in=pk_set)
+    else:
+        links = PostTag.objects.filter(post_id=instance.pk, tag_id__in=pk_set)
+    links.using(using).filter(created_at__isnull=True).update(
+        created_at=Subquery(
+            Post.objects.filter(id=OuterRef("post_id")).values("created_at")[:1]
+        )
+    )
+
+
+@receiver(m2m_changed, sender=PostTag)
+def announce_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add" and pk_set:
+        post_ids = list(pk_set) if reverse else [instance.pk]
+        post_tagged.send(sender=Post, post_ids=post_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, using=None, **kwargs):
+    invalidate_catalog(using)
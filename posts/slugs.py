@@ -0,0 +1,108 @@
+"""
+Slug allocation for posts.
+
+A new post first tries its plain slugified title. Only when that insert
+hits the unique constraint is a suffix drawn from the per-base
+``SlugCounter`` row, which is incremented with a single atomic UPDATE, so
+allocation never scans posts by title and concurrent creates never race
+on the same suffix.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.text import slugify
+
+SLUG_MAX_LENGTH = 50
+
+
+def base_slug(title):
+    return slugify(title)[:SLUG_MAX_LENGTH].strip("-") or "post"
+
+
+def suffixed_slug(base, number):
+    suffix = f"-{number}"
+    return f"{base[: SLUG_MAX_LENGTH - len(suffix)].rstrip('-')}{suffix}"
+
+
+def next_suffix(base, using="default"):
+    from posts.models import SlugCounter
+
+    with transaction.atomic(using=using):
+        counters = SlugCounter.objects.using(using).filter(base=base)
+        if counters.update(value=F("value") + 1):
+            return counters.values_list("value", flat=True).get()
+        try:
+            with transaction.atomic(using=using):
+                SlugCounter.objects.using(using).create(base=base, value=2)
+            return 2
+        except IntegrityError:
+            counters.update(value=F("value") + 1)
+            return counters.values_list("value", flat=True).get()
+
+
+def save_with_slug(post, save, using="default"):
+    base = base_slug(post.title)
+    post.slug = base
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                return save()
+        except IntegrityError:
+            if not type(post).objects.using(using).filter(slug=post.slug).exists():
+                raise
+        post.slug = suffixed_slug(base, next_suffix(base, using=using))
+
+
+def reserve_suffixes(base, count, using="default"):
+    from posts.models import SlugCounter
+
+    with transaction.atomic(using=using):
+        counters = SlugCounter.objects.using(using).filter(base=base)
+        if not counters.update(value=F("value") + count):
+            try:
+                with transaction.atomic(using=using):
+                    SlugCounter.objects.using(using).create(base=base, value=count + 1)
+                return range(2, count + 2)
+            except IntegrityError:
+                counters.update(value=F("value") + count)
+        last = counters.values_list("value", flat=True).get()
+    return range(last - count + 1, last + 1)
+
+
+def allocate_slugs(titles, using="default"):
+    from posts.models import Post
+
+    bases = [base_slug(title) for title in titles]
+    slugs = [None] * len(bases)
+    taken = set(
+        Post.objects.using(using)
+        .filter(slug__in=set(bases))
+        .values_list("slug", flat=True)
+    )
+    pending = {}
+    for index, base in enumerate(bases):
+        if base in taken:
+            pending.setdefault(base, []).append(index)
+        else:
+            slugs[index] = base
+            taken.add(base)
+
+    while pending:
+        candidates = {}
+        for base, indexes in pending.items():
+            suffixes = reserve_suffixes(base, len(indexes), using=using)
+            for index, number in zip(indexes, suffixes):
+                candidates[index] = suffixed_slug(base, number)
+        taken = set(
+            Post.objects.using(using)
+            .filter(slug__in=set(candidates.values()))
+            .values_list("slug", flat=True)
+        )
+        pending = {}
+        for index, slug in candidates.items():
+            if slug in taken:
+                pending.setdefault(bases[index], []).append(index)
+            else:
+                slugs[index] = slug
+                taken.add(slug)
+    return slugs
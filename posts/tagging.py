@@ -0,0 +1,84 @@
+from django.db import router, transaction
+from django.db.models import Q
+from posts.cache import invalidate_catalog
+from posts.models import Post, PostTag, Tag
+from posts.signals import post_tagged
+
+
+class PostNotFound(Exception):
+    pass
+
+
+class TagNotFound(Exception):
+    pass
+
+
+def create_tags(names, using):
+    """
+    The ids of the tags named ``names``, inserting the missing ones. Names
+    are unique, so a tag created concurrently is reused, not duplicated.
+    """
+    Tag.objects.using(using).bulk_create(
+        [Tag(name=name) for name in names], ignore_conflicts=True
+    )
+    invalidate_catalog(using)
+    return list(
+        Tag.objects.using(using).filter(name__in=names).values_list("id", flat=True)
+    )
+
+
+def set_post_tags(post_id, tag_ids=(), tag_names=(), using=None):
+    """
+    Replace the tags of a post, writing only the difference against the
+    through table: one bulk INSERT for added tags and one DELETE for
+    removed ones.
+    """
+    try:
+        post_id = int(post_id)
+    except (TypeError, ValueError):
+        raise PostNotFound(post_id)
+    invalid = [tag_id for tag_id in tag_ids if not str(tag_id).isdigit()]
+    if invalid:
+        raise TagNotFound(invalid)
+    using = using or router.db_for_write(PostTag)
+    with transaction.atomic(using=using):
+        current = list(
+            Post.objects.using(using)
+            .filter(id=post_id)
+            .values_list("tags", "created_at")
+        )
+        if not current:
+            raise PostNotFound(post_id)
+        created_at = current[0][1]
+        current = {tag_id for tag_id, _ in current if tag_id is not None}
+
+        tag_ids = {int(tag_id) for tag_id in tag_ids}
+        names = {name.strip() for name in tag_names if name.strip()}
+        known = Tag.objects.using(using).filter(Q(id__in=tag_ids) | Q(name__in=names))
+        desired = set()
+        for tag_id, name in known.values_list("id", "name"):
+            if tag_id in tag_ids:
+                desired.add(tag_id)
+            if name in names:
+                desired.add(tag_id)
+                names.discard(name)
+        if tag_ids - desired:
+            raise TagNotFound(sorted(tag_ids - desired))
+        if names:
+            desired.update(create_tags(sorted(names), using))
+
+        added = desired - current
+        removed = current - desired
+        if added:
+            PostTag.objects.using(using).bulk_create(
+                [
+                    PostTag(post_id=post_id, tag_id=tag_id, created_at=created_at)
+                    for tag_id in added
+                ]
+            )
+            post_tagged.send(sender=Post, post_ids=[post_id])
+        if removed:
+            PostTag.objects.using(using).filter(
+                post_id=post_id, tag_id__in=removed
+            ).delete()
+    return desired
@@ -1,3 +1,556 @@
-from django.test import TestCase
+import json
+from functools import partial
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+from comments.models import Comment
+from posts import search
+from posts.cache import CatalogCache, _build_catalog_cache
+from posts.models import Post, Tag, Category
+from posts.tagging import create_tags
 
-# Create your tests here.
+
+class PostQueryTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def create_posts(self, count):
+        category = Category.objects.first()
+        tags = list(Tag.objects.all()[:3])
+        for i in range(count):
+            author = User.objects.create(username=f"author-{count}-{i}")
+            post = Post.objects.create(
+                title=f"Post {count} {i}",
+                content="content",
+                author=author,
+                category=category,
+                published=True,
+            )
+            post.tags.set(tags)
+            Comment.objects.create(post=post, author=author, comment="first")
+            Comment.objects.create(post=post, author=author, comment="second")
+
+    def test_posts_query_count_is_constant(self):
+        query = """
+            query {
+                posts {
+                    edges {
+                        node {
+                            title
+                            author { username }
+                            category { name }
+                            tags { name }
+                            comments { edges { node { comment author { username } } } }
+                        }
+                    }
+                }
+            }
+        """
+        self.create_posts(2)
+        self.assertResponseNoErrors(self.query(query))
+        with self.assertNumQueries(4):
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+
+        self.create_posts(8)
+        with self.assertNumQueries(4):
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        edges = json.loads(response.content)["data"]["posts"]["edges"]
+        self.assertEqual(len(edges), 10)
+        self.assertEqual(len(edges[0]["node"]["tags"]), 3)
+        self.assertEqual(edges[0]["node"]["category"]["name"], "News")
+        self.assertEqual(
+            edges[0]["node"]["comments"]["edges"][1]["node"]["comment"], "second"
+        )
+
+    def fetch_page(self, **arguments):
+        response = self.query(
+            """
+            query ($first: Int, $after: String, $last: Int, $before: String) {
+                posts(first: $first, after: $after, last: $last, before: $before) {
+                    edges { cursor node { title } }
+                    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+                }
+            }
+            """,
+            variables=arguments,
+        )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]["posts"]
+
+    def test_posts_keyset_pagination(self):
+        self.create_posts(5)
+        titles = [f"Post 5 {i}" for i in reversed(range(5))]
+
+        page = self.fetch_page(first=2)
+        self.assertEqual([e["node"]["title"] for e in page["edges"]], titles[:2])
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+
+        page = self.fetch_page(first=2, after=page["pageInfo"]["endCursor"])
+        self.assertEqual([e["node"]["title"] for e in page["edges"]], titles[2:4])
+
+        page = self.fetch_page(first=2, after=page["pageInfo"]["endCursor"])
+        self.assertEqual([e["node"]["title"] for e in page["edges"]], titles[4:])
+        self.assertFalse(page["pageInfo"]["hasNextPage"])
+
+        page = self.fetch_page(last=2, before=page["pageInfo"]["startCursor"])
+        self.assertEqual([e["node"]["title"] for e in page["edges"]], titles[2:4])
+        self.assertTrue(page["pageInfo"]["hasPreviousPage"])
+
+
+class PostSearchTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.author = User.objects.create(username="writer")
+        self.django = Post.objects.create(
+            title="Django tips", content="Querysets are lazy", author=self.author
+        )
+        self.graphql = Post.objects.create(
+            title="GraphQL basics", content="Resolvers and django", author=self.author
+        )
+        Post.objects.create(title="Cooking", content="Pasta", author=self.author)
+
+    def search(self, text, **arguments):
+        response = self.query(
+            """
+            query ($search: String, $first: Int, $after: String) {
+                posts(search: $search, first: $first, after: $after) {
+                    edges { node { title } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+            """,
+            variables={"search": text, **arguments},
+        )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]["posts"]
+
+    def titles(self, text, **arguments):
+        return [e["node"]["title"] for e in self.search(text, **arguments)["edges"]]
+
+    def assert_search_behaviour(self):
+        self.assertEqual(self.titles("djan"), ["Django tips", "GraphQL basics"])
+        self.assertEqual(self.titles("django resolvers"), ["GraphQL basics"])
+        self.assertEqual(self.titles("missing"), [])
+
+        page = self.search("djan", first=1)
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+        after = page["pageInfo"]["endCursor"]
+        self.assertEqual(self.titles("djan", first=1, after=after), ["GraphQL basics"])
+
+        self.graphql.title = "GraphQL"
+        self.graphql.content = "Schemas"
+        self.graphql.save()
+        self.django.delete()
+        self.assertEqual(self.titles("djan"), [])
+        self.assertEqual(self.titles("schema"), ["GraphQL"])
+
+    def test_search_uses_index(self):
+        self.assert_search_behaviour()
+
+    def test_search_term_table_fallback(self):
+        with mock.patch.dict(search._fts5_enabled, {"default": False}):
+            search.index_posts(Post.objects.all())
+            self.assert_search_behaviour()
+
+
+class PostSlugTestCase(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username="writer")
+
+    def create(self, title):
+        return Post.objects.create(title=title, content="content", author=self.author)
+
+    def test_duplicate_titles_get_numbered_slugs(self):
+        slugs = [self.create("Hello World").slug for _ in range(3)]
+        self.assertEqual(slugs, ["hello-world", "hello-world-2", "hello-world-3"])
+        self.assertEqual(self.create("Hello World again").slug, "hello-world-again")
+
+    def test_suffix_skips_taken_slugs(self):
+        self.create("Hello World")
+        self.create("Hello World 2")
+        self.assertEqual(self.create("Hello World").slug, "hello-world-3")
+
+    def test_edits_keep_the_slug(self):
+        post = self.create("Hello World")
+        post.title = "Renamed"
+        with self.assertNumQueries(3):
+            post.save()
+        self.assertEqual(Post.objects.get(id=post.id).slug, "hello-world")
+
+    def test_long_titles_fit_the_slug_field(self):
+        self.create("word " * 30)
+        post = self.create("word " * 30)
+        self.assertLessEqual(len(post.slug), 50)
+        self.assertTrue(post.slug.endswith("-2"))
+
+
+class PostToggleTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.post = Post.objects.create(
+            title="Hello", content="content", author=self.user
+        )
+
+    def toggle(self, post_id):
+        return self.query(
+            """
+            mutation ($id: ID!) {
+                postToggleArchive(id: $id) { success value }
+            }
+            """,
+            variables={"id": post_id},
+            headers=self.headers,
+        )
+
+    def assert_toggles(self):
+        for expected in (True, False):
+            response = self.toggle(self.post.id)
+            self.assertResponseNoErrors(response)
+            payload = json.loads(response.content)["data"]["postToggleArchive"]
+            self.assertEqual(payload, {"success": True, "value": expected})
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.is_archived, expected)
+        self.assertResponseHasErrors(self.toggle(self.post.id + 1))
+
+    def test_toggle_is_a_single_update(self):
+        with self.assertNumQueries(2):
+            self.toggle(self.post.id)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.is_archived)
+        self.toggle(self.post.id)
+        self.assert_toggles()
+
+    def test_toggle_without_update_returning(self):
+        with mock.patch("posts.flags.supports_update_returning", return_value=False):
+            self.assert_toggles()
+
+
+class BulkPostMutationTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+
+    def execute(self, query, **variables):
+        response = self.query(query, variables=variables, headers=self.headers)
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)["data"]
+
+    def bulk_create(self, items):
+        return self.execute(
+            """
+            mutation ($input: [PostCreateUpdateInput!]!) {
+                bulkCreatePosts(input: $input) {
+                    posts { id slug author { username } }
+                    errors { index message }
+                }
+            }
+            """,
+            input=items,
+        )["bulkCreatePosts"]
+
+    def test_bulk_create_allocates_slugs_and_reports_errors(self):
+        Post.objects.create(title="Hello", content="content", author=self.user)
+        items = [{"title": "Hello", "content": "content"} for _ in range(3)]
+        items.append(
+            {"title": "Other", "content": "content", "authorUsername": "writer"}
+        )
+        items.append({"title": "Ghost", "content": "content", "authorId": "999"})
+        items.append({"title": "Typo", "content": "content", "authorId": "abc"})
+
+        with self.assertNumQueries(16):
+            result = self.bulk_create(items)
+
+        self.assertEqual(
+            [post["slug"] for post in result["posts"]],
+            ["hello-2", "hello-3", "hello-4", "other"],
+        )
+        self.assertEqual(result["posts"][0]["author"]["username"], "writer")
+        self.assertEqual(
+            result["errors"],
+            [
+                {"index": 4, "message": "Author not found."},
+                {"index": 5, "message": "Author not found."},
+            ],
+        )
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_bulk_create_applies_tags_and_categories(self):
+        tag = Tag.objects.get(name="Science")
+        category = Category.objects.first()
+        result = self.bulk_create(
+            [
+                {
+                    "title": "Tagged",
+                    "content": "content",
+                    "tagIds": [tag.id, tag.id],
+                    "categoryId": category.id,
+                },
+                {"title": "Unknown tag", "content": "content", "tagIds": ["9999"]},
+                {"title": "Unknown category", "content": "content", "categoryId": "x"},
+            ]
+        )
+        self.assertEqual(
+            result["errors"],
+            [
+                {"index": 1, "message": "Tag not found."},
+                {"index": 2, "message": "Category not found."},
+            ],
+        )
+        post = Post.objects.get(title="Tagged")
+        self.assertEqual(list(post.tags.all()), [tag])
+        self.assertEqual(post.category, category)
+
+    def test_bulk_create_statement_count_is_constant(self):
+        items = [{"title": f"Post {i}", "content": "content"} for i in range(50)]
+        with self.assertNumQueries(7):
+            self.bulk_create(items)
+        self.assertEqual(Post.objects.filter(title__startswith="Post").count(), 50)
+
+    def test_bulk_toggle_and_delete(self):
+        posts = [
+            Post.objects.create(title=f"Post {i}", content="content", author=self.user)
+            for i in range(3)
+        ]
+        ids = [str(post.id) for post in posts] + ["999"]
+
+        result = self.execute(
+            """
+            mutation ($ids: [ID!]!) {
+                bulkTogglePosts(ids: $ids, flag: IS_FEATURED) {
+                    posts { id isFeatured }
+                    errors { id message }
+                }
+            }
+            """,
+            ids=ids,
+        )["bulkTogglePosts"]
+        self.assertTrue(all(post["isFeatured"] for post in result["posts"]))
+        self.assertEqual(
+            result["errors"], [{"id": "999", "message": "Post not found."}]
+        )
+        self.assertEqual(Post.objects.filter(is_featured=True).count(), 3)
+
+        result = self.execute(
+            """
+            mutation ($ids: [ID!]!) {
+                bulkDeletePosts(ids: $ids) { deletedIds errors { id } }
+            }
+            """,
+            ids=ids[1:],
+        )["bulkDeletePosts"]
+        self.assertEqual(result["deletedIds"], ids[1:3])
+        self.assertEqual(result["errors"], [{"id": "999"}])
+        self.assertEqual(list(Post.objects.values_list("id", flat=True)), [posts[0].id])
+
+    def test_bulk_toggle_and_delete_report_invalid_ids(self):
+        post = Post.objects.create(title="Post", content="content", author=self.user)
+        ids = ["abc", str(post.id)]
+
+        result = self.execute(
+            """
+            mutation ($ids: [ID!]!) {
+                bulkTogglePosts(ids: $ids, flag: IS_FEATURED) {
+                    posts { id }
+                    errors { index id message }
+                }
+            }
+            """,
+            ids=ids,
+        )["bulkTogglePosts"]
+        self.assertEqual(result["posts"], [{"id": str(post.id)}])
+        self.assertEqual(
+            result["errors"], [{"index": 0, "id": "abc", "message": "Invalid ID."}]
+        )
+
+        result = self.execute(
+            """
+            mutation ($ids: [ID!]!) {
+                bulkDeletePosts(ids: $ids) { deletedIds errors { index message } }
+            }
+            """,
+            ids=ids,
+        )["bulkDeletePosts"]
+        self.assertEqual(result["deletedIds"], [str(post.id)])
+        self.assertEqual(result["errors"], [{"index": 0, "message": "Invalid ID."}])
+
+
+class SetPostTagsTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def setUp(self):
+        self.user = User.objects.create(username="writer")
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(self.user)}"}
+        self.post = Post.objects.create(
+            title="Hello", content="content", author=self.user
+        )
+        self.post.tags.set(Tag.objects.filter(name__in=["Science", "Health"]))
+
+    def set_tags(self, **variables):
+        return self.query(
+            """
+            mutation ($postId: ID!, $tagIds: [ID!], $tagNames: [String!]) {
+                setPostTags(postId: $postId, tagIds: $tagIds, tagNames: $tagNames) {
+                    tags { name }
+                }
+            }
+            """,
+            variables={"postId": self.post.id, **variables},
+            headers=self.headers,
+        )
+
+    def test_set_post_tags_applies_the_difference(self):
+        technology = Tag.objects.get(name="Technology")
+        with self.assertNumQueries(11):
+            response = self.set_tags(
+                tagIds=[technology.id], tagNames=["Science", "Rust", "Wasm"]
+            )
+        self.assertResponseNoErrors(response)
+        names = {
+            tag["name"]
+            for tag in json.loads(response.content)["data"]["setPostTags"]["tags"]
+        }
+        self.assertEqual(names, {"Technology", "Science", "Rust", "Wasm"})
+        self.assertEqual(Tag.objects.filter(name="Rust").count(), 1)
+
+        response = self.set_tags(tagNames=["Rust"])
+        self.assertResponseNoErrors(response)
+        self.assertEqual(list(self.post.tags.values_list("name", flat=True)), ["Rust"])
+        self.assertEqual(Tag.objects.filter(name="Rust").count(), 1)
+
+    def test_null_tag_lists_are_empty(self):
+        response = self.set_tags(tagIds=None, tagNames=["Rust"])
+        self.assertResponseNoErrors(response)
+        response = self.set_tags(tagIds=[], tagNames=None)
+        self.assertResponseNoErrors(response)
+        self.assertFalse(self.post.tags.exists())
+
+    def test_set_post_tags_rejects_unknown_ids(self):
+        self.assertResponseHasErrors(self.set_tags(tagIds=[9999]))
+        self.assertEqual(self.post.tags.count(), 2)
+
+    def assert_error(self, response, message):
+        errors = json.loads(response.content)["errors"]
+        self.assertEqual([error["message"] for error in errors], [message])
+
+    def test_malformed_ids_are_rejected_cleanly(self):
+        self.assert_error(self.set_tags(tagIds=["abc"]), "Tag not found")
+        self.assert_error(self.set_tags(postId="abc", tagIds=[]), "Post not found")
+        update = """
+            mutation ($id: ID!, $input: PostCreateUpdateInput!) {
+                updatePost(id: $id, input: $input) { post { id } }
+            }
+        """
+        for field, value, message in [
+            ("tagIds", ["abc"], "Tag not found"),
+            ("categoryId", "abc", "Category not found."),
+        ]:
+            response = self.query(
+                update,
+                variables={
+                    "id": self.post.id,
+                    "input": {"title": "Hello", "content": "content", field: value},
+                },
+                headers=self.headers,
+            )
+            self.assert_error(response, message)
+        self.assertEqual(self.post.tags.count(), 2)
+
+    def test_create_applies_tags_and_category(self):
+        science = Tag.objects.get(name="Science")
+        category = Category.objects.first()
+        response = self.query(
+            """
+            mutation ($input: PostCreateUpdateInput!) {
+                createPost(input: $input) { post { id } }
+            }
+            """,
+            variables={
+                "input": {
+                    "title": "Created",
+                    "content": "content",
+                    "authorUsername": "writer",
+                    "tagIds": [science.id],
+                    "categoryId": category.id,
+                }
+            },
+            headers=self.headers,
+        )
+        self.assertResponseNoErrors(response)
+        post = Post.objects.get(title="Created")
+        self.assertEqual(list(post.tags.all()), [science])
+        self.assertEqual(post.category, category)
+
+    def test_tag_names_are_unique(self):
+        first = create_tags(["Rust", "Science"], "default")
+        self.assertEqual(create_tags(["Rust", "Science"], "default"), first)
+        self.assertEqual(Tag.objects.filter(name="Rust").count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(name="Science")
+
+
+class CatalogCacheTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql/"
+
+    def names(self):
+        response = self.query("query { tags { name } categories { name } }")
+        self.assertResponseNoErrors(response)
+        data = json.loads(response.content)["data"]
+        return [tag["name"] for tag in data["tags"]], data["categories"]
+
+    def test_catalog_is_served_from_memory_until_invalidated(self):
+        self.names()
+        with self.assertNumQueries(0):
+            tags, categories = self.names()
+        self.assertIn("Science", tags)
+        self.assertEqual(len(categories), Category.objects.count())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Rust")
+        self.assertIn("Rust", self.names()[0])
+        with self.assertNumQueries(0):
+            self.assertIn("Rust", self.names()[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(name="Rust").get().delete()
+        self.assertNotIn("Rust", self.names()[0])
+
+    def test_uncommitted_rows_are_not_cached(self):
+        self.names()
+        with transaction.atomic():
+            Tag.objects.create(name="Phantom")
+            self.assertIn("Phantom", self.names()[0])
+            transaction.set_rollback(True)
+        self.assertNotIn("Phantom", self.names()[0])
+
+    def test_process_local_backends_are_refused(self):
+        with override_settings(CATALOG_CACHE={"CACHE_ALIAS": "default"}):
+            with self.assertRaises(ImproperlyConfigured):
+                _build_catalog_cache()
+
+    def test_entries_expire_and_are_evicted(self):
+        catalog = CatalogCache("default", 60, 2, 60)
+        calls = []
+
+        def load(name):
+            calls.append(name)
+            return name
+
+        for name in ("a", "b", "a", "c", "b"):
+            catalog.get(name, partial(load, name))
+        self.assertEqual(calls, ["a", "b", "c", "b"])
+
+        with mock.patch("posts.cache.time.monotonic", return_value=10**9):
+            catalog.get("b", partial(load, "b"))
+        self.assertEqual(calls[-1], "b")
+        self.assertEqual(len(calls), 5)
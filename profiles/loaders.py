@@ -0,0 +1,7 @@
+from django.contrib.auth.models import User
+from postify.dataloaders import register_loader
+
+
+@register_loader("users")
+def load_users(loaders, keys):
+    return User.objects.in_bulk(keys)
@@ -4,6 +4,7 @@ from django.db.models import Q
 from graphene_django import DjangoObjectType
 from graphql.error import GraphQLError
 import graphene
+from postify.aio import alist, is_async
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 
@@ -18,6 +19,8 @@ class Query(graphene.ObjectType):
     users = graphene.List(UserType)
 
     def resolve_users(self, info):
+        if is_async(info):
+            return alist(User.objects.all())
         return User.objects.all()
 
 